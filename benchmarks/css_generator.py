@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Generates realistic, reproducible stylesheets for the benchmarks.
+
+A sheet is generated as a list of :py:class:`GeneratedRule`, from a seed, then written out with
+:py:func:`render`. :py:func:`mutate` makes a second version of a sheet, with some rules changed,
+removed and added, so that comparisons have differences to find.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import random
+from collections import namedtuple
+
+GeneratedRule = namedtuple('GeneratedRule', 'media selectors declarations')
+GeneratedRule.__doc__ = """A generated ruleset: the media query it is in (or ``None``), its list
+of selector phrases, and its list of ``(property, value)`` declarations."""
+
+_BLOCKS = ('btn', 'nav', 'card', 'header', 'footer', 'menu', 'modal', 'form', 'input', 'list',
+           'item', 'table', 'row', 'cell', 'icon', 'badge', 'alert', 'panel', 'tab', 'tooltip',
+           'sidebar', 'content', 'title', 'link', 'image', 'grid', 'col', 'hero', 'banner')
+_ELEMENTS = ('a', 'div', 'span', 'li', 'ul', 'p', 'h1', 'h2', 'h3', 'img', 'button', 'input',
+             'label', 'table', 'td', 'tr', 'section', 'nav')
+_MODIFIERS = ('active', 'disabled', 'primary', 'secondary', 'large', 'small', 'open', 'dark',
+              'light', 'inline')
+_PSEUDOS = (':hover', ':focus', ':active', ':first-child', ':last-child', ':not(.hidden)',
+            '::before', '::after', ':nth-child(2n+1)')
+_MEDIA = ('screen and (max-width:600px)', 'screen and (min-width:601px) and (max-width:1024px)',
+          'print', '(prefers-color-scheme:dark)', 'screen and (min-width:1200px)')
+_COLOR_KEYWORDS = ('red', 'white', 'black', 'gray', 'navy', 'teal', 'transparent', 'orange')
+_COLOR_PROPERTIES = ('color', 'background-color', 'border-color', 'outline-color')
+
+GeneratorOptions = namedtuple('GeneratorOptions', 'fanout duplicates media colors',
+                              defaults=(3, 0.1, 0.15, 0.3))
+GeneratorOptions.__doc__ = """How sheets are generated: the largest number of selector phrases
+per rule, and the fractions of rules that repeat an earlier rule's selectors, of rules in
+``@media`` blocks, and of declarations that set colors."""
+
+
+def _color(rand):
+    form = rand.randrange(5)
+    if form == 0:
+        return rand.choice(_COLOR_KEYWORDS)
+    if form == 1:
+        return '#{:03x}'.format(rand.randrange(0x1000))
+    if form == 2:
+        return '#{:06X}'.format(rand.randrange(0x1000000))
+    if form == 3:
+        return 'rgb({}, {}, {})'.format(*(rand.randrange(256) for _ in range(3)))
+    return 'hsla({}, {}%, {}%, 0.{})'.format(rand.randrange(360), rand.randrange(101),
+                                              rand.randrange(101), rand.randrange(1, 10))
+
+
+def _length(rand):
+    return rand.choice(('0', '{}px'.format(rand.randrange(1, 64)),
+                        '{}em'.format(rand.randrange(1, 8) / 4), '{}%'.format(rand.randrange(101)),
+                        'auto'))
+
+
+_VALUES = {
+    'display': lambda rand: rand.choice(('block', 'inline', 'flex', 'grid', 'none',
+                                         'inline-block')),
+    'position': lambda rand: rand.choice(('static', 'relative', 'absolute', 'fixed', 'sticky')),
+    'width': _length,
+    'height': _length,
+    'top': _length,
+    'left': _length,
+    'margin': lambda rand: ' '.join(_length(rand) for _ in range(rand.randrange(1, 5))),
+    'padding': lambda rand: ' '.join(_length(rand) for _ in range(rand.randrange(1, 5))),
+    'margin-top': _length,
+    'padding-left': _length,
+    'font-size': lambda rand: '{}px'.format(rand.randrange(10, 40)),
+    'font-weight': lambda rand: rand.choice(('normal', 'bold', '400', '700')),
+    'font': lambda rand: '{} {}px/{} {}'.format(rand.choice(('normal', 'bold', 'italic')),
+                                                rand.randrange(10, 40), rand.choice((1, 1.2, 1.5)),
+                                                rand.choice(('Arial, sans-serif', 'serif',
+                                                             '"Open Sans", sans-serif'))),
+    'border': lambda rand: '{}px {} {}'.format(rand.randrange(4), rand.choice(('solid',
+                                                                               'dashed')),
+                                               _color(rand)),
+    'border-radius': _length,
+    'text-align': lambda rand: rand.choice(('left', 'right', 'center', 'justify')),
+    'line-height': lambda rand: rand.choice(('1', '1.2', '1.5', 'normal', '20px')),
+    'opacity': lambda rand: '0.{}'.format(rand.randrange(10)),
+    'z-index': lambda rand: str(rand.randrange(100)),
+    'flex': lambda rand: rand.choice(('1', '1 1 auto', '0 0 50%', 'none')),
+    'overflow': lambda rand: rand.choice(('hidden', 'auto', 'visible', 'hidden scroll')),
+    'transition': lambda rand: 'all {}ms ease-in-out'.format(rand.randrange(50, 500)),
+    'background': lambda rand: '{} url(img/{}.png) no-repeat'.format(_color(rand),
+                                                                     rand.choice(_BLOCKS)),
+}
+_PROPERTIES = sorted(_VALUES)
+
+
+def _selector(rand):
+    """Returns a random selector phrase, in the style of a component stylesheet."""
+    parts = []
+    for _ in range(rand.choice((1, 1, 2, 2, 3))):
+        block = rand.choice(_BLOCKS)
+        kind = rand.randrange(6)
+        if kind == 0:
+            part = rand.choice(_ELEMENTS)
+        elif kind == 1:
+            part = '.{}__{}'.format(block, rand.choice(_BLOCKS))
+        elif kind == 2:
+            part = '.{}--{}'.format(block, rand.choice(_MODIFIERS))
+        elif kind == 3:
+            part = '{}.{}'.format(rand.choice(_ELEMENTS), block)
+        else:
+            part = '.{}-{}'.format(block, rand.randrange(50))
+        parts.append(part)
+    if rand.random() < 0.25:
+        parts[-1] += rand.choice(_PSEUDOS)
+    return rand.choice((' ', ' > ', ' ')).join(parts)
+
+
+def _declarations(rand, options):
+    declarations = []
+    for _ in range(rand.randrange(1, 8)):
+        if rand.random() < options.colors:
+            declarations.append((rand.choice(_COLOR_PROPERTIES), _color(rand)))
+        else:
+            name = rand.choice(_PROPERTIES)
+            declarations.append((name, _VALUES[name](rand)))
+    if rand.random() < 0.05:
+        name, value = declarations[-1]
+        declarations[-1] = (name, value + ' !important')
+    return declarations
+
+
+def generate_rules(rule_count, seed=0, options=GeneratorOptions()):
+    """Returns a list of `rule_count` :py:class:`GeneratedRule`, the same for the same `seed` and
+    `options` (a :py:class:`GeneratorOptions`).
+
+    """
+    rand = random.Random(seed)
+    rules = []
+    media = None
+    for _ in range(rule_count):
+        # media blocks hold runs of several rules
+        if media is None and rand.random() < options.media / 4:
+            media = rand.choice(_MEDIA)
+        elif media is not None and rand.random() < 0.25:
+            media = None
+        if rules and rand.random() < options.duplicates:
+            selectors = list(rand.choice(rules).selectors)
+        else:
+            selectors = [_selector(rand) for _ in range(rand.randint(1, options.fanout))]
+        rules.append(GeneratedRule(media, selectors, _declarations(rand, options)))
+    return rules
+
+
+def mutate(rules, seed=0, rate=0.05, options=GeneratorOptions()):
+    """Returns a copy of `rules` in which about a fraction `rate` of the rules have had a
+    declaration changed, and as many again have been removed or added.
+
+    """
+    rand = random.Random(seed)
+    result = []
+    for rule in rules:
+        roll = rand.random()
+        if roll < rate:
+            declarations = list(rule.declarations)
+            index = rand.randrange(len(declarations))
+            name, _ = declarations[index]
+            declarations[index] = (name, _VALUES.get(name, _color)(rand))
+            result.append(rule._replace(declarations=declarations))
+        elif roll < rate * 1.5:
+            continue
+        else:
+            result.append(rule)
+        if rand.random() < rate / 2:
+            result.append(GeneratedRule(rule.media, [_selector(rand)],
+                                        _declarations(rand, options)))
+    return result
+
+
+def render(rules):
+    """Returns the CSS text of `rules`, with each run of rules in the same media query written as
+    one ``@media`` block.
+
+    """
+    lines = []
+    media = None
+    for rule in rules:
+        if rule.media != media:
+            if media is not None:
+                lines.append('}')
+            media = rule.media
+            if media is not None:
+                lines.append('@media {} {{'.format(media))
+        indent = '    ' if media is not None else ''
+        lines.append('{}{} {{'.format(indent, ',\n{}'.format(indent).join(rule.selectors)))
+        lines.extend('{}    {}: {};'.format(indent, name, value)
+                     for name, value in rule.declarations)
+        lines.append(indent + '}')
+    if media is not None:
+        lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
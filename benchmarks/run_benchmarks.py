@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Times each stage of a comparison of two generated stylesheets (see :mod:`css_generator`) at
+increasing sizes, and records the peak memory used, so that changes to :mod:`comp_css` can be
+checked for regressions.
+
+Usage: ``python benchmarks/run_benchmarks.py [--sizes N ...] [--parser NAME] [--save FILE]
+[--baseline FILE]``
+
+The stages timed are:
+
+``parse``
+    parsing both sheets
+``index``
+    building both sheets' selector indexes
+``styles``
+    computing both sheets' effective styles, and their context and selector fingerprints
+``selectors``
+    finding the missing and extra selectors
+``declarations``
+    finding the declaration differences
+
+The sheets are parsed with the parser named by ``--parser`` (see :py:data:`comp_css.PARSERS`).
+Each time is the best of ``--repeat`` runs. The peak memory of a whole comparison is measured in
+a separate run, under :py:mod:`tracemalloc`, since tracing slows everything down.
+
+The startup of the command itself is also timed, in new interpreters (best of
+:py:data:`STARTUP_REPEAT` runs each):
+
+``import``
+    importing :mod:`comp_css`, less the time to start an interpreter that does nothing
+``help``
+    running ``comp_css.py --help``
+``compare``
+    running ``comp_css.py`` on two small generated sheets
+``cached``
+    running ``comp_css.py`` on the same sheets, parsed from a ``--cache-dir`` filled beforehand
+
+A cache hit must not load the parser: if the ``cached`` run loads any of
+:py:data:`CACHE_HIT_UNLOADED`, that is reported as a regression whatever the baseline.
+
+With ``--save``, the results are written to a JSON file; with ``--baseline``, they are compared
+to those in such a file, and the exit status is 1 if any stage got slower (or used more memory)
+by more than ``--tolerance``.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=C0413
+from comp_css import PARSERS, Stylesheet
+from css_generator import GeneratorOptions, generate_rules, mutate, render
+
+DEFAULT_SIZES = (500, 1000, 2000, 5000)
+
+STAGES = ('parse', 'index', 'styles', 'selectors', 'declarations')
+
+# the measurements compared against a baseline, in table order
+METRICS = STAGES + ('peak_mb',)
+
+STARTUP = ('import', 'help', 'compare', 'cached')
+
+# the number of times each startup measurement is made; the best is kept
+STARTUP_REPEAT = 10
+
+# the rule count of the sheets compared by the startup measurement
+STARTUP_RULES = 50
+
+# the modules that a comparison of sheets found in the cache must not load
+CACHE_HIT_UNLOADED = ('tinycss.css21', 'css_parser', 'css_scanner')
+
+
+def write_sheets(workdir, rule_count, seed, options):
+    """Writes a generated sheet of `rule_count` rules and a mutated copy of it to `workdir`.
+    Returns their file names.
+
+    """
+    rules = generate_rules(rule_count, seed, options)
+    filenames = []
+    for name, sheet_rules in (('a.css', rules), ('b.css', mutate(rules, seed + 1,
+                                                                  options=options))):
+        filename = os.path.join(workdir, name)
+        with open(filename, 'w', encoding='utf-8') as css_file:
+            css_file.write(render(sheet_rules))
+        filenames.append(filename)
+    return filenames
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def _build_styles(sheet):
+    """Builds what :py:meth:`comp_css.Stylesheet.diff` needs of `sheet` besides its index, so
+    that the diff stages time only the comparison.
+
+    """
+    sheet.effective_styles()
+    sheet.context_fingerprints()
+    sheet.selector_fingerprints()
+
+
+def time_stages(file1, file2, parser=None):
+    """Returns a :py:class:`dict` of the seconds taken by each of :py:data:`STAGES` for one
+    comparison of `file1` and `file2`, parsed with `parser`.
+
+    """
+    sheet1, parse1 = _timed(lambda: Stylesheet(file1, parser=parser))
+    sheet2, parse2 = _timed(lambda: Stylesheet(file2, parser=parser))
+    _, index1 = _timed(lambda: sheet1.contexts)
+    _, index2 = _timed(lambda: sheet2.contexts)
+    _, styles1 = _timed(_build_styles, sheet1)
+    _, styles2 = _timed(_build_styles, sheet2)
+    _, selectors = _timed(lambda: list(sheet1.diff(sheet2, declarations=False)))
+    _, declarations = _timed(lambda: list(sheet1.diff(sheet2, selectors=False)))
+    return {'parse': parse1 + parse2, 'index': index1 + index2, 'styles': styles1 + styles2,
+            'selectors': selectors, 'declarations': declarations}
+
+
+def peak_memory(file1, file2, parser=None):
+    """Returns the peak memory, in MB, allocated during a whole comparison of `file1` and
+    `file2`, parsed with `parser`.
+
+    """
+    tracemalloc.start()
+    try:
+        sheet1 = Stylesheet(file1, parser=parser)
+        sheet2 = Stylesheet(file2, parser=parser)
+        list(sheet1.diff(sheet2))
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def bench(rule_count, workdir, seed=0, repeat=3, options=GeneratorOptions(), memory=True,
+          parser=None):
+    """Returns the measurements for one `rule_count`, as a :py:class:`dict`."""
+    file1, file2 = write_sheets(workdir, rule_count, seed, options)
+    runs = [time_stages(file1, file2, parser) for _ in range(repeat)]
+    result = {'rules': rule_count}
+    for stage in STAGES:
+        result[stage] = min(run[stage] for run in runs)
+    result['peak_mb'] = peak_memory(file1, file2, parser) if memory else None
+    return result
+
+
+def _best_run(args, repeat):
+    """Returns the fewest seconds taken by `repeat` runs of a new interpreter with `args`."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_startup(workdir, repeat=STARTUP_REPEAT, seed=0):
+    """Returns a :py:class:`dict` of the seconds taken by each of :py:data:`STARTUP`."""
+    file1, file2 = write_sheets(workdir, STARTUP_RULES, seed, GeneratorOptions())
+    cached = ['comp_css.py', '--cache-dir', os.path.join(workdir, 'cache'), file1, file2]
+    bare = _best_run(['-c', 'pass'], repeat)
+    return {'import': max(0.0, _best_run(['-c', 'import comp_css'], repeat) - bare),
+            'help': _best_run(['comp_css.py', '--help'], repeat),
+            'compare': _best_run(['comp_css.py', file1, file2], repeat),
+            'cached': _best_run(cached, repeat)}
+
+
+def loaded_by_cache_hit(workdir, seed=0):
+    """Compares the sheets of :py:func:`time_startup` twice, with a cache, in new interpreters,
+    and returns the set of the :py:data:`CACHE_HIT_UNLOADED` modules loaded (not just registered
+    to be loaded on first use) by the second comparison.
+
+    """
+    file1, file2 = write_sheets(workdir, STARTUP_RULES, seed, GeneratorOptions())
+    argv = ['comp_css.py', '--cache-dir', os.path.join(workdir, 'cache'), file1, file2]
+    script = ("import contextlib, io, runpy, sys\n"
+              "sys.argv = {!r}\n"
+              "with contextlib.redirect_stdout(io.StringIO()):\n"
+              "    try:\n        runpy.run_path('comp_css.py', run_name='__main__')\n"
+              "    except SystemExit:\n        pass\n"
+              "print(' '.join(name for name in {!r} if type(sys.modules.get(name)) is type(sys)))"
+              ).format(argv, CACHE_HIT_UNLOADED)
+    output = None
+    for _ in range(2):
+        output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return set(output.split())
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Returns a list of ``(rule_count, metric, baseline_value, value)`` tuples, one for each
+    measurement in `results` more than `tolerance` (a fraction) worse than in `baseline`. Sizes
+    and measurements missing from either are skipped.
+
+    """
+    baseline_by_size = {result['rules']: result for result in baseline}
+    regressions = []
+    for result in results:
+        old = baseline_by_size.get(result['rules'])
+        if old is None:
+            continue
+        for metric in METRICS:
+            before, after = old.get(metric), result.get(metric)
+            if before and after is not None and after > before * (1 + tolerance):
+                regressions.append((result['rules'], metric, before, after))
+    return regressions
+
+
+def compare_startup(startup, baseline, tolerance):
+    """Returns a list of ``(metric, baseline_value, value)`` tuples, one for each startup
+    measurement in `startup` more than `tolerance` (a fraction) worse than in `baseline`.
+
+    """
+    return [(metric, baseline[metric], startup[metric]) for metric in STARTUP
+            if baseline.get(metric) and startup[metric] > baseline[metric] * (1 + tolerance)]
+
+
+def _format_row(result, baseline=None):
+    cells = ['{:>8,}'.format(result['rules'])]
+    for metric in METRICS:
+        value = result[metric]
+        cell = '-' if value is None else '{:.4f}'.format(value)
+        if baseline is not None and value is not None and baseline.get(metric):
+            cell += ' ({:+.0%})'.format(value / baseline[metric] - 1)
+        cells.append('{:>18}'.format(cell))
+    return ' '.join(cells)
+
+
+def _build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmarks comp_css on generated stylesheets.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, metavar='N',
+                        help="the rule counts to run (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="the generator's seed")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per size; the best is kept")
+    parser.add_argument('--fanout', type=int, default=GeneratorOptions().fanout,
+                        help="the most selector phrases per rule")
+    parser.add_argument('--duplicates', type=float, default=GeneratorOptions().duplicates,
+                        help="the fraction of rules repeating an earlier rule's selectors")
+    parser.add_argument('--media', type=float, default=GeneratorOptions().media,
+                        help="the fraction of rules in @media blocks")
+    parser.add_argument('--colors', type=float, default=GeneratorOptions().colors,
+                        help="the fraction of declarations setting colors")
+    parser.add_argument('--parser', choices=PARSERS, default=PARSERS[0],
+                        help="the CSS parser to benchmark (default: %(default)s)")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="skip the (slow) peak memory measurement")
+    parser.add_argument('--no-startup', action='store_true',
+                        help="skip the measurement of the command's startup")
+    parser.add_argument('--save', metavar='FILE', help="write the results to FILE, as JSON")
+    parser.add_argument('--baseline', metavar='FILE',
+                        help="compare the results to those saved in FILE")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="the slowdown, as a fraction, that counts as a regression "
+                        "(default: %(default)s)")
+    return parser
+
+
+def main():
+    args = _build_arg_parser().parse_args()
+    options = GeneratorOptions(args.fanout, args.duplicates, args.media, args.colors)
+    baseline = []
+    baseline_startup = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            saved = json.load(baseline_file)
+        baseline = saved['results']
+        baseline_startup = saved.get('startup') or {}
+    baseline_by_size = {result['rules']: result for result in baseline}
+
+    startup = None
+    cache_hit_loads = set()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        if not args.no_startup:
+            startup = time_startup(workdir, seed=args.seed)
+            cache_hit_loads = loaded_by_cache_hit(workdir, seed=args.seed)
+            for metric in STARTUP:
+                line = 'startup {:<8} {:>10.1f} ms'.format(metric, startup[metric] * 1000)
+                if baseline_startup.get(metric):
+                    line += ' ({:+.0%})'.format(startup[metric] / baseline_startup[metric] - 1)
+                print(line)
+        print('{:>8} '.format('rules') + ' '.join('{:>18}'.format(metric) for metric in METRICS))
+        for size in args.sizes:
+            result = bench(size, workdir, args.seed, args.repeat, options, not args.no_memory,
+                           args.parser)
+            print(_format_row(result, baseline_by_size.get(size)))
+            sys.stdout.flush()
+            results.append(result)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as save_file:
+            json.dump({'python': platform.python_version(), 'seed': args.seed,
+                       'parser': args.parser, 'options': options._asdict(), 'startup': startup,
+                       'results': results},
+                      save_file, indent=2)
+    if startup is not None and cache_hit_loads:
+        print("regression: a cache hit loads {}".format(', '.join(sorted(cache_hit_loads))))
+        sys.exit(1)
+    if args.baseline:
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for rule_count, metric, before, after in regressions:
+            print("regression: {} at {:,} rules: {:.4f} -> {:.4f}".format(metric, rule_count,
+                                                                         before, after))
+        if startup is not None:
+            startup_regressions = compare_startup(startup, baseline_startup, args.tolerance)
+            for metric, before, after in startup_regressions:
+                print("regression: startup {}: {:.4f} -> {:.4f}".format(metric, before, after))
+            regressions += startup_regressions
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -26,13 +26,72 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import sys
+import hashlib
+import io
+import json
+import mmap
 import os
-from collections import defaultdict
+import re
+import time
+import bisect
+import sys
+import glob
+import codecs
+import argparse
+import heapq
+import importlib.util
+from array import array
+from collections import namedtuple
+from contextlib import nullcontext, redirect_stdout
+from itertools import chain, groupby, islice
+from operator import attrgetter
+
+import css_instrument
+from css_defaults import DEFAULT_MAX_BYTES, DEFAULT_THRESHOLD, FORMATS
+
+
+def _lazy_import(name):
+    """Returns the module `name`, which is only loaded when one of its attributes is first used
+    (see :py:class:`importlib.util.LazyLoader`).
 
-import tinycss
-import tinycss.color3
-from tinycss.css21 import Declaration, TokenList
+    """
+    module = sys.modules.get(name)
+    if module is None:
+        spec = importlib.util.find_spec(name)
+        spec.loader = importlib.util.LazyLoader(spec.loader)
+        module = sys.modules[name] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+# tinycss, and the modules built on it, are loaded on first use, so that runs which don't need
+# them (--help, argument errors) don't pay for them
+LAZY_MODULES = ('tinycss', 'css_cache', 'css_colors', 'css_formats', 'css_fuzzy', 'css_parser',
+                'css_scanner', 'css_selectors', 'css_shorthand', 'css_values')
+tinycss = _lazy_import('tinycss')
+css_cache = _lazy_import('css_cache')
+css_colors = _lazy_import('css_colors')
+css_formats = _lazy_import('css_formats')
+css_fuzzy = _lazy_import('css_fuzzy')
+css_parser = _lazy_import('css_parser')
+css_scanner = _lazy_import('css_scanner')
+css_selectors = _lazy_import('css_selectors')
+css_shorthand = _lazy_import('css_shorthand')
+css_values = _lazy_import('css_values')
+
+
+def load_lazy_modules():
+    """Loads the :py:data:`LAZY_MODULES` now, instead of on first use (which isn't thread-safe
+    before Python 3.12). Returns the modules.
+
+    """
+    modules = [globals()[name] for name in LAZY_MODULES]
+    for module in modules:
+        vars(module)  # any attribute of a lazy module loads it
+    return modules
+
+# the line breaks, as tinycss counts them (see tinycss.token_data.FIND_NEWLINES)
+_FIND_NEWLINES = re.compile(r'\n|\r\n|\r|\f').finditer
 
 # pylint: disable=R0913,R0903
 # imho, pylint being rather dumb about those warnings
@@ -43,22 +102,29 @@ def get_normalized_color(color):
     the form #xxxxxx, where each x is a lowercase hex digit.
 
     :note: CSS 3 does not define a hex format that includes transparency, so transparency will
-        always be the default of 1.0 regarless of the transparency specified in `color`.
+        always be the default of 1.0 regarless of the transparency specified in `color`. See
+        :py:func:`css_colors.canonical_color` for a form that keeps it.
 
     """
     # transparency will likely be supported in CSS4: http://stackoverflow.com/questions/1419448/
+    import tinycss.color3  # pylint: disable=W0621,C0415
     rgb = tinycss.color3.parse_color_string(color)
-    return "#{}{}{}".format(
-        hex(int(rgb.red * 255))[2:3],
-        hex(int(rgb.blue * 255))[2:3],
-        hex(int(rgb.green * 255))[2:3]
+    return "#{:02x}{:02x}{:02x}".format(
+        min(255, max(0, int(round(rgb.red * 255)))),
+        min(255, max(0, int(round(rgb.green * 255)))),
+        min(255, max(0, int(round(rgb.blue * 255))))
     )
 
 
-class FunctionalDeclaration(Declaration):
+class FunctionalDeclaration(object):
     """A wrapper for :py:class:`tinycss.css21.Declaration` that redefines equality to functional
     equality (ignoring line and column values).
 
+    The canonical form of the declaration (name, normalized value, priority) is computed once, on
+    construction, and used for hashing and equality, so placing declarations in sets doesn't
+    re-serialize their values. The class uses ``__slots__`` (and so does not derive from
+    :py:class:`~tinycss.css21.Declaration`) to keep per-declaration memory small.
+
     .. attribute:: name
 
         The property name as a normalized (lower-case) string.
@@ -87,7 +153,13 @@ class FunctionalDeclaration(Declaration):
     .. attribute:: column
         The column in the source file at which the declaration is found (begins).
 
+    .. attribute:: key
+
+        The canonical form of the declaration, a tuple ``(name, normalized value, priority)``.
+
     """
+    __slots__ = ('name', 'value', 'priority', 'line', 'column', 'key', '_hash', '_longhands')
+
     def __init__(self, name_or_obj, value=None, priority=None, line=None, column=None):
         """
         :param name_or_obj: Either the declaration's name (a :py:class:`str`), or the
@@ -97,130 +169,871 @@ class FunctionalDeclaration(Declaration):
             :py:class:`~tinycss.css21.Declaration` instance.
 
         """
-        if isinstance(name_or_obj, Declaration):
-            super().__init__(name_or_obj.name, name_or_obj.value, name_or_obj.priority,
-                             name_or_obj.line, name_or_obj.column)
+        if isinstance(name_or_obj, str):
+            self.name = name_or_obj
+            self.value = value
+            self.priority = priority
+            self.line = line
+            self.column = column
         else:
-            super().__init__(name_or_obj, value, priority, line, column)
+            self.name = name_or_obj.name
+            self.value = name_or_obj.value
+            self.priority = name_or_obj.priority
+            self.line = name_or_obj.line
+            self.column = name_or_obj.column
+        self.key = (self.name, self.value_normalized(), self.priority)
+        self._hash = hash(self.key)
+        self._longhands = None
 
     def __eq__(self, other):
         # pylint: disable=W1504
         # I don't want to use instance() because I don't want child classes (if any) to be ==
-        # note we compare value.as_css() as there's no proper == for TokenList
-        return (type(other) == type(self) and other.name == self.name and
-                other.value.as_css() == self.value.as_css() and other.priority == self.priority)
+        return type(other) == type(self) and other.key == self.key
 
     def value_normalized(self):
-        """Attempt to normalize string values, so that they can be compared."""
+        """Attempt to normalize string values, so that they can be compared. Colors, numbers,
+        keywords, strings and URLs are replaced by their canonical forms (see
+        :py:mod:`css_values`).
+
+        """
         # this, of course, should be a method on the self.value object
-        # TODO: should use tinycss.color3 to compare colors (?)
-        result = self.value.as_css()
-        assert self.value != "#FFFFFF"
-        if isinstance(result, tinycss.color3.RGBA):
-            result = get_normalized_color(result)
-        return result
+        return css_values.normalize_value(self.value, self.name)
 
     def __str__(self):
-        return "{0}: {1}{2}".format(
-            self.name, self.value_normalized(), " !" + self.priority if self.priority else '')
+        name, value, priority = self.key
+        return "{0}: {1}{2}".format(name, value, " !" + priority if priority else '')
 
     def __repr__(self):
         return "{0}: {1}{2}".format(
             self.name, self.value.as_css(), " !" + self.priority if self.priority else '')
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
+
+    def to_record(self):
+        """Returns the declaration as a tuple of plain values, for :py:mod:`css_cache`. The
+        longhands (see :py:meth:`longhands`) are kept as ``(name, value, normalized value)``.
+
+        """
+        value = self.value.as_css()
+        normalized = self.key[1]
+        if normalized is self.value:
+            normalized = value  # as shared by from_record(), but a plain str
+        # a restored longhand's normalized value may be its CSSText value: store a plain str
+        longhands = tuple((longhand.name, longhand.value.as_css(), str(longhand.key[1]))
+                          for longhand in self.longhands() or ())
+        return (self.name, value, self.priority, self.line, self.column, normalized, longhands)
+
+    @classmethod
+    def from_record(cls, record):
+        """Returns the declaration stored as `record` by :py:meth:`to_record` (or without its
+        longhands, which are then found again when needed). The normalized values are restored
+        as stored, not recomputed.
+
+        """
+        decl = cls._restore(*record[:6])
+        if len(record) > 6:
+            decl._longhands = tuple(
+                cls._restore(name, value, decl.priority, decl.line, decl.column, normalized)
+                for name, value, normalized in record[6])
+        return decl
+
+    @classmethod
+    def _restore(cls, name, value, priority, line, column, normalized):
+        """Returns the declaration with the given attributes, without normalizing `value`."""
+        decl = cls.__new__(cls)
+        decl.name = name = sys.intern(name)
+        decl.value = CSSText(value)
+        decl.priority = priority
+        decl.line = line
+        decl.column = column
+        if normalized == value:
+            normalized = decl.value  # share the one string
+        decl.key = (name, normalized, priority)
+        decl._hash = hash(decl.key)
+        decl._longhands = None
+        return decl
+
+    def longhands(self):
+        """Returns a tuple of the longhand declarations set by this one, if it is a shorthand
+        (see :py:mod:`css_shorthand`), or ``None``. The longhands have this declaration's
+        priority and position. They are made once, and kept.
+
+        """
+        longhands = self._longhands
+        if longhands is None:
+            expanded = css_shorthand.expand(self.name, self.key[1])
+            longhands = self._longhands = () if expanded is None else tuple(
+                FunctionalDeclaration(name, CSSText(value), self.priority, self.line, self.column)
+                for name, value in expanded)
+        return longhands or None
+
+
+class CSSText(str):
+    """The source text of a value, standing in for a :class:`~.token_data.TokenList` when the
+    tokens themselves aren't available (e.g. when loaded from a :py:class:`css_cache.ParseCache`).
+
+    """
+    __slots__ = ()
+
+    def as_css(self):
+        """Returns the text, as :py:meth:`tinycss.token_data.TokenList.as_css` would."""
+        return str(self)
+
+
+class StyleRule(object):
+    """A ruleset, reduced to what is needed to compare stylesheets.
+
+    .. attribute:: selector
+
+        The selector, as CSS source text.
+
+    .. attribute:: declarations
+
+        A :py:class:`tuple` of the rule's :py:class:`FunctionalDeclaration` in source order.
+
+    .. attribute:: line
+
+        The line number in the source file at which the rule is found.
+
+    .. attribute:: column
+
+        The column in the source file at which the rule is found (begins).
+
+    .. attribute:: context
+
+        The at-rules the rule is nested in, outermost first, as a :py:class:`tuple` of
+        :py:attr:`GroupingRule.condition` strings (e.g. ``('@media print',)``). Empty for a
+        top-level rule.
+
+    .. attribute:: phrases
+
+        The distinct canonical phrases of the selector (see
+        :py:func:`css_selectors.selector_phrases`), by which the rule is indexed. They are kept
+        in the rule's record, so that a sheet loaded from a cache needn't tokenize its selectors.
+
+    """
+    __slots__ = ('selector', 'declarations', 'line', 'column', 'context', 'phrases')
+
+    def __init__(self, selector, declarations, line, column, context=(), phrases=None):
+        self.selector = selector
+        self.declarations = declarations
+        self.line = line
+        self.column = column
+        self.context = context
+        if phrases is None:
+            phrases = css_selectors.selector_phrases(selector)
+        self.phrases = phrases
+
+    @classmethod
+    def from_ruleset(cls, ruleset, context=()):
+        """Returns the :py:class:`StyleRule` for a :py:class:`tinycss.css21.RuleSet`."""
+        return cls(sys.intern(ruleset.selector.as_css()),
+                   tuple(FunctionalDeclaration(decl) for decl in ruleset.declarations),
+                   ruleset.line, ruleset.column, context)
+
+    def to_record(self):
+        """Returns the rule as a tuple of plain values, for :py:mod:`css_cache`."""
+        return (self.selector, self.line, self.column,
+                tuple(decl.to_record() for decl in self.declarations), self.context,
+                self.phrases)
+
+    @classmethod
+    def from_record(cls, record):
+        """Returns the rule stored as `record` by :py:meth:`to_record` (or without its phrases,
+        which are then found again).
+
+        """
+        selector, line, column, declarations, context = record[:5]
+        phrases = None
+        if len(record) > 5:
+            phrases = tuple(sys.intern(phrase) for phrase in record[5])
+        return cls(sys.intern(selector), tuple(FunctionalDeclaration.from_record(decl)
+                                               for decl in declarations), line, column,
+                   tuple(sys.intern(condition) for condition in context), phrases)
+
+    def __repr__(self):
+        return "<StyleRule {0.line}:{0.column} {1}>".format(
+            self, describe_selector(self.context, self.selector))
+
+
+def _style_rules(rules, context=()):
+    """Yields a :py:class:`StyleRule` for each ruleset in the parsed `rules` (see
+    :py:class:`css_parser.StylesheetParser`), including those nested in :py:class:`GroupingRule`
+    objects.
+
+    """
+    for rule in rules:
+        if isinstance(rule, tinycss.css21.RuleSet):
+            yield StyleRule.from_ruleset(rule, context)
+        elif isinstance(rule, css_parser.RuleRecord):
+            yield StyleRule.from_record((rule.selector, rule.line, rule.column, rule.declarations,
+                                         context))
+        elif isinstance(rule, css_parser.GroupingRule):
+            yield from _style_rules(rule.rules, context + (rule.condition,))
+
+
+def describe_selector(context, selector):
+    """Returns a readable description of `selector` within the at-rule `context`, e.g.
+    ``@media print { .a }``.
+
+    """
+    if not context:
+        return selector
+    return "{} {{ {} }}".format(" { ".join(context), selector) + " }" * (len(context) - 1)
+
+
+SELECTOR_MISSING = 'selector-missing'
+SELECTOR_EXTRA = 'selector-extra'
+DECLARATION_MISSING = 'declaration-missing'
+DECLARATION_EXTRA = 'declaration-extra'
+
+Difference = namedtuple('Difference', 'kind selector declaration filename line column context',
+                        defaults=((),))
+Difference.__doc__ = """A difference found by :py:meth:`Stylesheet.diff`: its kind (one of
+:py:data:`SELECTOR_MISSING`, :py:data:`SELECTOR_EXTRA`, :py:data:`DECLARATION_MISSING`,
+:py:data:`DECLARATION_EXTRA`), the selector, the :py:class:`FunctionalDeclaration` (``None`` for
+selector differences), the file name, line and column where the selector or declaration is
+found, and the at-rule context of the selector (see :py:attr:`StyleRule.context`)."""
+
+Rename = namedtuple('Rename', 'context selector other_context other_selector similarity')
+Rename.__doc__ = """A selector missing from one sheet paired by :py:meth:`Stylesheet.find_renames`
+with an extra selector in the other whose declarations are nearly the same: the at-rule context
+and selector in each sheet, and the similarity of their declarations (from 0 to 1)."""
+
+_FINGERPRINT_MASK = (1 << 64) - 1
+
+# the number of missing and extra selectors listed by Stylesheet.check_selectors()
+SELECTOR_PREVIEW = 5
+
+# the number of lines of a report written at once
+OUTPUT_BATCH = 4096
+
+ReportLimits = namedtuple('ReportLimits', 'preview top declarations')
+ReportLimits.__doc__ = """How much of the differences a text report lists: the number of missing
+and extra selectors (see :py:meth:`Stylesheet.check_selectors`), and the number of selectors
+with differing declarations, and of their declarations of each kind (see
+:py:meth:`Stylesheet.check_rules`; ``None`` for all of them)."""
+
+# the limits of a report, unless others are given
+DEFAULT_LIMITS = ReportLimits(SELECTOR_PREVIEW, None, None)
+
+
+# The parsers a Stylesheet can read CSS with (see css_parser.StylesheetParser), by name. The first
+# is the default; "scanner" is css_scanner.ScannerParser, which is faster.
+PARSERS = ('tinycss', 'scanner')
+
+_parsers = {}  # the parsers other than the default, made when first used
+
+
+def _get_parser(name):
+    """Returns the parser named `name`, one of :py:data:`PARSERS`, or the default one if `name` is
+    ``None``.
+
+    """
+    if name is None or name == PARSERS[0]:
+        return Stylesheet._parser
+    parser = _parsers.get(name)
+    if parser is None:
+        if name != 'scanner':
+            raise ValueError("unknown parser {!r}".format(name))
+        parser = _parsers[name] = css_scanner.ScannerParser()
+    return parser
+
+
+class _LazyParser(object):
+    """A class attribute that makes the :py:class:`css_parser.ComparisonParser` when first read,
+    and replaces itself with it.
+
+    """
+    def __get__(self, instance, owner):
+        parser = css_parser.ComparisonParser()
+        setattr(owner, '_parser', parser)
+        return parser
 
 
 class Stylesheet(object):
     """Assorted information about a parsed stylesheet."""
 
-    _parser = tinycss.make_parser('page3')
+    _parser = _LazyParser()
+
+    def __init__(self, filename, parse=None, cache=None, rules=None, incremental=False,
+                 low_memory=False, parser=None):
+        """Parse stylesheet from file ``filename``.
+
+        :param parse: The already-parsed :py:class:`tinycss.css21.Stylesheet` for ``filename``,
+            if any.
+
+        :param cache: A :py:class:`css_cache.ParseCache`. If given, the parsed rules are loaded
+            from the cache when present, without parsing the file, and stored in it otherwise.
 
-    def __init__(self, filename):
-        """Parse stylesheet from file ``filename``."""
+        :param rules: The already-parsed :py:class:`StyleRule` list for ``filename``, if any.
+
+        :param incremental: If true, the sheet keeps its source text, so that :py:meth:`reload`
+            can re-parse just the rules that change.
+
+        :param low_memory: If true, the file is memory-mapped and parsed in pieces of
+            :py:data:`STREAM_CHUNK_SIZE` bytes, and only the compact :py:class:`StyleRule` list is
+            kept (with values as :py:class:`CSSText`), so that memory use doesn't grow with the
+            size of the parse tree; :py:attr:`parse` is ``None``. See also :py:meth:`rule_source`.
+            Files in encodings that aren't ASCII-compatible are parsed whole.
+
+        :param parser: The name of the parser to read the file with, one of :py:data:`PARSERS`
+            (default: the first). Every parser finds the same rules.
+
+        """
+        if incremental and low_memory:
+            raise ValueError("a stylesheet can't be both incremental and low-memory")
         self.filename = filename
-        self.parse = self._parser.parse_stylesheet_file(filename)
-        self._selectors_dict = None  # lazy-loaded
+        self.parse = parse
+        self.rules = rules
+        self._contexts = None  # lazy-loaded
+        self._effective_styles = {}  # lazy-loaded, by value of shorthands
+        self._fingerprints = {}  # lazy-loaded, by value of shorthands
+        self._selector_fingerprints = {}  # lazy-loaded, by values of shorthands and cascade
+        self._source = None  # the source text, segments and their rules, if incremental
+        self._chunks = None  # the pieces the file was parsed in, if low-memory
+        self._source_piece = None  # the text last read by rule_source()
+        if parser is not None and parser not in PARSERS:
+            raise ValueError("unknown parser {!r}".format(parser))
+        self._parser_name = parser  # the parser is only made if the file has to be parsed
+        if parse is None and rules is None and low_memory:
+            with css_instrument.phase('stream'):
+                self.rules = self._stream(cache)
+        cache_key = None
+        css_bytes = None
+        if self.rules is None and parse is None or incremental:
+            with open(filename, 'rb') as css_file:
+                css_bytes = css_file.read()
+        if self.rules is None and parse is None:
+            if cache is not None:
+                with css_instrument.phase('cache'):
+                    cache_key = cache.key(css_bytes, _cache_tag(parser))
+                    records = cache.load(cache_key)
+                    if records is not None:
+                        self.rules = [StyleRule.from_record(record) for record in records]
+            if self.rules is None:
+                with css_instrument.phase('parse'):
+                    self.parse = _get_parser(self._parser_name).parse_stylesheet_bytes(
+                        css_bytes)
+        if self.rules is None:
+            with css_instrument.phase('wrap'):
+                self.rules = list(_style_rules(self.parse.rules))
+            if cache_key is not None:
+                cache.store(cache_key, self.to_records())
+        if incremental:
+            self._track_source(css_bytes)
+
+    def to_records(self):
+        """Returns the parsed rules as plain values, as stored in a cache."""
+        return [rule.to_record() for rule in self.rules]
+
+    def _stream(self, cache):
+        """Parses the sheet's file in pieces, from a memory map, for low-memory mode. Returns the
+        list of :py:class:`StyleRule`, or ``None`` if the file can't be parsed in pieces.
+
+        """
+        with open(self.filename, 'rb') as css_file:
+            if not os.fstat(css_file.fileno()).st_size:
+                return []  # an empty file can't be mapped
+            with mmap.mmap(css_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                cache_key = None
+                if cache is not None:
+                    cache_key = cache.key(buffer, _cache_tag(self._parser_name))
+                    records = cache.load(cache_key)
+                    if records is not None:
+                        return [StyleRule.from_record(record) for record in records]
+                try:
+                    streamed = _stream_rules(buffer, STREAM_CHUNK_SIZE,
+                                             _get_parser(self._parser_name))
+                except UnicodeDecodeError:
+                    # the whole file may decode differently (see tinycss.decoding.decode)
+                    return None
+        if streamed is None:
+            return None
+        rules, self._chunks = streamed
+        if cache_key is not None:
+            cache.store(cache_key, [rule.to_record() for rule in rules])
+        return rules
+
+    def rule_source(self, rule):
+        """Returns the source text of `rule`, one of this sheet's :py:attr:`rules`: its selector
+        and declaration block, read again from the file. In low-memory mode, only the piece of
+        the file holding the rule is read. The text last read is kept, so that reading the rules
+        of a report, mostly in source order, doesn't read the file for each.
+
+        """
+        text, line, column = self._read_source(rule)
+        if rule.line == line:
+            offset = rule.column - column
+        else:
+            newline = next(islice(_FIND_NEWLINES(text), rule.line - line - 1, None))
+            offset = newline.end() + rule.column - 1
+        end = len(text)
+        try:
+            for boundary in _top_level_boundaries(text, _BOUNDARY_SCAN, offset):
+                if boundary is not None:
+                    end = boundary
+                    break
+        except ValueError:
+            pass
+        return text[offset:end].strip()
+
+    def _read_source(self, rule):
+        """Returns a tuple ``(text, line, column)`` of the text of the file holding `rule` (in
+        low-memory mode, of the piece holding it) and the position at which it starts.
+
+        """
+        chunks = self._chunks
+        index = 0
+        if chunks is not None:
+            index = bisect.bisect_right(chunks.positions,
+                                        _position_key(rule.line, rule.column)) - 1
+        piece = self._source_piece
+        if piece is None or piece[0] != index:
+            with open(self.filename, 'rb') as css_file:
+                if chunks is None:
+                    text = tinycss.decoding.decode(css_file.read())[0]
+                    line = column = 1
+                else:
+                    start = chunks.offsets[index]
+                    css_file.seek(start)
+                    if index + 1 < len(chunks.offsets):
+                        data = css_file.read(chunks.offsets[index + 1] - start)
+                    else:
+                        data = css_file.read()
+                    text = _decode_chunk(data, chunks.encoding, start)
+                    line, column = _split_position_key(chunks.positions[index])
+            piece = self._source_piece = (index, text, line, column)
+        return piece[1:]
+
+    def _track_source(self, css_bytes):
+        """Keeps the text of `css_bytes`, split at its top-level rule boundaries into segments,
+        and the rules parsed from each segment, for :py:meth:`reload`.
+
+        """
+        text, encoding = tinycss.decoding.decode(css_bytes)
+        starts = [0] + [boundary for boundary in rule_boundaries(text) if boundary < len(text)]
+        line_starts = [0] + [newline.end() for newline in _FIND_NEWLINES(text)]
+        segment_rules = [[] for _ in starts]
+        for rule in self.rules:
+            offset = line_starts[rule.line - 1] + rule.column - 1
+            segment_rules[bisect.bisect_right(starts, offset) - 1].append(rule)
+        self._source = _Source(text, encoding, starts, segment_rules)
+
+    def reload(self):
+        """Reads the stylesheet's file again, and updates the sheet to match it. Returns the set
+        of ``(context, selector)`` keys whose rules may have changed, or ``None`` if the whole
+        sheet was parsed again (so any of them may have).
+
+        If the sheet was made with ``incremental=True``, only the top-level rules touched by the
+        change are parsed again, and the index and effective styles are updated in place;
+        otherwise, or if the change can't be isolated (e.g. it unbalances a bracket), the whole
+        file is parsed again. After a reload, :py:attr:`parse` is ``None``.
+
+        """
+        with open(self.filename, 'rb') as css_file:
+            css_bytes = css_file.read()
+        self._source_piece = None
+        source = self._source
+        if source is not None:
+            text, encoding = tinycss.decoding.decode(css_bytes)
+            if encoding == source.encoding:
+                if text == source.text:
+                    return set()
+                keys = self._reparse_changed(text)
+                if keys is not None:
+                    return keys
+        self.parse = _get_parser(self._parser_name).parse_stylesheet_bytes(css_bytes)
+        self.rules = list(_style_rules(self.parse.rules))
+        self._contexts = None
+        self._effective_styles = {}
+        self._fingerprints = {}
+        self._selector_fingerprints = {}
+        if source is not None:
+            self._track_source(css_bytes)
+        self.parse = None
+        return None
+
+    def _reparse_changed(self, text):
+        """Parses the segments of the source that differ in `text`, and updates the sheet.
+        Returns the keys whose rules changed, or ``None`` if the change can't be isolated.
+
+        """
+        source = self._source
+        old_text = source.text
+        starts = source.starts
+        prefix = _common_prefix_length(old_text, text)
+        suffix = _common_suffix_length(old_text, text, min(len(old_text), len(text)) - prefix)
+        first = bisect.bisect_right(starts, prefix) - 1
+        last = max(first, bisect.bisect_right(starts, len(old_text) - suffix - 1) - 1)
+        region_start = starts[first]
+        growth = len(text) - len(old_text)
+        # the text after the region is unchanged, but it is only parsed the same if the region
+        # still ends a top-level rule; if it doesn't (e.g. after white space was added at its
+        # end) try taking in the next segment too
+        for last in (last, last + 1):
+            old_end = starts[last + 1] if last + 1 < len(starts) else len(old_text)
+            new_end = old_end + growth
+            region = text[region_start:new_end]
+            boundaries = rule_boundaries(region)
+            if new_end == len(text) or boundaries and boundaries[-1] == len(region):
+                break
+        else:
+            return None
+        # an @import's validity depends on the rules before it
+        if _IMPORT.search(region):
+            return None
+
+        line, column = _source_position(text, region_start)
+        rules = list(_style_rules(
+            _get_parser(self._parser_name).parse_stylesheet(region,
+                                                            encoding=source.encoding).rules))
+        for rule in rules:
+            _shift_rule(rule, 1, line - 1, column - 1)
+        old_end_position = _advance_position(old_text, region_start, old_end, line, column)
+        new_end_position = _advance_position(text, region_start, new_end, line, column)
+        line_delta = new_end_position[0] - old_end_position[0]
+        column_delta = new_end_position[1] - old_end_position[1]
+
+        if line_delta or column_delta:
+            _shift_after(source.segment_rules[last + 1:], old_end_position, line_delta,
+                         column_delta)
+
+        # split the new region into segments, and replace the old ones
+        new_starts = [region_start] + [region_start + boundary for boundary in boundaries
+                                       if region_start + boundary < new_end]
+        new_segments = [[] for _ in new_starts]
+        if rules:
+            line_starts = [0] + [newline.end() for newline in _FIND_NEWLINES(region)]
+            for rule in rules:
+                rule_line = rule.line - line + 1
+                offset = line_starts[rule_line - 1] + rule.column - (column if rule_line == 1
+                                                                     else 1)
+                new_segments[bisect.bisect_right(new_starts, region_start + offset) - 1].append(
+                    rule)
+        old_rules = [rule for segment in source.segment_rules[first:last + 1]
+                     for rule in segment]
+        source.text = text
+        source.starts[first:last + 1] = new_starts
+        source.starts[first + len(new_starts):] = [start + growth for start
+                                                   in source.starts[first + len(new_starts):]]
+        source.segment_rules[first:last + 1] = new_segments
+        self.rules = list(chain.from_iterable(source.segment_rules))
+        self.parse = None
+
+        keys = _rule_keys(old_rules) | _rule_keys(rules)
+        if self._contexts is not None:
+            self._update_index(old_rules, rules)
+            self._restyle(keys)
+        else:
+            self._effective_styles = {}
+            self._fingerprints = {}
+            self._selector_fingerprints = {}
+        return keys
+
+    def _update_index(self, old_rules, new_rules):
+        """Removes `old_rules` from the index and adds `new_rules`, in source order."""
+        contexts = self._contexts
+        for rule in old_rules:
+            index = contexts[rule.context]
+            for phrase in rule.phrases:
+                rules = index[phrase]
+                rules.remove(rule)
+                if not rules:
+                    del index[phrase]
+            if not index:
+                del contexts[rule.context]
+        for rule in new_rules:
+            index = contexts.setdefault(rule.context, {})
+            for phrase in rule.phrases:
+                bisect.insort(index.setdefault(phrase, []), rule, key=_source_order)
+
+    def _restyle(self, keys):
+        """Recomputes the effective styles and the context and selector fingerprints computed so
+        far, for the ``(context, selector)`` keys in `keys`.
+
+        """
+        for shorthands, contexts in self._effective_styles.items():
+            fingerprints = self._fingerprints.get(shorthands)
+            for context, phrase in keys:
+                styles = contexts.setdefault(context, {})
+                style = styles.pop(phrase, None)
+                if fingerprints is not None and style is not None:
+                    fingerprints[context] -= hash((phrase, _style_fingerprint(style)))
+                rules = self.contexts.get(context, {}).get(phrase)
+                if rules:
+                    style = styles[phrase] = {}
+                    for rule in rules:
+                        _cascade(style, expand_shorthands(rule.declarations) if shorthands
+                                 else rule.declarations)
+                    if fingerprints is not None:
+                        fingerprints[context] = (fingerprints.get(context, 0)
+                                                 + hash((phrase, _style_fingerprint(style))))
+                if fingerprints is not None:
+                    if styles:
+                        fingerprints[context] &= _FINGERPRINT_MASK
+                    else:
+                        fingerprints.pop(context, None)
+                if not styles:
+                    del contexts[context]
+        for (shorthands, cascade), contexts in self._selector_fingerprints.items():
+            for context, phrase in keys:
+                fingerprints = contexts.setdefault(context, {})
+                fingerprints.pop(phrase, None)
+                if cascade:
+                    style = self._effective_styles[shorthands].get(context, {}).get(phrase)
+                    if style is not None:
+                        fingerprints[phrase] = _style_fingerprint(style)
+                else:
+                    rules = self.contexts.get(context, {}).get(phrase)
+                    if rules:
+                        fingerprints[phrase] = _declarations_fingerprint(
+                            _rule_declarations(rules, shorthands))
+                if not fingerprints:
+                    del contexts[context]
 
     @property
-    def selector_dict(self):
-        """Returns a :py:class:`dict` whose keys are each selector phrase present in the parsed
-        stylesheet, and whose values are the associated :py:class:`RuleSets`.
+    def contexts(self):
+        """Returns the index of the stylesheet's rules: a :py:class:`dict` whose keys are each
+        at-rule context (see :py:attr:`StyleRule.context`) in the sheet, and whose values are
+        :py:class:`dict` objects mapping each selector phrase in the context to the list of
+        its :py:class:`StyleRule` in source order. The top-level context is ``()``.
+
+        The selector phrases are canonicalized by :py:func:`css_selectors.selector_phrases`, so
+        that e.g. ``A>B`` and ``a > b`` index the same phrase. The index is built once, on first
+        access.
 
         """
-        if self._selectors_dict is None:
-            self._selectors_dict = defaultdict(list)
-            for rule in self.parse.rules:
-                phrases = rule.selector.as_css().split(",")
-                for phrase in phrases:
-                    self._selectors_dict[phrase].append(rule)
-        return self._selectors_dict
+        if self._contexts is None:
+            with css_instrument.phase('index'):
+                contexts = {}
+                for rule in self.rules:
+                    index = contexts.get(rule.context)
+                    if index is None:
+                        index = contexts[rule.context] = {}
+                    for phrase in rule.phrases:
+                        rules = index.get(phrase)
+                        if rules is None:
+                            index[phrase] = [rule]
+                        else:
+                            rules.append(rule)
+            self._contexts = contexts
+        return self._contexts
 
     @property
-    def selector_keys(self):
-        """Returns a :py:class:`set` of the selector phrases parsed from the sytlesheet."""
-        return set([key.strip() for key in self.selector_dict])
+    def selector_dict(self):
+        """Returns a :py:class:`dict` whose keys are each selector phrase present at the top
+        level of the parsed stylesheet (outside any at-rule), and whose values are lists of the
+        associated :py:class:`StyleRule` in source order. See :py:attr:`contexts` for the
+        selectors in at-rules.
 
-    def compare_selectors(self, other):
-        """Compares the selectors in this sheet to those in `other`, which must be an instance
-        of :py:class:`StyleSheet`. Returns a tuple ``(missing, extra)`` where :py:attr:`missing`
-        is the set of selectors in this sheet not found in `other`, and :py:attr:`extra` is the
-        set of selectors in `other` not present in this sheet.
+        """
+        return self.contexts.get((), {})
+
+    def effective_styles(self, shorthands=True):
+        """Returns a :py:class:`dict` whose keys are each at-rule context in the stylesheet, and
+        whose values are :py:class:`dict` objects mapping each selector phrase in the context to
+        its effective style: a :py:class:`dict` mapping each property name to the
+        :py:class:`FunctionalDeclaration` that sets it.
+
+        The styles are computed in one pass over the rules in source order, applying the cascade:
+        a later declaration of a property overrides an earlier one, unless the earlier one is
+        ``!important`` and the later one isn't. If `shorthands` is true, shorthands are expanded
+        first, so that e.g. ``margin-top`` overrides part of an earlier ``margin``.
+
+        The result is computed once for each value of `shorthands`.
 
         """
-        return (self.selector_keys - other.selector_keys,
-                other.selector_keys - self.selector_keys)
+        contexts = self._effective_styles.get(shorthands)
+        if contexts is None:
+            with css_instrument.phase('styles'):
+                contexts = {}
+                for rule in self.rules:
+                    declarations = rule.declarations
+                    if shorthands:
+                        declarations = list(expand_shorthands(declarations))
+                    styles = contexts.get(rule.context)
+                    if styles is None:
+                        styles = contexts[rule.context] = {}
+                    for phrase in rule.phrases:
+                        style = styles.get(phrase)
+                        if style is None:
+                            style = styles[phrase] = {}
+                        _cascade(style, declarations)
+            self._effective_styles[shorthands] = contexts
+        return contexts
+
+    def context_fingerprints(self, shorthands=True):
+        """Returns a :py:class:`dict` mapping each at-rule context in the stylesheet to a
+        fingerprint of its selectors and their effective styles (see :py:meth:`effective_styles`).
+        The fingerprint doesn't depend on the order of the selectors or their declarations, so
+        two sheets' contexts with equal fingerprints can be taken as having no differences.
 
-    def check_selectors(self, other):
-        """Checks the set of distinct selectors in this sheet against the set in `other`.
-        Reports differences found.
+        """
+        fingerprints = self._fingerprints.get(shorthands)
+        if fingerprints is None:
+            fingerprints = {}
+            for context, selectors in self.selector_fingerprints(shorthands).items():
+                total = 0
+                for selector, fingerprint in selectors.items():
+                    total += hash((selector, fingerprint))
+                fingerprints[context] = total & _FINGERPRINT_MASK
+            self._fingerprints[shorthands] = fingerprints
+        return fingerprints
+
+    def selector_fingerprints(self, shorthands=True, cascade=True):
+        """Returns a :py:class:`dict` mapping each at-rule context in the stylesheet to a
+        :py:class:`dict` mapping each selector phrase in the context to a fingerprint of its
+        declarations. If `cascade` is true, the fingerprint is of the selector's effective style
+        (see :py:meth:`effective_styles`); otherwise it is of the set of all the declarations
+        made for the selector, as compared by :py:meth:`diff`. The fingerprint doesn't depend on
+        the order of the declarations, so a selector whose fingerprints in two sheets are equal
+        can be taken as declared the same in both, without comparing its declarations.
+
+        The result is computed once for each value of `shorthands` and `cascade`.
 
         """
-        missing, extra = self.compare_selectors(other)
+        contexts = self._selector_fingerprints.get((shorthands, cascade))
+        if contexts is None:
+            contexts = {}
+            if cascade:
+                source = self.effective_styles(shorthands)
+            else:
+                source = self.contexts
+            with css_instrument.phase('fingerprints'):
+                for context, selectors in source.items():
+                    fingerprints = contexts[context] = {}
+                    for selector, value in selectors.items():
+                        if cascade:
+                            fingerprints[selector] = _style_fingerprint(value)
+                        else:
+                            fingerprints[selector] = _declarations_fingerprint(
+                                _rule_declarations(value, shorthands))
+            self._selector_fingerprints[(shorthands, cascade)] = contexts
+        return contexts
 
-        print("Found {:,} distinct selector phrases in {}.".format(len(self.selector_keys),
-                                                                   self.filename))
-        print("Found {:,} distinct selector phrases in {}.".format(len(other.selector_keys),
-                                                                   other.filename))
+    @property
+    def selector_keys(self):
+        """Returns a set-like view of the top-level selector phrases parsed from the stylesheet.
 
-        print("There are {:,} phrases from {} missing from {}.".format(len(missing),
-                                                                       self.filename,
-                                                                       other.filename))
+        The view supports ``in``, ``-``, ``&``, etc. directly against the index, so no copy is
+        made.
 
-        print("There are {:,} extra phrases found from {}.".format(len(extra),
-                                                                   other.filename))
+        """
+        return self.selector_dict.keys()
 
-        missing = list(missing)
-        missing.sort()
+    def selector_count(self):
+        """Returns the number of distinct selector phrases in the stylesheet, counting those in
+        each at-rule context separately.
 
-        extra = list(extra)
-        extra.sort()
+        """
+        return sum(len(index) for index in self.contexts.values())
 
-        counter = 5
-        print("===== missing (1st 5) =====")
-        for selector in missing:
-            print("[{}]".format(selector))
-            counter -= 1
-            if counter <= 0:
-                break
+    def compare_selectors(self, other):
+        """Compares the top-level selectors in this sheet to those in `other`, which must be an
+        instance of :py:class:`StyleSheet`. Returns a tuple ``(missing, extra)`` where
+        :py:attr:`missing` is the set of selectors in this sheet not found in `other`, and
+        :py:attr:`extra` is the set of selectors in `other` not present in this sheet.
 
-        print("=====  extra (1st 5)  =====")
-        counter = 5
-        for selector in extra:
-            print("[{}]".format(selector))
-            counter -= 1
-            if counter <= 0:
-                break
+        """
+        return (self.selector_keys - other.selector_keys,
+                other.selector_keys - self.selector_keys)
 
-    def check_rules(self, other):
-        """Attempt to compare rules defined in this sheet against those in ``other``."""
-        # KNOWN PROBLEMS:
-        # equivalence of different representations of color codes: #CCC v. #cccccc
-        # equivalence of "shortcut" rules: margin: 5px; v. margin-bottom: 5px; margin-top 5px; etc.
+    def find_renames(self, other, threshold=DEFAULT_THRESHOLD, shorthands=True):
+        """Pairs the selectors missing from `other` with the extra selectors in `other` whose
+        effective styles (see :py:meth:`effective_styles`) are nearly the same, as when a
+        selector was renamed (``.btn-primary`` to ``.button--primary``) or moved to another
+        at-rule context. Returns a list of :py:class:`Rename`, most similar first.
 
-        for selector in self.selector_keys:
-            if selector in other.selector_keys:
+        Two selectors are paired if the Jaccard similarity of their sets of declarations is at
+        least `threshold`, each with the most similar selector not already paired (see
+        :py:func:`css_fuzzy.match_similar`, which avoids comparing every pair).
+
+        """
+        missing = {}
+        extra = {}
+        for difference in self.diff(other, declarations=False, shorthands=shorthands):
+            if difference.kind == SELECTOR_MISSING:
+                sheet, found = self, missing
+            else:
+                sheet, found = other, extra
+            style = sheet.effective_styles(shorthands)[difference.context][difference.selector]
+            found[(difference.context, difference.selector)] = {str(decl)
+                                                                for decl in style.values()}
+        return [Rename(old[0], old[1], new[0], new[1], similarity)
+                for old, new, similarity in css_fuzzy.match_similar(missing, extra, threshold)]
+
+    def diff(self, other, selectors=True, declarations=True, shorthands=True, cascade=True):
+        """Generates the differences between this sheet and `other`, as :py:class:`Difference`
+        records. The records are produced as they are found, so the differences can be consumed
+        without holding them all in memory.
+
+        Selectors are compared within each at-rule context (see :py:attr:`contexts`), so a
+        selector in ``@media print`` is only matched by the same selector in ``@media print``.
+
+        If `shorthands` is true, shorthand declarations (``margin``, ``font``, ...) are compared
+        as the longhand declarations they set (see :py:func:`expand_shorthands`), and reported
+        that way.
+
+        If `cascade` is true, each selector's effective styles (see :py:meth:`effective_styles`)
+        are compared, property by property: a property whose value differs is reported as the
+        missing declaration and the extra one. Contexts whose fingerprints (see
+        :py:meth:`context_fingerprints`) match are skipped without looking at their selectors.
+        Otherwise, the sets of all the declarations made for each selector are compared. Either
+        way, selectors whose fingerprints (see :py:meth:`selector_fingerprints`) match are skipped
+        without comparing their declarations.
+
+        Selector records (:py:data:`SELECTOR_MISSING` then :py:data:`SELECTOR_EXTRA`) come first,
+        if `selectors` is true. Then, if `declarations` is true, for each selector present in both
+        sheets, come its :py:data:`DECLARATION_MISSING` then its :py:data:`DECLARATION_EXTRA`
+        records, in source order.
+
+        """
+        self_contexts = self.contexts
+        other_contexts = other.contexts
+        unchanged = frozenset()
+        if cascade:
+            self_fingerprints = self.context_fingerprints(shorthands)
+            other_fingerprints = other.context_fingerprints(shorthands)
+            unchanged = frozenset(context for context, fingerprint in self_fingerprints.items()
+                                  if other_fingerprints.get(context) == fingerprint)
+        if selectors:
+            for context, self_index in self_contexts.items():
+                if context in unchanged:
+                    continue
+                other_index = other_contexts.get(context, {})
+                for selector, rules in self_index.items():
+                    if selector not in other_index:
+                        yield Difference(SELECTOR_MISSING, selector, None, self.filename,
+                                         rules[0].line, rules[0].column, context)
+            for context, other_index in other_contexts.items():
+                if context in unchanged:
+                    continue
+                self_index = self_contexts.get(context, {})
+                for selector, rules in other_index.items():
+                    if selector not in self_index:
+                        yield Difference(SELECTOR_EXTRA, selector, None, other.filename,
+                                         rules[0].line, rules[0].column, context)
+        if not declarations:
+            return
+
+        if cascade:
+            yield from self._diff_styles(other, shorthands, unchanged)
+            return
+
+        self_fingerprints = self.selector_fingerprints(shorthands, cascade=False)
+        other_fingerprints = other.selector_fingerprints(shorthands, cascade=False)
+        for context, self_index in self_contexts.items():
+            other_index = other_contexts.get(context)
+            if other_index is None:
+                continue
+            self_selectors = self_fingerprints[context]
+            other_selectors = other_fingerprints[context]
+            for selector, self_rules in self_index.items():
+                other_rules = other_index.get(selector)
+                if other_rules is None or self_selectors[selector] == other_selectors[selector]:
+                    continue
                 # we care whether the set of declarations for the selector is the same
                 # we don't care if the organization is the same
                 # i.e.
@@ -236,45 +1049,1330 @@ class Stylesheet(object):
                 #         width: 100px;
                 # }
                 # so we keep a set of declarations over all the selector's rules
-                self_declarations = set()
-                other_declarations = set()
-                if selector == '#re-tabs li.on':
-                    print("found it")
-                for rule in self.selector_dict[selector]:
-                    self_declarations.update([FunctionalDeclaration(decl) for decl
-                                              in rule.declarations])
-                for rule in other.selector_dict[selector]:
-                    other_declarations.update([FunctionalDeclaration(decl) for decl
-                                               in rule.declarations])
-                missing = self_declarations - other_declarations
-                extra = other_declarations - self_declarations
-                if missing or extra:
-                    print("selector: {}".format(selector))
-                if missing:
-                    print("    found in {} but not {}:".format(self.filename, other.filename))
-                    for decl in missing:
-                        print("        {}".format(decl))
-                if extra:
-                    print("    found in {} but not {}:".format(other.filename, self.filename))
-                    for decl in extra:
-                        print("        {}".format(decl))
-
-
-def usage():
-    sys.stderr.write("Usage: {} file1 file2\n".format(os.path.basename(sys.argv[0])))
-    sys.stderr.write("       Compares file1 and file2 (which should be CSS stylesheets) and\n")
-    sys.stderr.write("       reports functional differences between the two.\n")
+                self_declarations = _rule_declarations(self_rules, shorthands)
+                other_declarations = _rule_declarations(other_rules, shorthands)
+                self_set = set(self_declarations)
+                other_set = set(other_declarations)
+                if self_set == other_set:
+                    continue
+                for decl in _unique_declarations(self_declarations, other_set):
+                    yield Difference(DECLARATION_MISSING, selector, decl, self.filename,
+                                     decl.line, decl.column, context)
+                for decl in _unique_declarations(other_declarations, self_set):
+                    yield Difference(DECLARATION_EXTRA, selector, decl, other.filename,
+                                     decl.line, decl.column, context)
+
+    def _diff_styles(self, other, shorthands, unchanged):
+        """Generates the declaration differences between the effective styles of the selectors
+        in both this sheet and `other`, skipping the contexts in `unchanged`.
+
+        """
+        other_contexts = other.effective_styles(shorthands)
+        self_fingerprints = self.selector_fingerprints(shorthands)
+        other_fingerprints = other.selector_fingerprints(shorthands)
+        for context, self_styles in self.effective_styles(shorthands).items():
+            other_styles = other_contexts.get(context)
+            if other_styles is None or context in unchanged:
+                continue
+            self_selectors = self_fingerprints[context]
+            other_selectors = other_fingerprints[context]
+            for selector, self_style in self_styles.items():
+                other_fingerprint = other_selectors.get(selector)
+                if other_fingerprint is not None and other_fingerprint != self_selectors[selector]:
+                    yield from _diff_style(self, other, context, selector, self_style,
+                                           other_styles[selector])
+
+    def diff_keys(self, other, keys, shorthands=True):
+        """Generates the differences between this sheet and `other`, as :py:meth:`diff` does with
+        its default arguments, for the ``(context, selector)`` keys in `keys` only (e.g. those
+        returned by :py:meth:`reload`).
+
+        """
+        self_contexts = self.effective_styles(shorthands)
+        other_contexts = other.effective_styles(shorthands)
+        for context, selector in keys:
+            self_style = self_contexts.get(context, {}).get(selector)
+            other_style = other_contexts.get(context, {}).get(selector)
+            if self_style is None and other_style is None:
+                continue
+            if other_style is None:
+                rule = self.contexts[context][selector][0]
+                yield Difference(SELECTOR_MISSING, selector, None, self.filename, rule.line,
+                                 rule.column, context)
+            elif self_style is None:
+                rule = other.contexts[context][selector][0]
+                yield Difference(SELECTOR_EXTRA, selector, None, other.filename, rule.line,
+                                 rule.column, context)
+            elif other_style != self_style:
+                yield from _diff_style(self, other, context, selector, self_style, other_style)
+
+    def check_selectors(self, other, preview=SELECTOR_PREVIEW):
+        """Checks the set of distinct selectors in this sheet against the set in `other`.
+        Reports differences found, listing the first `preview` missing and extra selectors, in
+        sorted order. Returns a tuple ``(missing, extra)`` of the numbers of selectors missing
+        from and extra in `other`.
+
+        """
+        missing = extra = 0
+        missing_preview = []
+        extra_preview = []
+        for difference in self.diff(other, declarations=False):
+            description = describe_selector(difference.context, difference.selector)
+            if difference.kind == SELECTOR_MISSING:
+                missing += 1
+                _keep_smallest(missing_preview, description, preview)
+            else:
+                extra += 1
+                _keep_smallest(extra_preview, description, preview)
+
+        lines = [
+            "Found {:,} distinct selector phrases in {}.".format(self.selector_count(),
+                                                                 self.filename),
+            "Found {:,} distinct selector phrases in {}.".format(other.selector_count(),
+                                                                 other.filename),
+            "There are {:,} phrases from {} missing from {}.".format(missing, self.filename,
+                                                                     other.filename),
+            "There are {:,} extra phrases found from {}.".format(extra, other.filename),
+            "===== missing (1st {}) =====".format(preview)]
+        lines.extend("[{}]".format(selector) for selector in missing_preview)
+        lines.append("=====  extra (1st {})  =====".format(preview))
+        lines.extend("[{}]".format(selector) for selector in extra_preview)
+        _write_lines(lines)
+
+        return missing, extra
+
+    def check_rules(self, other, top=None, max_declarations=None, sources=False):
+        """Attempt to compare rules defined in this sheet against those in ``other``. Reports the
+        differing declarations of each selector, in source order; or, if `top` isn't ``None``,
+        of the `top` selectors with the most differences only, most first. If `max_declarations`
+        isn't ``None``, at most that many declarations of each kind are listed per selector. If
+        `sources` is true, the source text of the selector's rules in each sheet (see
+        :py:meth:`rule_source`) is listed too. Ends with the numbers of differing declarations
+        of each kind. Returns the number of selectors whose declarations differ.
+
+        The report is made in one pass over the differences; with `top`, only the differences of
+        the selectors that may be listed are kept (in a heap).
+
+        """
+        counts = {DECLARATION_MISSING: 0, DECLARATION_EXTRA: 0}
+        changed = 0
+        heap = []
+        lines = []
+        for key, differences in groupby(self.diff(other, selectors=False),
+                                        lambda difference: (difference.context,
+                                                            difference.selector)):
+            differences = list(differences)
+            for difference in differences:
+                counts[difference.kind] += 1
+            changed += 1
+            if top is None:
+                lines.extend(self._rule_lines(other, key, differences, max_declarations,
+                                              sources))
+                if len(lines) >= OUTPUT_BATCH:
+                    _write_lines(lines)
+                    lines = []
+            elif len(heap) < top:
+                heapq.heappush(heap, (len(differences), -changed, key, differences))
+            elif top:
+                heapq.heappushpop(heap, (len(differences), -changed, key, differences))
+        if top is not None:
+            lines.append("===== changed (top {} of {:,}, by differences) =====".format(top,
+                                                                                   changed))
+            for _, _, key, differences in sorted(heap, reverse=True):
+                lines.extend(self._rule_lines(other, key, differences, max_declarations,
+                                              sources))
+        lines.append("===== {:,} selectors differ: {:,} declarations only in {}, {:,} only in {} "
+                     "=====".format(changed, counts[DECLARATION_MISSING], self.filename,
+                                    counts[DECLARATION_EXTRA], other.filename))
+        _write_lines(lines)
+        return changed
+
+    def _rule_lines(self, other, key, differences, max_declarations, sources):
+        """Generates the lines of :py:meth:`check_rules`'s report of the `differences` of the
+        ``(context, selector)`` `key`.
+
+        """
+        yield "selector: {}".format(describe_selector(*key))
+        if sources:
+            context, selector = key
+            for sheet in (self, other):
+                for rule in sheet.contexts.get(context, {}).get(selector, ()):
+                    yield "    in {}, line {}:".format(sheet.filename, rule.line)
+                    for line in sheet.rule_source(rule).splitlines():
+                        yield "        " + line
+        for kind, found in groupby(differences, attrgetter('kind')):
+            found = list(found)
+            if kind == DECLARATION_MISSING:
+                yield "    found in {} but not {}:".format(self.filename, other.filename)
+            else:
+                yield "    found in {} but not {}:".format(other.filename, self.filename)
+            listed = found if max_declarations is None else found[:max_declarations]
+            for difference in listed:
+                yield "        {}".format(difference.declaration)
+            if len(listed) < len(found):
+                yield "        ... and {:,} more".format(len(found) - len(listed))
+
+    def check_renames(self, other, threshold=DEFAULT_THRESHOLD):
+        """Reports the selectors missing from `other` that seem to have been renamed, as found by
+        :py:meth:`find_renames`. Returns the number of them.
+
+        """
+        renames = self.find_renames(other, threshold)
+        lines = ["===== renamed ({:,}) =====".format(len(renames))]
+        lines.extend("[{}] -> [{}] ({:.0%})".format(
+            describe_selector(rename.context, rename.selector),
+            describe_selector(rename.other_context, rename.other_selector),
+            rename.similarity) for rename in renames)
+        _write_lines(lines)
+        return len(renames)
+
+
+def _diff_style(sheet, other, context, selector, style, other_style):
+    """Generates the differences between the effective styles `style` of `selector` in `sheet`
+    and `other_style` in `other`.
+
+    """
+    for name, decl in style.items():
+        if other_style.get(name) != decl:
+            yield Difference(DECLARATION_MISSING, selector, decl, sheet.filename, decl.line,
+                             decl.column, context)
+    for name, decl in other_style.items():
+        if style.get(name) != decl:
+            yield Difference(DECLARATION_EXTRA, selector, decl, other.filename, decl.line,
+                             decl.column, context)
+
+
+def _rule_keys(rules):
+    """Returns the set of ``(context, selector)`` keys of the rules in `rules`."""
+    return {(rule.context, phrase)
+            for rule in rules for phrase in rule.phrases}
+
+
+def _source_order(rule):
+    return (rule.line, rule.column)
+
+
+def _shift_after(segments, position, line_delta, column_delta):
+    """Moves the rules in `segments`, which follow a change ending at `position`, and their
+    declarations, by `line_delta` lines, and those on the line of `position` by `column_delta`
+    columns.
+
+    """
+    line = position[0]
+    for segment in segments:
+        if not line_delta and segment and segment[0].line > line:
+            break
+        for rule in segment:
+            _shift_rule(rule, line, line_delta, column_delta)
+
+
+def _shift_rule(rule, line, line_delta, column_delta):
+    """Moves `rule` and its declarations as :py:func:`_shift_position` does."""
+    _shift_position(rule, line, line_delta, column_delta)
+    for decl in rule.declarations:
+        _shift_position(decl, line, line_delta, column_delta)
+        # the effective styles may hold the longhands of shorthands
+        # pylint: disable=W0212
+        for longhand in decl._longhands or ():
+            _shift_position(longhand, line, line_delta, column_delta)
+
+
+def _shift_position(item, line, line_delta, column_delta):
+    """Moves `item` (a rule or declaration) `line_delta` lines down and, if it is on line `line`
+    (before the move), `column_delta` columns right.
+
+    """
+    if item.line == line:
+        item.column += column_delta
+    item.line += line_delta
+
+
+def _style_fingerprint(style):
+    """Returns a fingerprint of the effective style `style` that doesn't depend on the order of
+    its declarations.
+
+    """
+    return sum(hash(decl) for decl in style.values()) & _FINGERPRINT_MASK
+
+
+def _declarations_fingerprint(declarations):
+    """Returns a fingerprint of the set of `declarations` that doesn't depend on their order or
+    on repeated declarations.
+
+    """
+    return sum(set(map(hash, declarations))) & _FINGERPRINT_MASK
+
+
+def _cascade(style, declarations):
+    """Applies `declarations`, in order, to `style`, a :py:class:`dict` of property name to
+    the :py:class:`FunctionalDeclaration` in effect.
+
+    """
+    for decl in declarations:
+        current = style.get(decl.name)
+        if current is None or decl.priority or not current.priority:
+            style[decl.name] = decl
+
+
+def expand_shorthands(declarations):
+    """Yields the :py:class:`FunctionalDeclaration` objects in `declarations`, with each
+    shorthand replaced by the longhand declarations it sets (see :py:mod:`css_shorthand`). The
+    longhands have the shorthand's priority and position.
+
+    """
+    for decl in declarations:
+        longhands = decl.longhands()
+        if longhands is None:
+            yield decl
+        else:
+            yield from longhands
+
+
+def _rule_declarations(rules, shorthands):
+    """Returns a list of the declarations in all of `rules`, in source order, with shorthands
+    expanded if `shorthands` is true.
+
+    """
+    declarations = []
+    for rule in rules:
+        if shorthands:
+            declarations.extend(expand_shorthands(rule.declarations))
+        else:
+            declarations.extend(rule.declarations)
+    return declarations
+
+
+def _unique_declarations(declarations, others):
+    """Yields, in order, each distinct declaration in `declarations` that is not in `others`."""
+    seen = set()
+    for decl in declarations:
+        if decl not in others and decl not in seen:
+            seen.add(decl)
+            yield decl
+
+
+def _write_lines(lines):
+    """Writes the strings in `lines` to standard output, each as a line, in batches of
+    :py:data:`OUTPUT_BATCH` lines, rather than one write per line.
+
+    """
+    lines = iter(lines)
+    write = sys.stdout.write
+    batch = list(islice(lines, OUTPUT_BATCH))
+    while batch:
+        batch.append('')
+        with css_instrument.phase('output'):
+            write('\n'.join(batch))
+        batch = list(islice(lines, OUTPUT_BATCH))
+
+
+def _keep_smallest(smallest, item, count):
+    """Adds `item` to the sorted list `smallest`, keeping only its `count` smallest items."""
+    if count <= 0:
+        return
+    if len(smallest) < count or item < smallest[-1]:
+        bisect.insort(smallest, item)
+        del smallest[count:]
+
+
+# Matches the tokens that matter when finding the top-level rule boundaries of a stylesheet.
+# Comments, strings, escapes and URLs are matched whole so that any brackets they contain are
+# skipped. A "url(" that doesn't make a whole URL is "bad": tinycss reads it as a BAD_URI token,
+# which takes in the brackets after it, so the text after it can't be split.
+_BOUNDARY_SCAN = re.compile(r"""
+      /\*[\s\S]*?(?:\*/|\Z)
+    | "(?:[^"\\\n\r\f]|\\[\s\S])*"?
+    | '(?:[^'\\\n\r\f]|\\[\s\S])*'?
+    | (?<![-\w#@])url\(\s*(?:"(?:[^"\\\n\r\f]|\\[\s\S])*"|'(?:[^'\\\n\r\f]|\\[\s\S])*'
+                          |(?:[^()"'\s\\]|\\[\s\S])*)\s*\)
+    | (?P<bad>(?<![-\w#@])url\()
+    | \\[\s\S]
+    | (?P<import>@import\b)
+    | (?P<open>[{(\[])
+    | (?P<close>[)\]])
+    | (?P<brace>\})
+""", re.VERBOSE | re.IGNORECASE)
+
+# the same, for the undecoded bytes of a sheet in an ASCII-compatible encoding
+_BOUNDARY_SCAN_BYTES = re.compile(_BOUNDARY_SCAN.pattern.encode('ascii'),
+                                  re.VERBOSE | re.IGNORECASE)
+
+_OPENERS = {'}': '{', ')': '(', ']': '[', b'}': b'{', b')': b'(', b']': b'['}
+
+# Sheets (in characters) smaller than this are parsed in one piece by parse_stylesheets().
+PARALLEL_CHUNK_SIZE = 512 * 1024
+
+# Identifies the parser and the form of StyleRule.to_record() in cache keys, as CACHE_TAG (made
+# when first used, since it needs the tinycss version); bump the format number whenever either,
+# or the normalization of values, changes.
+_CACHE_TAG_FORMAT = 'tinycss-{}/page3/10'
+
+
+_VERSION_ASSIGNMENT = re.compile(r"""^VERSION\s*=\s*['"]([^'"]+)['"]""", re.MULTILINE)
+
+_tinycss_version_found = None
+
+
+def _tinycss_version():
+    """Returns the version of tinycss. Unless tinycss is loaded already, it is read from the
+    package's version module, so that a run that only reads cached sheets doesn't load tinycss
+    (which loads its parser).
+
+    """
+    global _tinycss_version_found  # pylint: disable=W0603
+    if _tinycss_version_found is None:
+        version = None
+        if type(tinycss) is not type(sys):  # pylint: disable=C0123
+            # not loaded yet: the lazy module holds the spec it will be loaded from
+            spec = object.__getattribute__(tinycss, '__spec__')
+            try:
+                with open(os.path.join(spec.submodule_search_locations[0], 'version.py'),
+                          encoding='utf-8') as version_file:
+                    match = _VERSION_ASSIGNMENT.search(version_file.read())
+                version = match and match.group(1)
+            except (OSError, TypeError, IndexError):
+                pass
+        _tinycss_version_found = version or tinycss.VERSION
+    return _tinycss_version_found
+
+
+def _cache_tag(parser=None):
+    """Returns :py:data:`CACHE_TAG`, or for a parser other than the default (named `parser`), the
+    tag of its entries. Every parser finds the same rules, but each keeps its own entries, so that
+    one can't hide a fault of another.
+
+    """
+    tag = _CACHE_TAG_FORMAT.format(_tinycss_version())
+    if parser is None or parser == PARSERS[0]:
+        return tag
+    return tag + '+' + parser
+
+
+class _Source(object):
+    """The source of a :py:class:`Stylesheet` made with ``incremental=True``: its text and
+    encoding, the offsets at which its top-level segments (see :py:func:`rule_boundaries`)
+    start, and the list of :py:class:`StyleRule` parsed from each segment.
+
+    """
+    __slots__ = ('text', 'encoding', 'starts', 'segment_rules')
+
+    def __init__(self, text, encoding, starts, segment_rules):
+        self.text = text
+        self.encoding = encoding
+        self.starts = starts
+        self.segment_rules = segment_rules
+
+
+_IMPORT = re.compile(r'@import\b', re.IGNORECASE)
+
+# the size of the blocks in which texts are compared to find where they differ
+_COMPARE_BLOCK = 64 * 1024
+
+
+def _common_prefix_length(text1, text2):
+    """Returns the length of the longest common prefix of `text1` and `text2`."""
+    limit = min(len(text1), len(text2))
+    length = 0
+    block = _COMPARE_BLOCK
+    while block:
+        while length + block <= limit and (text1[length:length + block]
+                                           == text2[length:length + block]):
+            length += block
+        block //= 2
+    return length
+
+
+def _common_suffix_length(text1, text2, limit):
+    """Returns the length, up to `limit`, of the longest common suffix of `text1` and `text2`."""
+    end1 = len(text1)
+    end2 = len(text2)
+    length = 0
+    block = _COMPARE_BLOCK
+    while block:
+        while length + block <= limit and (text1[end1 - length - block:end1 - length]
+                                           == text2[end2 - length - block:end2 - length]):
+            length += block
+        block //= 2
+    return length
+
+
+def _source_position(text, offset):
+    """Returns the ``(line, column)`` of `offset` in `text`, counted as tinycss counts them."""
+    line = (1 + text.count('\n', 0, offset) + text.count('\r', 0, offset)
+            + text.count('\f', 0, offset) - text.count('\r\n', 0, offset))
+    line_start = max(text.rfind('\n', 0, offset), text.rfind('\r', 0, offset),
+                     text.rfind('\f', 0, offset)) + 1
+    return line, offset - line_start + 1
+
+
+def _advance_position(text, start, end, line, column):
+    """Returns the ``(line, column)`` of `end` in `text`, given that of `start`."""
+    newline = None
+    for newline in _FIND_NEWLINES(text, start, end):
+        line += 1
+    if newline is None:
+        return line, column + end - start
+    return line, end - newline.end() + 1
+
+
+def rule_boundaries(css_unicode):
+    """Returns a list of the offsets in `css_unicode` just past the end of each top-level block
+    (a ruleset or an at-rule with a body). Parsing the text on either side of any of those
+    offsets separately gives the same rules as parsing it whole.
+
+    No offsets are returned before an ``@import`` rule, since whether the rule is allowed depends
+    on the rules before it. If the brackets in `css_unicode` are mismatched, or it has a
+    ``url(`` that isn't a whole URL, no offsets are returned at all.
+
+    """
+    boundaries = []
+    try:
+        for boundary in _top_level_boundaries(css_unicode, _BOUNDARY_SCAN):
+            if boundary is None:
+                boundaries = []
+            else:
+                boundaries.append(boundary)
+    except ValueError:
+        return []
+    return boundaries
+
+
+def _top_level_boundaries(text, scan, start=0):
+    """Generates the offsets in `text` (a :py:class:`str`, or bytes-like object if `scan` is
+    :py:data:`_BOUNDARY_SCAN_BYTES`), from `start` on, just past the end of each top-level
+    block, and ``None`` for each top-level ``@import``. Raises :py:exc:`ValueError` at a
+    mismatched bracket, or a ``url(`` that isn't a whole URL.
+
+    """
+    stack = []
+    for match in scan.finditer(text, start):
+        kind = match.lastgroup
+        if kind == 'open':
+            stack.append(match.group(kind))
+        elif kind in ('close', 'brace'):
+            if not stack or stack.pop() != _OPENERS[match.group(kind)]:
+                raise ValueError("mismatched bracket at offset {}".format(match.start()))
+            if kind == 'brace' and not stack:
+                yield match.end()
+        elif kind == 'import' and not stack:
+            yield None
+        elif kind == 'bad':
+            raise ValueError("bad URL at offset {}".format(match.start()))
+
+
+# Pieces (in bytes) in which low-memory mode decodes and parses a sheet. The parse tree of a
+# piece takes some 40 times its size.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# bytes at the start of a sheet looked at to find its encoding in low-memory mode
+_ENCODING_SNIFF_SIZE = 4096
+
+_NON_ASCII = bytes(range(0x80, 0x100))
+
+
+class _Chunks(object):
+    """The pieces a low-memory :py:class:`Stylesheet` was parsed in: the encoding, and arrays of
+    the byte offset and of the position (see :py:func:`_position_key`) where each piece starts.
+
+    """
+    __slots__ = ('encoding', 'offsets', 'positions')
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.offsets = array('Q')
+        self.positions = array('Q')
+
+
+def _position_key(line, column):
+    """Returns a single integer ordering positions as ``(line, column)`` tuples do."""
+    return line << 32 | column
+
+
+def _split_position_key(key):
+    return key >> 32, key & 0xffffffff
+
+
+def _splittable_encoding(encoding):
+    """Returns whether text in `encoding` can be split at any ASCII byte, as is true of UTF-8
+    and of the single-byte encodings that extend ASCII.
+
+    """
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        return False
+    if name == 'utf-8':
+        return True
+    return (len(bytes(range(256)).decode(name, 'replace')) == 256
+            and bytes(range(128)).decode(name, 'replace') == ''.join(map(chr, range(128))))
+
+
+def _decode_chunk(data, encoding, offset):
+    text = data.decode(encoding)
+    if offset == 0 and text.startswith('\ufeff'):
+        text = text[1:]  # tinycss.decoding.decode drops the byte order mark
+    return text
+
+
+def _stream_rules(buffer, chunk_size, parser):
+    """Parses the stylesheet whose bytes are in the bytes-like `buffer` with `parser`, in pieces of
+    about `chunk_size` bytes, decoding each as it goes. Returns a tuple of the list of compact
+    :py:class:`StyleRule` (see :py:meth:`StyleRule.from_record`) and the :py:class:`_Chunks`, or
+    ``None`` if the sheet's encoding isn't ASCII-compatible (so that it can't be split as bytes).
+
+    """
+    # the sniffed bytes mustn't end in a partial character
+    encoding = tinycss.decoding.decode(buffer[:_ENCODING_SNIFF_SIZE].rstrip(_NON_ASCII))[1]
+    if not _splittable_encoding(encoding):
+        return None
+    rules = []
+    chunks = _Chunks(encoding)
+    line = column = 1
+    for start, end in _stream_chunks(buffer, chunk_size):
+        text = _decode_chunk(buffer[start:end], encoding, start)
+        chunks.offsets.append(start)
+        chunks.positions.append(_position_key(line, column))
+        parsed = parser.parse_stylesheet(text, encoding=encoding)
+        for rule in _style_rules(parsed.rules):
+            # keep only the text of the values, not their tokens
+            compact = StyleRule.from_record(rule.to_record())
+            _shift_rule(compact, 1, line - 1, column - 1)
+            rules.append(compact)
+        line, column = _advance_position(text, 0, len(text), line, column)
+    return rules, chunks
+
+
+def _stream_chunks(buffer, chunk_size):
+    """Generates ``(start, end)`` ranges covering the bytes-like `buffer`, split at top-level
+    block boundaries into pieces of at least `chunk_size` bytes (but the last). The rest of the
+    buffer after a mismatched bracket or a bad URL isn't split.
+
+    """
+    start = 0
+    try:
+        for boundary in _top_level_boundaries(buffer, _BOUNDARY_SCAN_BYTES):
+            if boundary is not None and boundary - start >= chunk_size:
+                yield start, boundary
+                start = boundary
+    except ValueError:
+        pass
+    if start < len(buffer):
+        yield start, len(buffer)
+
+
+def split_stylesheet(css_unicode, chunk_size=PARALLEL_CHUNK_SIZE):
+    """Splits `css_unicode` at top-level rule boundaries into pieces of roughly `chunk_size`
+    characters. Returns a list of tuples ``(text, line, column)``, where ``line`` and ``column``
+    are the position in `css_unicode` at which ``text`` begins.
+
+    """
+    if len(css_unicode) <= chunk_size:
+        return [(css_unicode, 1, 1)]
+    chunks = []
+    start = 0
+    line = 1
+    column = 1
+    for boundary in rule_boundaries(css_unicode):
+        if boundary - start < chunk_size:
+            continue
+        chunks.append((css_unicode[start:boundary], line, column))
+        newline = None
+        for newline in _FIND_NEWLINES(css_unicode, start, boundary):
+            line += 1
+        if newline is None:
+            column += boundary - start
+        else:
+            column = boundary - newline.end() + 1
+        start = boundary
+    if start < len(css_unicode):
+        chunks.append((css_unicode[start:], line, column))
+    return chunks
+
+
+def _parse_chunk(text, line, column, encoding, parser):
+    """Parses `text`, which begins at position (`line`, `column`) of its stylesheet, with the
+    parser named `parser` (see :py:data:`PARSERS`). Returns the records (see
+    :py:meth:`StyleRule.to_record`) of the style rules found, which are much cheaper to send back
+    from a worker process than the parse tree.
+
+    """
+    # padding the text to its original position makes tinycss number everything correctly; the
+    # padding is just white space between rules, which the parser skips
+    padded = '\n' * (line - 1) + ' ' * (column - 1) + text
+    sheet = _get_parser(parser).parse_stylesheet(padded, encoding=encoding)
+    return [rule.to_record() for rule in _style_rules(sheet.rules)]
+
+
+def parse_stylesheets(filenames, jobs=None, chunk_size=PARALLEL_CHUNK_SIZE, cache=None,
+                      parser=None):
+    """Parses the files in `filenames` at the same time, in a pool of `jobs` processes (default:
+    one per CPU). Files larger than `chunk_size` characters are split at top-level rule boundaries
+    and the pieces parsed in parallel. Returns a list of :py:class:`Stylesheet`, in the same order
+    as `filenames`, with the same rules as those parsed serially. The workers send back compact
+    rule records, not parse trees, so the sheets have no :py:attr:`~Stylesheet.parse`.
+
+    If `cache` (a :py:class:`css_cache.ParseCache`) is given, files found in it aren't parsed,
+    and the others are added to it.
+
+    `parser` is the name of the parser to use (see :py:data:`PARSERS`).
+
+    """
+    from concurrent.futures import ProcessPoolExecutor  # pylint: disable=C0415
+    with ProcessPoolExecutor(jobs or None) as executor:
+        pending = []
+        for filename in filenames:
+            with open(filename, 'rb') as css_file:
+                css_bytes = css_file.read()
+            cache_key = None
+            if cache is not None:
+                cache_key = cache.key(css_bytes, _cache_tag(parser))
+                records = cache.load(cache_key)
+                if records is not None:
+                    pending.append((filename, records, None, None))
+                    continue
+            css_unicode, encoding = tinycss.decoding.decode(css_bytes)
+            futures = [executor.submit(_parse_chunk, text, line, column, encoding, parser)
+                       for text, line, column in split_stylesheet(css_unicode, chunk_size)]
+            pending.append((filename, None, futures, cache_key))
+
+        sheets = []
+        for filename, records, futures, cache_key in pending:
+            if records is None:
+                records = [record for future in futures for record in future.result()]
+                if cache_key is not None:
+                    cache.store(cache_key, records)
+            rules = [StyleRule.from_record(record) for record in records]
+            sheets.append(Stylesheet(filename, rules=rules, parser=parser))
+    return sheets
+
+
+BatchResult = namedtuple('BatchResult', 'filename report missing extra changed')
+BatchResult.__doc__ = """The comparison of one target sheet against the baseline in batch mode: the
+report text, and the numbers of missing and extra selectors and of selectors whose declarations
+differ."""
+
+# the baseline Stylesheet, the cache, the parser name and the report limits, in batch worker
+# processes
+_batch_baseline = None
+_batch_cache = None
+_batch_parser = None
+_batch_limits = None
+
+
+def _init_batch_worker(filename, records, cache, parser, limits):
+    # pylint: disable=W0603
+    global _batch_baseline, _batch_cache, _batch_parser, _batch_limits
+    _batch_baseline = Stylesheet(filename, rules=[StyleRule.from_record(record)
+                                                  for record in records])
+    _batch_cache = cache
+    _batch_parser = parser
+    _batch_limits = limits
+
+
+def _check(sheet1, sheet2, limits=DEFAULT_LIMITS):
+    """Returns a tuple ``(report, missing, extra, changed)`` of the report of the differences
+    between `sheet1` and `sheet2` (see :py:meth:`Stylesheet.check_selectors` and
+    :py:meth:`Stylesheet.check_rules`), within the :py:class:`ReportLimits` `limits`, and the
+    numbers they return.
+
+    """
+    report = io.StringIO()
+    with redirect_stdout(report):
+        missing, extra = sheet1.check_selectors(sheet2, limits.preview)
+        changed = sheet1.check_rules(sheet2, limits.top, limits.declarations)
+    return report.getvalue(), missing, extra, changed
+
+
+def _compare_to_baseline(baseline, target, cache, parser, limits):
+    sheet = Stylesheet(target, cache=cache, parser=parser)
+    return BatchResult(target, *_check(baseline, sheet, limits))
+
+
+def _compare_in_worker(target):
+    return _compare_to_baseline(_batch_baseline, target, _batch_cache, _batch_parser,
+                                _batch_limits)
+
+
+def expand_targets(patterns):
+    """Returns the file names matched by the glob patterns in `patterns`, in order. A pattern
+    that matches nothing is kept as given (and rejected by :py:func:`main`).
+
+    """
+    targets = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else []
+        targets.extend(matches or [pattern])
+    return targets
+
+
+def compare_batch(baseline, targets, jobs=None, cache=None, parser=None,
+                  limits=DEFAULT_LIMITS):
+    """Compares the :py:class:`Stylesheet` `baseline` against each file in `targets`, in a pool of
+    `jobs` processes (default: one per CPU; ``1`` compares in this process). The baseline is sent
+    to each worker once, already parsed. Yields a :py:class:`BatchResult` per target, in the order
+    of `targets`. The targets are read with the parser named `parser` (see :py:data:`PARSERS`),
+    and the reports kept within the :py:class:`ReportLimits` `limits`.
+
+    """
+    if jobs == 1:
+        for target in targets:
+            yield _compare_to_baseline(baseline, target, cache, parser, limits)
+        return
+    from concurrent.futures import ProcessPoolExecutor  # pylint: disable=C0415
+    with ProcessPoolExecutor(jobs or None, initializer=_init_batch_worker,
+                             initargs=(baseline.filename, baseline.to_records(), cache,
+                                       parser, limits)) as pool:
+        yield from pool.map(_compare_in_worker, targets)
+
+
+def print_batch_summary(results):
+    """Prints a table summarizing the :py:class:`BatchResult` objects in `results`."""
+    results = list(results)
+    width = max([len('target')] + [len(result.filename) for result in results])
+    lines = ["{:<{}}  {:>9}  {:>9}  {:>9}".format('target', width, 'missing', 'extra', 'changed')]
+    lines.extend("{:<{}}  {:>9,}  {:>9,}  {:>9,}".format(result.filename, width, result.missing,
+                                                        result.extra, result.changed)
+                 for result in results)
+    _write_lines(lines)
+
+
+TreeResult = namedtuple('TreeResult', 'old new identical report missing extra changed')
+TreeResult.__doc__ = """The comparison of a pair of files in tree mode: the file in the first
+tree and the file in the second (either is ``None`` for a file found in only one tree), whether
+the files are byte-identical (and so weren't parsed), the report text, and the numbers of missing
+and extra selectors and of selectors whose declarations differ."""
+
+# the similarity (see css_fuzzy.match_similar) of the statements of two files with different
+# paths above which they are paired, as a file that was renamed or moved
+TREE_THRESHOLD = 0.5
+
+# the statements of a stylesheet, as compared to pair files: selectors, declarations and so on
+_SPLIT_STATEMENTS = re.compile(rb'\s*[{};]\s*').split
+
+
+def find_stylesheets(directory):
+    """Returns the sorted list of the paths, relative to `directory`, of the ``.css`` files in
+    the tree under `directory`.
+
+    """
+    found = []
+    for root, _, files in os.walk(directory):
+        relative = os.path.relpath(root, directory)
+        found.extend(os.path.normpath(os.path.join(relative, name))
+                     for name in files if name.lower().endswith('.css'))
+    return sorted(found)
+
+
+def _file_digest(filename):
+    with open(filename, 'rb') as css_file:
+        return hashlib.sha256(css_file.read()).digest()
+
+
+def _statements(filename):
+    with open(filename, 'rb') as css_file:
+        return set(_SPLIT_STATEMENTS(css_file.read())) - {b''}
+
+
+def pair_stylesheets(directory1, directory2, threshold=TREE_THRESHOLD):
+    """Pairs the ``.css`` files in the tree under `directory1` with those under `directory2`
+    (see :py:func:`find_stylesheets`): first those with the same relative path, then, of the
+    rest, those whose contents are at least `threshold` alike (as sets of statements, see
+    :py:func:`css_fuzzy.match_similar`), as files renamed or moved. Returns a tuple
+    ``(pairs, removed, added)`` of the sorted list of ``(path1, path2)`` relative path pairs and
+    the sorted lists of the relative paths found only under `directory1` and only under
+    `directory2`.
+
+    """
+    files1 = find_stylesheets(directory1)
+    files2 = find_stylesheets(directory2)
+    common = set(files1) & set(files2)
+    pairs = [(path, path) for path in files1 if path in common]
+    removed = {path: _statements(os.path.join(directory1, path))
+               for path in files1 if path not in common}
+    added = {path: _statements(os.path.join(directory2, path))
+             for path in files2 if path not in common}
+    for path1, path2, _ in css_fuzzy.match_similar(removed, added, threshold):
+        pairs.append((path1, path2))
+        del removed[path1], added[path2]
+    return sorted(pairs), sorted(removed), sorted(added)
+
+
+def _compare_pair(file1, file2, cache, parser, limits):
+    sheet1 = Stylesheet(file1, cache=cache, parser=parser)
+    sheet2 = Stylesheet(file2, cache=cache, parser=parser)
+    return TreeResult(file1, file2, False, *_check(sheet1, sheet2, limits))
+
+
+def compare_trees(directory1, directory2, jobs=None, cache=None, parser=None,
+                  threshold=TREE_THRESHOLD, limits=DEFAULT_LIMITS):
+    """Compares the stylesheets in the tree under `directory1` with those under `directory2`,
+    paired by :py:func:`pair_stylesheets` with `threshold`. Pairs of byte-identical files (by
+    hash) are skipped without being parsed; the others are compared in a pool of `jobs`
+    processes (default: one per CPU; ``1`` compares in this process), with the cache `cache`
+    and the parser named `parser`, if any, and their reports kept within the
+    :py:class:`ReportLimits` `limits`. Yields a :py:class:`TreeResult` for each pair, in
+    order, then for each file found only under `directory1`, then for each found only under
+    `directory2`.
+
+    """
+    pairs, removed, added = pair_stylesheets(directory1, directory2, threshold)
+    pairs = [(os.path.join(directory1, path1), os.path.join(directory2, path2))
+             for path1, path2 in pairs]
+    # files of different sizes can't be identical, so aren't read to be hashed
+    identical = [os.path.getsize(file1) == os.path.getsize(file2)
+                 and _file_digest(file1) == _file_digest(file2) for file1, file2 in pairs]
+    different = [pair for pair, same in zip(pairs, identical) if not same]
+    arguments = ([file1 for file1, _ in different], [file2 for _, file2 in different],
+                 [cache] * len(different), [parser] * len(different),
+                 [limits] * len(different))
+    if jobs == 1 or len(different) < 2:
+        pool = nullcontext()
+        compared = map(_compare_pair, *arguments)
+    else:
+        from concurrent.futures import ProcessPoolExecutor  # pylint: disable=C0415
+        pool = ProcessPoolExecutor(jobs or None)
+        compared = pool.map(_compare_pair, *arguments)
+    with pool:
+        for (file1, file2), same in zip(pairs, identical):
+            if same:
+                yield TreeResult(file1, file2, True, '', 0, 0, 0)
+            else:
+                yield next(compared)
+    for path in removed:
+        yield TreeResult(os.path.join(directory1, path), None, False, '', 0, 0, 0)
+    for path in added:
+        yield TreeResult(None, os.path.join(directory2, path), False, '', 0, 0, 0)
+
+
+def print_tree_summary(results):
+    """Prints a table summarizing the :py:class:`TreeResult` objects in `results`: the pairs
+    that differ, with their totals, then the numbers of identical pairs, and the files found in
+    only one tree.
+
+    """
+    results = list(results)
+    compared = [result for result in results
+                if result.old is not None and result.new is not None and not result.identical]
+    names = ["{0.old} -> {0.new}".format(result) for result in compared]
+    width = max([len('pair')] + [len(name) for name in names])
+    lines = ["{:<{}}  {:>9}  {:>9}  {:>9}".format('pair', width, 'missing', 'extra', 'changed')]
+    lines.extend("{:<{}}  {:>9,}  {:>9,}  {:>9,}".format(name, width, result.missing,
+                                                        result.extra, result.changed)
+                 for name, result in zip(names, compared))
+    lines.append("{:<{}}  {:>9,}  {:>9,}  {:>9,}".format(
+        'total', width, sum(result.missing for result in compared),
+        sum(result.extra for result in compared), sum(result.changed for result in compared)))
+    lines.append("{:,} pairs compared, {:,} identical.".format(
+        len(compared), sum(1 for result in results if result.identical)))
+    for result in results:
+        if result.new is None:
+            lines.append("only in the first tree: {}".format(result.old))
+        elif result.old is None:
+            lines.append("only in the second tree: {}".format(result.new))
+    _write_lines(lines)
+
+
+# seconds between checks of the watched files for changes
+WATCH_INTERVAL = 0.5
+
+
+def _file_stamp(filename):
+    """Returns a value that changes when the file `filename` does, or ``None`` if it is
+    missing (e.g. while an editor replaces it).
+
+    """
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _difference_id(difference):
+    """Identifies `difference` regardless of its position, so that a rule that merely moves isn't
+    reported as changed.
+
+    """
+    return (difference.kind, difference.context, difference.selector,
+            None if difference.declaration is None else str(difference.declaration))
+
+
+def format_difference(difference):
+    """Returns a one-line description of the :py:class:`Difference` `difference`."""
+    text = "{} {}".format(difference.kind,
+                          describe_selector(difference.context, difference.selector))
+    if difference.declaration is not None:
+        text += ": {}".format(difference.declaration)
+    return text + " ({0.filename}:{0.line}:{0.column})".format(difference)
+
+
+class DiffWatcher(object):
+    """Keeps two stylesheets made with ``incremental=True`` and the differences between them,
+    and updates both when the sheets' files change.
+
+    .. attribute:: sheets
+
+        The tuple of the two :py:class:`Stylesheet` objects compared.
+
+    .. attribute:: differences
+
+        A :py:class:`dict` mapping each ``(context, selector)`` key with differences to a
+        :py:class:`dict` of its :py:class:`Difference` records.
+
+    """
+    def __init__(self, sheet1, sheet2):
+        self.sheets = (sheet1, sheet2)
+        self._stamps = [_file_stamp(sheet.filename) for sheet in self.sheets]
+        self.differences = {}
+        for difference in sheet1.diff(sheet2):
+            key = (difference.context, difference.selector)
+            self.differences.setdefault(key, {})[_difference_id(difference)] = difference
+
+    def refresh(self):
+        """Reloads the sheets whose files changed since the last call (see
+        :py:meth:`Stylesheet.reload`), and compares the selectors that changed. Returns a tuple
+        ``(removed, added)`` of the lists of the differences no longer found and of those newly
+        found.
+
+        The selectors with differences are compared again too, as an edit elsewhere may have
+        moved them, so that the differences kept have their new positions.
+
+        """
+        keys = set()
+        reloaded = False
+        for index, sheet in enumerate(self.sheets):
+            stamp = _file_stamp(sheet.filename)
+            if stamp is None or stamp == self._stamps[index]:
+                continue
+            self._stamps[index] = stamp
+            reloaded = True
+            changed = sheet.reload()
+            if changed is None or keys is None:
+                keys = None
+            else:
+                keys |= changed
+        if not reloaded:
+            return [], []
+        sheet1, sheet2 = self.sheets
+        if keys is not None:
+            keys |= set(self.differences)
+        else:
+            keys = set(self.differences) | {(context, selector)
+                                            for sheet in self.sheets
+                                            for context, index in sheet.contexts.items()
+                                            for selector in index}
+        found = {}
+        for difference in sheet1.diff_keys(sheet2, keys):
+            key = (difference.context, difference.selector)
+            found.setdefault(key, {})[_difference_id(difference)] = difference
+        removed = []
+        added = []
+        for key in keys:
+            old = self.differences.pop(key, {})
+            new = found.get(key, {})
+            removed.extend(difference for id_, difference in old.items() if id_ not in new)
+            added.extend(difference for id_, difference in new.items() if id_ not in old)
+            if new:
+                self.differences[key] = new
+        return removed, added
+
+
+def watch(sheet1, sheet2, interval=WATCH_INTERVAL):
+    """Watches the files of `sheet1` and `sheet2` (made with ``incremental=True``), printing the
+    differences that go away (``-``) and appear (``+``) each time either changes, until
+    interrupted.
+
+    """
+    watcher = DiffWatcher(sheet1, sheet2)
+    print("Watching {} and {} for changes.".format(sheet1.filename, sheet2.filename))
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(interval)
+            start = time.perf_counter()
+            removed, added = watcher.refresh()
+            if removed or added:
+                lines = ["--- {:,} resolved, {:,} new ({:.0f} ms)".format(
+                    len(removed), len(added), (time.perf_counter() - start) * 1000)]
+                lines.extend("- " + format_difference(difference) for difference in removed)
+                lines.extend("+ " + format_difference(difference) for difference in added)
+                _write_lines(lines)
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+
+
+def print_report(sheet1, sheet2, renames=None, limits=DEFAULT_LIMITS, sources=False):
+    """Prints the report of the differences between the :py:class:`Stylesheet` objects `sheet1`
+    and `sheet2`, within the :py:class:`ReportLimits` `limits`: their selectors, their rules
+    (with their source text, if `sources` is true) and, if `renames` (a similarity threshold)
+    isn't ``None``, the selectors that seem to have been renamed.
+
+    """
+    sheet1.check_selectors(sheet2, limits.preview)
+    sheet1.check_rules(sheet2, limits.top, limits.declarations, sources)
+    if renames is not None:
+        sheet1.check_renames(sheet2, renames)
+
+
+class ServerError(Exception):
+    """An error reported by a comparison server (see :py:mod:`css_server`)."""
+
+
+def compare_remote(socket_path, file1, file2, output_format='text', renames=None, parser=None,
+                   limits=DEFAULT_LIMITS):
+    """Has the comparison server listening on the Unix socket `socket_path` (see
+    :py:mod:`css_server`) compare the files `file1` and `file2`, and returns its output: the
+    bytes that comparing them with `output_format`, `renames` and `limits` here would write. Raises
+    :py:class:`ServerError` if the server can't compare them.
+
+    """
+    import socket  # pylint: disable=C0415
+    request = {'files': [os.path.abspath(file1), os.path.abspath(file2)],
+               'names': [file1, file2], 'format': output_format, 'renames': renames,
+               'parser': parser, 'limits': list(limits)}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with connection.makefile('rb') as response:
+            header = json.loads(response.readline())
+            output = response.read(header['length'])
+    if header['error'] is not None:
+        raise ServerError(header['error'])
+    return output
+
+
+def _build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Compares file1 and file2 (which should be CSS stylesheets) and reports "
+        "functional differences between the two.")
+    parser.add_argument('file1')
+    parser.add_argument('file2', nargs='+',
+                        help="with --batch, any number of files or glob patterns")
+    parser.add_argument('--batch', action='store_true',
+                        help="compare file1 against each of the files given; with -j the "
+                        "comparisons run in a pool of processes")
+    parser.add_argument('--tree', action='store_true',
+                        help="file1 and file2 are directories: compare the .css files in their "
+                        "trees, paired by relative path or by content, skipping identical pairs; "
+                        "with -j the comparisons run in a pool of processes")
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help="parse in a pool of N processes (0: one per CPU); large sheets are "
+                        "also split and parsed in pieces")
+    parser.add_argument('--format', choices=FORMATS, default='text',
+                        help="text: a report for people (the default); jsonl: one JSON object "
+                        "per difference; columnar: a compact binary table (see css_formats)")
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help="write the differences to FILE instead of standard output")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help="keep parsed stylesheets in DIR and reuse them when a file's "
+                        "contents are unchanged")
+    parser.add_argument('--watch', action='store_true',
+                        help="after the report, keep watching both files, re-parse only the rules "
+                        "that change and print the differences that come and go")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="memory-map each file and parse it in pieces, keeping only what the "
+                        "comparison needs (for very large sheets)")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        metavar='MB', help="maximum size of the cache directory (default: "
+                        "%(default)s MB)")
+    parser.add_argument('--renames', action='store_true',
+                        help="also pair missing and extra selectors whose declarations are "
+                        "nearly the same, as renamed")
+    parser.add_argument('--rename-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        metavar='SIMILARITY', help="with --renames, how alike the declarations "
+                        "must be (more than 0, at most 1; default: %(default)s)")
+    parser.add_argument('--preview', type=int, default=SELECTOR_PREVIEW, metavar='N',
+                        help="list the first N missing and extra selectors (default: "
+                        "%(default)s)")
+    parser.add_argument('--top', type=int, metavar='N',
+                        help="list the differing declarations of only the N selectors with the "
+                        "most differences, most first")
+    parser.add_argument('--max-declarations', type=int, metavar='N',
+                        help="list at most N differing declarations of each kind per selector")
+    parser.add_argument('--sources', action='store_true',
+                        help="list the source text of the rules of each selector whose "
+                        "declarations differ, read again from the files")
+    parser.add_argument('--parser', choices=PARSERS, default=PARSERS[0],
+                        help="the CSS parser: tinycss (the default) or scanner, which is faster "
+                        "and finds the same rules")
+    parser.add_argument('--connect', metavar='SOCKET',
+                        help="have the comparison server listening on SOCKET (see css_server) "
+                        "compare the files, reusing the sheets it has already parsed")
+    parser.add_argument('--stats', action='store_true',
+                        help="report the wall and CPU time, live objects and peak memory of each "
+                        "phase to standard error")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="run under cProfile, write the statistics to FILE (for pstats) and "
+                        "list the hottest functions to standard error")
+    return parser
 
 
 def main():
-    if len(sys.argv) < 3:
-        usage()
-        sys.exit(1)
-
-    sheet1 = Stylesheet(sys.argv[1])
-    sheet2 = Stylesheet(sys.argv[2])
-    sheet1.check_selectors(sheet2)
-    sheet1.check_rules(sheet2)
+    arg_parser = _build_arg_parser()
+    args = arg_parser.parse_args()
+    if len(args.file2) > 1 and not args.batch:
+        arg_parser.error("more than one file to compare requires --batch")
+    if args.tree and (len(args.file2) > 1 or args.batch or args.watch or args.low_memory
+                      or args.connect or args.renames):
+        arg_parser.error("--tree only supports comparing two directories, without --batch, "
+                         "--watch, --low-memory, --connect or --renames")
+    if args.tree and not all(os.path.isdir(path) for path in (args.file1, args.file2[0])):
+        arg_parser.error("--tree compares two directories")
+    if args.tree and args.format != 'text':
+        arg_parser.error("--tree only supports --format text")
+    if args.batch and args.format != 'text':
+        arg_parser.error("--batch only supports --format text")
+    if args.batch:
+        missing = [target for target in expand_targets(args.file2) if not os.path.isfile(target)]
+        if missing:
+            arg_parser.error("--batch found no file for {}".format(', '.join(missing)))
+    if args.watch and (args.batch or args.format != 'text'):
+        arg_parser.error("--watch only supports comparing two files, with --format text")
+    if args.low_memory and (args.batch or args.watch or args.jobs != 1):
+        arg_parser.error("--low-memory only supports comparing two files, without --watch or -j: "
+                         "the sheets are parsed one piece at a time")
+    if args.renames and (args.batch or args.format != 'text'):
+        arg_parser.error("--renames only supports comparing two files, with --format text")
+    if min(limit for limit in (args.preview, args.top, args.max_declarations, 0)
+           if limit is not None) < 0:
+        arg_parser.error("--preview, --top and --max-declarations can't be negative")
+    if not 0 < args.rename_threshold <= 1:
+        arg_parser.error("--rename-threshold must be more than 0 and at most 1")
+    if args.sources and (args.batch or args.tree or args.connect or args.format != 'text'):
+        arg_parser.error("--sources only supports comparing two files, with --format text, "
+                         "without --connect")
+    if args.connect and (args.batch or args.watch or args.low_memory):
+        arg_parser.error("--connect only supports comparing two files, without --watch or "
+                         "--low-memory")
+    if args.connect and (args.cache_dir or args.jobs != 1
+                         or args.cache_size != DEFAULT_MAX_BYTES // (1024 * 1024)):
+        arg_parser.error("--cache-dir, --cache-size and -j don't apply with --connect: the "
+                         "server parses the sheets, with its own cache and threads")
+
+    instrument = css_instrument.Instrument() if args.stats else None
+    try:
+        with css_instrument.collecting(instrument), css_instrument.profiling(args.profile):
+            _run(args)
+    finally:
+        if instrument is not None:
+            instrument.report()
+
+
+def _run(args):
+    """Runs the comparison the command line `args` ask for."""
+    limits = ReportLimits(args.preview, args.top, args.max_declarations)
+    renames = args.rename_threshold if args.renames else None
+    if args.connect:
+        with css_instrument.phase('server'):
+            try:
+                output = compare_remote(args.connect, args.file1, args.file2[0], args.format,
+                                        renames, args.parser, limits)
+            except ServerError as error:
+                sys.exit("comp_css: error: {}".format(error))
+            except OSError as error:
+                sys.exit("comp_css: error: can't reach the comparison server at {}: {}".format(
+                    args.connect, error.strerror or error))
+            except ValueError:
+                sys.exit("comp_css: error: the comparison server at {} sent no valid "
+                         "response".format(args.connect))
+        with _output_stream(args.output, 'wb') as stream:
+            stream.write(output)
+        return
+
+    cache = None
+    if args.cache_dir:
+        cache = css_cache.ParseCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+    if args.batch:
+        with css_instrument.phase('load'):
+            baseline = Stylesheet(args.file1, cache=cache, parser=args.parser)
+        results = []
+        with _output_stream(args.output, 'w') as stream, redirect_stdout(stream):
+            with css_instrument.phase('compare'):
+                for result in compare_batch(baseline, expand_targets(args.file2), args.jobs,
+                                            cache, args.parser, limits):
+                    print("===== {} =====".format(result.filename))
+                    sys.stdout.write(result.report)
+                    results.append(result)
+                print_batch_summary(results)
+        return
+
+    if args.tree:
+        results = []
+        with _output_stream(args.output, 'w') as stream, redirect_stdout(stream):
+            with css_instrument.phase('compare'):
+                for result in compare_trees(args.file1, args.file2[0], args.jobs, cache,
+                                            args.parser, limits=limits):
+                    if result.report:
+                        print("===== {0.old} -> {0.new} =====".format(result))
+                        sys.stdout.write(result.report)
+                    results.append(result)
+                print_tree_summary(results)
+        return
+
+    if args.watch:
+        with css_instrument.phase('load'):
+            sheet1 = Stylesheet(args.file1, cache=cache, incremental=True,
+                                parser=args.parser)
+            sheet2 = Stylesheet(args.file2[0], cache=cache, incremental=True,
+                                parser=args.parser)
+        with _output_stream(args.output, 'w') as stream, redirect_stdout(stream):
+            with css_instrument.phase('compare'):
+                print_report(sheet1, sheet2, renames, limits, args.sources)
+            with css_instrument.phase('watch'):
+                watch(sheet1, sheet2)
+        return
+
+    with css_instrument.phase('load'):
+        if args.low_memory:
+            sheet1 = Stylesheet(args.file1, cache=cache, low_memory=True,
+                                parser=args.parser)
+            sheet2 = Stylesheet(args.file2[0], cache=cache, low_memory=True,
+                                parser=args.parser)
+        elif args.jobs == 1:
+            sheet1 = Stylesheet(args.file1, cache=cache, parser=args.parser)
+            sheet2 = Stylesheet(args.file2[0], cache=cache, parser=args.parser)
+        else:
+            sheet1, sheet2 = parse_stylesheets([args.file1, args.file2[0]], args.jobs,
+                                               cache=cache, parser=args.parser)
+
+    with css_instrument.phase('compare'):
+        if args.format == 'text':
+            with _output_stream(args.output, 'w') as stream, redirect_stdout(stream):
+                print_report(sheet1, sheet2, renames, limits, args.sources)
+        else:
+            # the index and styles are built here, so that the output phase is mostly writing
+            for sheet in (sheet1, sheet2):
+                sheet.contexts  # pylint: disable=W0104
+                sheet.context_fingerprints()
+        if args.format == 'jsonl':
+            with _output_stream(args.output, 'w') as stream, css_instrument.phase('output'):
+                css_formats.write_jsonl(sheet1.diff(sheet2), stream)
+        elif args.format == 'columnar':
+            with _output_stream(args.output, 'wb') as stream, css_instrument.phase('output'):
+                css_formats.write_columnar(sheet1.diff(sheet2), stream)
+
+
+def _output_stream(filename, mode):
+    """Returns a context manager for the output stream: the file `filename` opened with `mode`,
+    or standard output if `filename` is ``None``.
+
+    """
+    if filename is not None:
+        if 'b' in mode:
+            return open(filename, mode)
+        return open(filename, mode, encoding='utf-8')
+    return nullcontext(sys.stdout.buffer if 'b' in mode else sys.stdout)
+
+
+def __getattr__(name):
+    # the names whose values are only made when first used
+    if name == 'CACHE_TAG':
+        return _cache_tag()
+    if name in ('ComparisonParser', 'GroupingRule'):
+        return getattr(css_parser, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 if __name__ == '__main__':
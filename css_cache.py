@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""An on-disk cache of parsed stylesheets, keyed by the hash of the stylesheet's contents.
+
+Entries are stored as compressed :py:mod:`marshal` data, one file per entry, and the total size
+of the cache directory is kept under a cap by removing the least recently used entries.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import hashlib
+import marshal
+import os
+import sys
+import zlib
+
+from css_defaults import DEFAULT_MAX_BYTES
+
+_SUFFIX = '.cssc'
+
+
+class ParseCache(object):
+    """A directory of cached parse results.
+
+    .. attribute:: directory
+
+        The directory holding the cache entries. It is created if necessary.
+
+    .. attribute:: max_bytes
+
+        The maximum total size of the entries. When a new entry takes the cache over this size,
+        entries are removed, least recently used first.
+
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(css_bytes, tag):
+        """Returns the cache key for a stylesheet whose contents are `css_bytes`. `tag` should
+        identify everything else the parsed form depends on (parser and format versions).
+
+        """
+        digest = hashlib.sha256(css_bytes)
+        # marshal's format can change between python versions
+        digest.update('\0{}\0{}\0{}'.format(tag, marshal.version,
+                                            sys.implementation.cache_tag).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def load(self, key):
+        """Returns the object stored under `key`, or ``None`` if there isn't one (or it can't be
+        read). A successful load marks the entry as recently used.
+
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as entry:
+                data = entry.read()
+            os.utime(path)
+            return marshal.loads(zlib.decompress(data))
+        except (OSError, ValueError, EOFError, TypeError, zlib.error):
+            return None
+
+    def store(self, key, obj):
+        """Stores `obj`, which must be serializable by :py:mod:`marshal`, under `key`, then
+        evicts old entries as needed to stay under :py:attr:`max_bytes`.
+
+        """
+        # tempfile is slow to load, and readers of the cache don't need it
+        import tempfile  # pylint: disable=C0415
+        data = zlib.compress(marshal.dumps(obj), 1)
+        # write to a temporary file and rename, so that concurrent readers never see a partial
+        # entry
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as entry:
+                entry.write(data)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in :py:attr:`max_bytes`."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
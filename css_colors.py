@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Canonical forms of CSS 3 color values, so that equal colors written differently (``#CCC``,
+``#cccccc``, ``rgb(204, 204, 204)``, ``hsl(0, 0%, 80%)``) compare equal.
+
+Every color is reduced to one of:
+
+* ``#rrggbb`` (lower-case hex) for opaque colors,
+* ``rgba(r,g,b,a)`` for colors with transparency (``transparent`` is ``rgba(0,0,0,0)``),
+* ``currentcolor``.
+
+Large stylesheets repeat the same few hundred colors many thousands of times, so results are
+memoized in a bounded cache keyed on the color's source text. Colors already in canonical form,
+such as those of values read from a cache, are recognized without loading tinycss.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import re
+from functools import lru_cache
+
+# the maximum number of distinct color strings whose canonical forms are remembered
+COLOR_CACHE_SIZE = 4096
+
+_COLOR_FUNCTIONS = frozenset(('rgb', 'rgba', 'hsl', 'hsla'))
+
+# the canonical forms (see _canonical)
+_CANONICAL = re.compile(r"""
+    \#[0-9a-f]{{6}}
+  | rgba\({channel},{channel},{channel},0(?:\.[0-9]{{0,2}}[1-9])?\)
+  | currentcolor
+""".format(channel=r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])'), re.VERBOSE).fullmatch
+
+_color3 = None  # tinycss.color3, loaded when first needed
+
+
+def _color3_module():
+    """Returns :py:mod:`tinycss.color3`, loading it on the first call."""
+    global _color3  # pylint: disable=W0603
+    if _color3 is None:
+        import tinycss.color3  # pylint: disable=C0415
+        _color3 = tinycss.color3
+    return _color3
+
+
+def _channel(value):
+    """Returns a color channel in 0..1 as an integer in 0..255, clipped as CSS requires."""
+    return min(255, max(0, int(round(value * 255))))
+
+
+def _canonical(color):
+    """Returns the canonical form of `color`, as returned by
+    :py:func:`tinycss.color3.parse_color`, or ``None`` if it isn't a color.
+
+    """
+    if color is None:
+        return None
+    if color == 'currentColor':
+        return 'currentcolor'
+    red, green, blue = _channel(color.red), _channel(color.green), _channel(color.blue)
+    if color.alpha >= 1:
+        return '#{:02x}{:02x}{:02x}'.format(red, green, blue)
+    return 'rgba({},{},{},{:g})'.format(red, green, blue, round(color.alpha, 3))
+
+
+@lru_cache(maxsize=COLOR_CACHE_SIZE)
+def canonical_color(css_string):
+    """Returns the canonical form of the color value `css_string` (any CSS 3 form: ``#abc``,
+    ``#aabbcc``, ``rgb()``, ``rgba()``, ``hsl()``, ``hsla()`` or a color keyword), or ``None`` if
+    it is not a valid color.
+
+    """
+    if _CANONICAL(css_string):
+        return css_string
+    return _canonical(_color3_module().parse_color_string(css_string))
+
+
+def _may_be_color(token):
+    """Returns whether `token` could be a color, judging by its type and name only."""
+    type_ = token.type
+    if type_ == 'HASH':
+        return True
+    if type_ == 'IDENT':
+        return token.value.lower() in _color3_module().COLOR_KEYWORDS
+    if type_ == 'FUNCTION':
+        return token.function_name.lower() in _COLOR_FUNCTIONS
+    return False
+
+
+def token_color(token):
+    """Returns the canonical form of the color value `token` (a tinycss token), or ``None`` if
+    it is not a color.
+
+    """
+    if _may_be_color(token):
+        return canonical_color(token.as_css())
+    return None
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Defaults and choices shared by the command line of :mod:`comp_css` and the modules it loads on
+first use (:mod:`css_cache`, :mod:`css_formats`, :mod:`css_fuzzy`), kept apart so that building
+the command line, e.g. for ``--help``, doesn't load those modules.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+
+# the most bytes a css_cache.ParseCache keeps, by default
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# the output formats (see css_formats)
+FORMATS = ('text', 'jsonl', 'columnar')
+
+# the similarity above which css_fuzzy.match_similar pairs two sets, by default
+DEFAULT_THRESHOLD = 0.8
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
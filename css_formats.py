@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Machine-readable output of the differences found by :py:meth:`comp_css.Stylesheet.diff`, and
+loaders for post-processing them.
+
+Two formats are supported:
+
+``jsonl``
+    JSON Lines: one JSON object per difference, with the keys ``kind``, ``selector``,
+    ``declaration`` (the declaration text, or ``null``), ``file``, ``line``, ``column`` and
+    ``context`` (the list of enclosing at-rules).
+
+``columnar``
+    A compact binary table. Every string is stored once, in a string table, and each field is a
+    column of 32-bit unsigned integers (string indexes, or line and column numbers), which load
+    directly into :py:class:`array.array` objects.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import json
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+COLUMNAR_MAGIC = b'CSSDIFF\x02'
+
+_HEADER = struct.Struct('<8sIII')  # magic, record count, string count, string bytes
+
+# the integer columns of the columnar format, in file order
+COLUMNS = ('kind', 'selector', 'declaration', 'file', 'line', 'column', 'context')
+
+# the at-rules of a context are joined with this to store them in one string
+_CONTEXT_SEPARATOR = '\n'
+
+Record = namedtuple('Record', 'kind selector declaration filename line column context')
+Record.__doc__ = """A difference loaded from a file. As
+:py:class:`comp_css.Difference`, except that ``declaration`` is the declaration's text."""
+
+
+def _uint32_array(values=()):
+    result = array('I', values)
+    assert result.itemsize == 4, "array('I') must be 32 bits"
+    return result
+
+
+def _to_little_endian(column):
+    if sys.byteorder != 'little':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+def _declaration_text(difference):
+    return None if difference.declaration is None else str(difference.declaration)
+
+
+def write_jsonl(differences, stream):
+    """Writes the :py:class:`comp_css.Difference` records in `differences` to the text `stream`,
+    one JSON object per line. Returns the number of records written.
+
+    """
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    count = 0
+    for difference in differences:
+        stream.write(encoder.encode({
+            'kind': difference.kind,
+            'selector': difference.selector,
+            'declaration': _declaration_text(difference),
+            'file': difference.filename,
+            'line': difference.line,
+            'column': difference.column,
+            'context': list(difference.context),
+        }))
+        stream.write('\n')
+        count += 1
+    return count
+
+
+def load_jsonl(stream):
+    """Generates a :py:class:`Record` for each line written to `stream` by
+    :py:func:`write_jsonl`.
+
+    """
+    decode = json.JSONDecoder().decode
+    for line in stream:
+        if line.strip():
+            obj = decode(line)
+            yield Record(obj['kind'], obj['selector'], obj['declaration'], obj['file'],
+                         obj['line'], obj['column'], tuple(obj.get('context', ())))
+
+
+class ColumnarWriter(object):
+    """Accumulates difference records in columns, then writes them in the columnar format.
+    Memory use is a few integers per record, plus each distinct string once.
+
+    """
+    def __init__(self):
+        self._string_ids = {}
+        self.columns = {name: _uint32_array() for name in COLUMNS}
+
+    def _string_id(self, text):
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = self._string_ids[text] = len(self._string_ids)
+        return string_id
+
+    def add(self, difference):
+        """Adds one :py:class:`comp_css.Difference` record."""
+        columns = self.columns
+        string_id = self._string_id
+        declaration = _declaration_text(difference)
+        columns['kind'].append(string_id(difference.kind))
+        columns['selector'].append(string_id(difference.selector))
+        # 0 stands for None; other declarations are stored as their string id + 1
+        columns['declaration'].append(0 if declaration is None else string_id(declaration) + 1)
+        columns['file'].append(string_id(difference.filename))
+        columns['line'].append(difference.line)
+        columns['column'].append(difference.column)
+        columns['context'].append(string_id(_CONTEXT_SEPARATOR.join(difference.context)))
+
+    def write(self, stream):
+        """Writes the records added so far to the binary `stream`."""
+        encoded = [text.encode('utf-8') for text in self._string_ids]
+        blob = b''.join(encoded)
+        stream.write(_HEADER.pack(COLUMNAR_MAGIC, len(self.columns['kind']), len(encoded),
+                                  len(blob)))
+        stream.write(_to_little_endian(_uint32_array(len(text) for text in encoded)).tobytes())
+        stream.write(blob)
+        for name in COLUMNS:
+            stream.write(_to_little_endian(self.columns[name]).tobytes())
+
+
+def write_columnar(differences, stream):
+    """Writes the :py:class:`comp_css.Difference` records in `differences` to the binary
+    `stream` in the columnar format. Returns the number of records written.
+
+    """
+    writer = ColumnarWriter()
+    for difference in differences:
+        writer.add(difference)
+    writer.write(stream)
+    return len(writer.columns['kind'])
+
+
+class DifferenceTable(object):
+    """Differences loaded from the columnar format.
+
+    .. attribute:: strings
+
+        The string table, a :py:class:`list`.
+
+    .. attribute:: columns
+
+        A :py:class:`dict` mapping each name in :py:data:`COLUMNS` to an :py:class:`array.array`
+        of integers. The ``kind``, ``selector`` and ``file`` columns are indexes into
+        :py:attr:`strings`; ``declaration`` is an index plus one, or 0 for none. ``context`` is
+        the index of the context's at-rules, joined by newlines.
+
+    """
+    def __init__(self, strings, columns):
+        self.strings = strings
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['kind'])
+
+    def __iter__(self):
+        strings = self.strings
+        columns = [self.columns[name] for name in COLUMNS]
+        contexts = {}
+        for kind, selector, declaration, filename, line, column, context in zip(*columns):
+            context_tuple = contexts.get(context)
+            if context_tuple is None:
+                text = strings[context]
+                context_tuple = contexts[context] = (tuple(text.split(_CONTEXT_SEPARATOR))
+                                                     if text else ())
+            yield Record(strings[kind], strings[selector],
+                         strings[declaration - 1] if declaration else None, strings[filename],
+                         line, column, context_tuple)
+
+    def count_by_kind(self):
+        """Returns a :py:class:`dict` of the number of records of each kind, computed from the
+        ``kind`` column without building any records.
+
+        """
+        counts = {}
+        for kind in self.columns['kind']:
+            counts[kind] = counts.get(kind, 0) + 1
+        return {self.strings[kind]: count for kind, count in counts.items()}
+
+
+def _read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("truncated columnar difference file")
+    return data
+
+
+def _read_column(stream, count):
+    column = _uint32_array()
+    column.frombytes(_read_exactly(stream, 4 * count))
+    return _to_little_endian(column)  # swapping is its own inverse
+
+
+def load_columnar(stream):
+    """Returns the :py:class:`DifferenceTable` written to the binary `stream` by
+    :py:func:`write_columnar`.
+
+    """
+    magic, count, string_count, blob_size = _HEADER.unpack(_read_exactly(stream, _HEADER.size))
+    if magic != COLUMNAR_MAGIC:
+        raise ValueError("not a columnar difference file")
+    lengths = _read_column(stream, string_count)
+    blob = _read_exactly(stream, blob_size)
+    strings = []
+    offset = 0
+    for length in lengths:
+        strings.append(blob[offset:offset + length].decode('utf-8'))
+        offset += length
+    columns = {name: _read_column(stream, count) for name in COLUMNS}
+    return DifferenceTable(strings, columns)
+
+
+def load_differences(filename):
+    """Returns the differences in the file `filename`, written in either format, as a list of
+    :py:class:`Record`.
+
+    """
+    with open(filename, 'rb') as diff_file:
+        if diff_file.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC:
+            diff_file.seek(0)
+            return list(load_columnar(diff_file))
+    with open(filename, encoding='utf-8') as diff_file:
+        return list(load_jsonl(diff_file))
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pairing of similar sets, e.g. the declarations of a selector that was renamed, with its old
+ones.
+
+:py:func:`match_similar` finds the pairs of sets whose Jaccard similarity (the size of their
+intersection over the size of their union) is at least a threshold, without comparing every
+pair. It uses *prefix filtering*: with the tokens of every set sorted rarest first, two sets
+that similar must share a token among the first few of each, so only the sets sharing one of
+those (found with an inverted index) are compared. Common tokens (``display: block``) are thus
+hardly ever looked up, and the work grows with the number of candidate pairs rather than with
+the product of the numbers of sets.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import math
+from collections import Counter, defaultdict
+from itertools import chain
+
+from css_defaults import DEFAULT_THRESHOLD
+
+
+def _prefix_length(size, threshold):
+    """Returns how many of the rarest tokens of a set of `size` tokens must be indexed so that
+    any set at least `threshold` similar to it shares one of them.
+
+    """
+    # the epsilon keeps e.g. 0.8 * 5 from rounding up to 5
+    return size - math.ceil(threshold * size - 1e-9) + 1
+
+
+def match_similar(left, right, threshold=DEFAULT_THRESHOLD):
+    """Pairs the keys of `left` with those of `right` whose sets are similar. `left` and `right`
+    are :py:class:`dict` objects mapping keys to sets of tokens (which must be sortable, e.g.
+    strings); empty sets are ignored.
+
+    Returns a list of ``(left_key, right_key, similarity)`` for the pairs whose Jaccard
+    similarity is at least `threshold` (between 0 exclusive and 1), most similar first, with
+    each key in at most one pair: a key is paired with the most similar key not already paired
+    with a more similar one. Ties are broken by the order of the keys in `left` and `right`.
+
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError("threshold must be more than 0 and at most 1")
+    left = [(key, frozenset(tokens)) for key, tokens in left.items() if tokens]
+    right = [(key, frozenset(tokens)) for key, tokens in right.items() if tokens]
+    if not left or not right:
+        return []
+
+    frequency = Counter(chain.from_iterable(tokens for _, tokens in chain(left, right)))
+    rank = {token: index
+            for index, token in enumerate(sorted(frequency, key=lambda t: (frequency[t], t)))}
+
+    def prefix(tokens):
+        return sorted(tokens, key=rank.__getitem__)[:_prefix_length(len(tokens), threshold)]
+
+    postings = defaultdict(list)
+    for index, (_, tokens) in enumerate(right):
+        for token in prefix(tokens):
+            postings[token].append(index)
+
+    pairs = []
+    for left_index, (_, tokens) in enumerate(left):
+        size = len(tokens)
+        smallest, largest = threshold * size, size / threshold
+        candidates = set()
+        for token in prefix(tokens):
+            for right_index in postings.get(token, ()):
+                if smallest <= len(right[right_index][1]) <= largest:
+                    candidates.add(right_index)
+        for right_index in candidates:
+            other = right[right_index][1]
+            overlap = len(tokens & other)
+            similarity = overlap / (size + len(other) - overlap)
+            if similarity >= threshold:
+                pairs.append((-similarity, left_index, right_index))
+
+    pairs.sort()
+    matches = []
+    left_used = set()
+    right_used = set()
+    for similarity, left_index, right_index in pairs:
+        if left_index not in left_used and right_index not in right_used:
+            left_used.add(left_index)
+            right_used.add(right_index)
+            matches.append((left[left_index][0], right[right_index][0], -similarity))
+    return matches
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
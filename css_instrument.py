@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Timing and profiling of the phases of a comparison.
+
+The library marks its phases (parsing, wrapping declarations, indexing, writing output, ...) with
+:py:func:`phase`, which costs next to nothing unless an :py:class:`Instrument` has been made
+active with :py:func:`collecting`::
+
+    instrument = Instrument()
+    with collecting(instrument):
+        sheet1 = Stylesheet('a.css')
+        ...
+    instrument.report()
+
+Phases may be nested; a nested phase is named after its parents, e.g. ``load/parse``. A phase
+entered more than once (e.g. for each sheet) accumulates its measurements.
+
+:py:func:`profiling` runs code under :py:mod:`cProfile` and writes the statistics to a file.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import gc
+import sys
+import time
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+PhaseStats = namedtuple('PhaseStats', 'name calls wall cpu objects peak_rss')
+PhaseStats.__doc__ = """The measurements of one phase: its name, how many times it ran, the
+total wall clock and CPU seconds it took, the number of objects tracked by the garbage collector
+when it last ended (``None`` if not counted), and the process's peak resident set size, in bytes,
+when it last ended (``None`` where unavailable)."""
+
+# the number of functions listed by profiling()
+PROFILE_TOP = 25
+
+_NULL_PHASE = nullcontext()
+
+_active = None  # the Instrument collecting, if any
+
+
+def peak_rss():
+    """Returns the peak resident set size of the process so far, in bytes, or ``None`` if it
+    isn't available.
+
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Instrument(object):
+    """Collects the measurements of phases.
+
+    .. attribute:: count_objects
+
+        Whether to count the live objects at the end of each phase. Counting takes time in
+        proportion to the number of objects.
+
+    """
+    def __init__(self, count_objects=True):
+        self.count_objects = count_objects
+        self._stats = {}  # name -> [calls, wall, cpu, objects, peak_rss], in first-run order
+        self._stack = []
+
+    @contextmanager
+    def phase(self, name):
+        """Returns a context manager measuring the code it runs as the phase `name`."""
+        self._stack.append(name)
+        stats = self._stats.setdefault('/'.join(self._stack), [0, 0.0, 0.0, None, None])
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            self._stack.pop()
+            stats[0] += 1
+            stats[1] += wall
+            stats[2] += cpu
+            stats[3] = len(gc.get_objects()) if self.count_objects else None
+            stats[4] = peak_rss()
+
+    def results(self):
+        """Returns a list of :py:class:`PhaseStats`, in the order the phases first began."""
+        return [PhaseStats(name, *stats) for name, stats in self._stats.items()]
+
+    def report(self, stream=None):
+        """Writes a table of the measurements to `stream` (default: standard error)."""
+        stream = sys.stderr if stream is None else stream
+        stream.write("{:<28} {:>6} {:>10} {:>10} {:>12} {:>10}\n".format(
+            'phase', 'calls', 'wall (s)', 'cpu (s)', 'objects', 'peak MB'))
+        for stats in self.results():
+            depth = stats.name.count('/')
+            stream.write("{:<28} {:>6,} {:>10.4f} {:>10.4f} {:>12} {:>10}\n".format(
+                '  ' * depth + stats.name.rsplit('/', 1)[-1], stats.calls, stats.wall, stats.cpu,
+                '-' if stats.objects is None else '{:,}'.format(stats.objects),
+                '-' if stats.peak_rss is None else '{:.1f}'.format(stats.peak_rss / 2**20)))
+
+
+def phase(name):
+    """Returns a context manager marking the code it runs as the phase `name`, measured by the
+    active :py:class:`Instrument`, if any.
+
+    """
+    if _active is None:
+        return _NULL_PHASE
+    return _active.phase(name)
+
+
+@contextmanager
+def collecting(instrument):
+    """Returns a context manager making `instrument` the active :py:class:`Instrument` while it
+    runs. `instrument` may be ``None``, to collect nothing.
+
+    """
+    global _active  # pylint: disable=W0603
+    previous = _active
+    _active = instrument
+    try:
+        yield instrument
+    finally:
+        _active = previous
+
+
+@contextmanager
+def profiling(filename, stream=None, top=PROFILE_TOP):
+    """Returns a context manager running the code it runs under :py:mod:`cProfile`, then
+    writing the statistics to `filename` (readable with :py:class:`pstats.Stats`) and listing
+    the `top` functions by internal time to `stream` (default: standard error). If `filename`
+    is ``None``, nothing is profiled.
+
+    """
+    if filename is None:
+        yield None
+        return
+    # pylint: disable=C0415
+    # imported here, as they take longer to load than many runs take in all
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(filename)
+        stats = pstats.Stats(profiler, stream=sys.stderr if stream is None else stream)
+        stats.sort_stats('tottime').print_stats(top)
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""The parsers used to read stylesheets for comparison: the interface they share,
+:py:class:`StylesheetParser`, and the default one, built on tinycss.
+
+:mod:`comp_css` loads this module (and with it tinycss) only when a stylesheet has to be parsed,
+so that runs which don't parse anything, such as ``--help`` or comparisons of cached sheets,
+start up quickly.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import sys
+from functools import lru_cache
+
+from tinycss.decoding import decode
+from tinycss.page3 import CSSPage3Parser
+from tinycss.tokenizer import tokenize_grouped
+
+# the at-rules whose preludes are case-insensitive throughout (media types, features and values)
+_CASE_INSENSITIVE_PRELUDES = frozenset(('@media',))
+
+# the case-insensitive keywords of conditions
+_CONDITION_KEYWORDS = frozenset(('and', 'or', 'not', 'only'))
+
+
+class StylesheetParser(object):
+    """The interface through which :py:class:`comp_css.Stylesheet` parses CSS.
+
+    A parser returns a :py:class:`tinycss.css21.Stylesheet` whose rules are any mix of
+    :py:class:`tinycss.css21.RuleSet`, :py:class:`RuleRecord` and :py:class:`GroupingRule` objects
+    (other rules, such as ``@page``, are ignored by the comparison), positioned as tinycss
+    positions them. Whatever the parser, the rules found, and so the differences reported, must
+    be the same.
+
+    """
+    def parse_stylesheet_bytes(self, css_bytes):
+        """Parses the stylesheet `css_bytes`, decoded as tinycss decodes it."""
+        css_unicode, encoding = decode(css_bytes)
+        return self.parse_stylesheet(css_unicode, encoding)
+
+    def parse_stylesheet(self, css_unicode, encoding=None):
+        """Parses the stylesheet `css_unicode`, decoded from `encoding` (if known)."""
+        raise NotImplementedError
+
+
+class RuleRecord(object):
+    """A ruleset as plain values, for parsers that don't make tinycss tokens.
+
+    .. attribute:: selector
+
+        The selector, as CSS source text.
+
+    .. attribute:: declarations
+
+        A :py:class:`tuple` of the declarations, each in the form of
+        :py:meth:`comp_css.FunctionalDeclaration.to_record`.
+
+    .. attribute:: line
+
+        The line number in the source file at which the rule is found.
+
+    .. attribute:: column
+
+        The column in the source file at which the rule is found (begins).
+
+    """
+    __slots__ = ('selector', 'declarations', 'line', 'column')
+
+    at_keyword = None  # as for tinycss.css21.RuleSet
+
+    def __init__(self, selector, declarations, line, column):
+        self.selector = selector
+        self.declarations = declarations
+        self.line = line
+        self.column = column
+
+    def __repr__(self):
+        return "<RuleRecord {0.line}:{0.column} {0.selector}>".format(self)
+
+
+class GroupingRule(object):
+    """A conditional group or layer at-rule (``@media``, ``@supports``, ``@layer``, ...) and the
+    rules nested in it.
+
+    .. attribute:: at_keyword
+
+        The at-keyword, in lower case, e.g. ``'@media'``.
+
+    .. attribute:: condition
+
+        The at-keyword and its prelude, in the canonical form of :py:func:`condition_text`,
+        e.g. ``'@media screen and (max-width: 600px)'``.
+
+    .. attribute:: rules
+
+        The list of rules in the block.
+
+    .. attribute:: line
+
+        The line number in the source file at which the rule is found.
+
+    .. attribute:: column
+
+        The column in the source file at which the rule is found (begins).
+
+    """
+    def __init__(self, at_keyword, condition, rules, line, column):
+        self.at_keyword = at_keyword
+        self.condition = condition
+        self.rules = rules
+        self.line = line
+        self.column = column
+
+    def __repr__(self):
+        return "<GroupingRule {0.line}:{0.column} {0.condition}>".format(self)
+
+
+def _canonical_prelude(tokens, lower):
+    """Returns the canonical text of the prelude `tokens`, lower-casing all its identifiers if
+    `lower` is true, and its keywords and feature names otherwise.
+
+    """
+    parts = []
+    space = False
+    for index, token in enumerate(tokens):
+        type_ = token.type
+        if type_ == 'S':
+            space = True
+            continue
+        if type_ == ':' or type_ == 'DELIM' and token.value == ',':
+            parts.append(token.value)
+            space = True  # always one space after a colon or comma
+            continue
+        if space and parts:
+            parts.append(' ')
+        space = False
+        if type_ == '(':
+            parts.append('({})'.format(_canonical_prelude(list(token.content), lower)))
+        elif type_ == 'FUNCTION':
+            # e.g. selector() or url(): only the name is case-insensitive
+            parts.append('{}({})'.format(
+                token.function_name.lower(),
+                ' '.join(''.join(part.as_css() for part in token.content).split())))
+        elif type_ == 'DIMENSION' and lower or type_ == 'IDENT' and (
+                lower or token.value.lower() in _CONDITION_KEYWORDS
+                or _is_feature(tokens, index)):
+            parts.append(token.as_css().lower())
+        else:
+            parts.append(token.as_css())
+    return ''.join(parts)
+
+
+def _is_feature(tokens, index):
+    """Whether the token at `index` in `tokens` is the name in a ``(name: value)`` feature."""
+    for token in tokens[index + 1:]:
+        if token.type != 'S':
+            return token.type == ':'
+    return False
+
+
+@lru_cache(maxsize=1024)
+def condition_text(at_keyword, prelude):
+    """Returns the :py:attr:`GroupingRule.condition` of the grouping rule `at_keyword` (in lower
+    case) whose prelude is the text `prelude`: the at-keyword and prelude, with white space
+    collapsed, no space inside parentheses or before a colon or comma and one after, and the
+    case-insensitive words (media queries, the keywords ``and``, ``or``, ``not`` and ``only``,
+    feature names) in lower case. So ``@media SCREEN and (max-width:600px)`` and ``@media screen
+    and ( max-width: 600px )`` are the same context. The result is interned.
+
+    """
+    prelude = _canonical_prelude(list(tokenize_grouped(prelude)),
+                                 at_keyword in _CASE_INSENSITIVE_PRELUDES)
+    return sys.intern((at_keyword + ' ' + prelude).rstrip())
+
+
+class ComparisonParser(CSSPage3Parser, StylesheetParser):
+    """The default parser: the tinycss one, extended to read the at-rules in
+    :py:data:`GROUPING_AT_RULES`, with any prelude (e.g. media queries, which tinycss doesn't
+    support), as :py:class:`GroupingRule` objects. They may be nested.
+
+    """
+    GROUPING_AT_RULES = frozenset(('@media', '@supports', '@layer', '@container', '@document',
+                                   '@-moz-document', '@scope'))
+
+    def parse_at_rule(self, rule, previous_rules, errors, context):
+        if rule.at_keyword in self.GROUPING_AT_RULES and rule.body is not None:
+            prelude = ''.join(token.as_css() for token in rule.head)
+            rules, rule_errors = self.parse_rules(rule.body, rule.at_keyword)
+            errors.extend(rule_errors)
+            return GroupingRule(rule.at_keyword, condition_text(rule.at_keyword, prelude),
+                                rules, rule.line, rule.column)
+        return super().parse_at_rule(rule, previous_rules, errors, context)
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A fast parser that reads only what the comparison needs: selectors, declarations and their
+positions.
+
+:py:class:`ScannerParser` finds the brackets, semicolons, comments, strings and URLs of a sheet
+with one regular expression, and slices the selectors and declaration values out of the source
+text, instead of making a token for every word as tinycss does. Values are normalized (see
+:py:mod:`css_values`) from their text, so each distinct value is only tokenized once.
+
+It reads the common forms of CSS, and hands any statement it isn't sure about (a comment inside a
+declaration, an invalid selector, an at-rule other than the grouping ones, ...) to the tinycss
+parser, so that the rules found are always those tinycss would find. A sheet with escapes, bad
+strings or URLs, ``<!--``, ``-->`` or mismatched brackets is parsed by tinycss whole.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import bisect
+import re
+from collections import namedtuple
+
+from tinycss.css21 import RuleSet, Stylesheet
+from tinycss.parsing import ParseError
+from tinycss.tokenizer import tokenize_grouped
+
+import css_values
+from css_parser import (ComparisonParser, GroupingRule, RuleRecord, StylesheetParser,
+                        condition_text)
+
+_WHITESPACE = ' \t\r\n\f'
+
+# the characters that continue a name (tinycss's nmchar, without escapes), and those after which
+# "url(" isn't the start of a URL
+_NAME = r'\-_a-zA-Z0-9\u00a0-\U0010ffff'
+_NOT_URL = r'#@' + _NAME
+
+# Matches what the scanner looks at: comments, marks (brackets, semicolons, at-signs), and
+# strings and URLs, matched whole so that the marks in them are skipped. Anything it can't read
+# as tinycss would (escapes, strings broken by a line end, ...) is matched as "bad". (The leading
+# look-ahead, and the look-behinds placed after the "u" of "url", let the search skip quickly
+# over the text between.)
+_SCAN = re.compile(r"""
+    (?=[/"'uU{{}}()\[\];@\\<-])
+    (?:
+      (?P<comment>/\*.*?\*/)
+    | "[^"\\\n\r\f]*"
+    | '[^'\\\n\r\f]*'
+    | [uU](?<![{not_url}][uU])(?i:rl)\([ \t\r\n\f]*
+      (?:"[^"\\\n\r\f]*"|'[^'\\\n\r\f]*'|[!#$%&*-\[\]-~\u00a0-\U0010ffff]*)[ \t\r\n\f]*\)
+    | (?P<mark>[{{}}()\[\];@])
+    | (?P<bad>["'\\]|/\*|<!--|-->|[uU](?<![{not_url}][uU])(?i:rl)\()
+    )
+""".format(not_url=_NOT_URL), re.VERBOSE | re.DOTALL).finditer
+
+# skips white space and comments
+_SKIP = re.compile(r'(?:[ \t\r\n\f]+|/\*.*?\*/)*', re.DOTALL).match
+
+_SKIP_COMMENTS = re.compile(r'(?:/\*.*?\*/)*', re.DOTALL).match
+
+_AT_KEYWORD = re.compile(r'@-?[_a-zA-Z][\-_a-zA-Z0-9]*(?![{}])'.format(_NAME)).match
+
+_DECLARATION = re.compile(r'(-?[_a-zA-Z][\-_a-zA-Z0-9]*)[ \t\r\n\f]*:').match
+
+_IMPORTANT = re.compile(r'(.*?)[ \t\r\n\f]*![ \t\r\n\f]*(?i:important)', re.DOTALL).fullmatch
+
+_FIND_NEWLINES = re.compile(r'\n|\r\n|\r|\f').finditer
+
+_OPENERS = {'}': '{', ')': '(', ']': '['}
+
+_Position = namedtuple('_Position', 'line column')
+
+
+def _marks(text):
+    """Returns the offsets and kinds of the marks and comments (``'/'``) in `text`, and a
+    :py:class:`dict` mapping the index of each opening bracket to that of its closing one. Returns
+    ``None`` if `text` has to be parsed by tinycss.
+
+    """
+    offsets = []
+    kinds = []
+    closers = {}
+    stack = []
+    for match in _SCAN(text):
+        kind = match.lastgroup
+        if kind is None:
+            continue  # a string or URL
+        if kind == 'bad':
+            return None
+        if kind == 'comment':
+            char = '/'
+        else:
+            char = match.group()
+            if char in '{([':
+                stack.append(len(kinds))
+            elif char in '})]':
+                if not stack or kinds[stack[-1]] != _OPENERS[char]:
+                    return None
+                closers[stack.pop()] = len(kinds)
+        offsets.append(match.start())
+        kinds.append(char)
+    if stack:
+        return None
+    return offsets, kinds, closers
+
+
+class ScannerParser(StylesheetParser):
+    """The fast parser. See the module documentation."""
+
+    def __init__(self):
+        self._tinycss = ComparisonParser()
+
+    def parse_stylesheet(self, css_unicode, encoding=None):
+        marks = _marks(css_unicode)
+        if marks is None:
+            return self._tinycss.parse_stylesheet(css_unicode, encoding)
+        scan = _Scan(self._tinycss, css_unicode, encoding, *marks)
+        rules = scan.rules(0, len(css_unicode), 0, len(scan.kinds), 'stylesheet')
+        return Stylesheet(rules, scan.errors, encoding)
+
+
+class _Scan(object):
+    """The state of :py:meth:`ScannerParser.parse_stylesheet` for one text: the marks found in it,
+    the offsets at which its lines start, and the errors found so far.
+
+    The methods reading statements take the range of offsets and the range of indexes of marks
+    they may read, and return the offset and mark index at which they stopped.
+
+    """
+    def __init__(self, parser, text, encoding, offsets, kinds, closers):
+        self.parser = parser
+        self.text = text
+        self.encoding = encoding
+        self.offsets = offsets
+        self.kinds = kinds
+        self.closers = closers
+        self.line_starts = [0] + [newline.end() for newline in _FIND_NEWLINES(text)]
+        self.errors = []
+
+    def position(self, offset):
+        """Returns the line and column of `offset`, counted as tinycss counts them."""
+        line = bisect.bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def rules(self, start, stop, first, last, context):
+        """Returns the list of rules from `start` to `stop`, in `context` (``'stylesheet'`` or the
+        at-keyword of the rule they are nested in).
+
+        """
+        rules = []
+        text = self.text
+        offsets = self.offsets
+        offset = start
+        index = first
+        while True:
+            offset = _SKIP(text, offset, stop).end()
+            if offset >= stop:
+                return rules
+            while index < last and offsets[index] < offset:
+                index += 1
+            keyword = _AT_KEYWORD(text, offset, stop)
+            if keyword is not None:
+                offset, index = self._at_rule(rules, keyword, stop, index, last, context)
+            else:
+                offset, index = self._ruleset(rules, offset, stop, index, last, context)
+
+    def _ruleset(self, rules, start, stop, first, last, context):
+        kinds = self.kinds
+        offsets = self.offsets
+        depth = 0
+        simple = True
+        index = first
+        while index < last:
+            kind = kinds[index]
+            if kind == '{':
+                if not depth:
+                    break
+                simple = False
+                index = self.closers[index]
+            elif kind in '([':
+                depth += 1
+            elif kind in ')]':
+                depth -= 1
+            else:
+                simple = False  # a semicolon, at-keyword or comment in the selector
+            index += 1
+        else:
+            # no declaration block: the rest is one invalid statement
+            self._fallback(rules, start, stop, context)
+            return stop, last
+        close = self.closers[index]
+        end = offsets[close] + 1
+        if simple and offsets[index] > start:
+            declarations = self._declarations(offsets[index] + 1, offsets[close], index + 1,
+                                              close)
+            if declarations is not None:
+                line, column = self.position(start)
+                rules.append(RuleRecord(self.text[start:offsets[index]].rstrip(_WHITESPACE),
+                                        declarations, line, column))
+                return end, close + 1
+        self._fallback(rules, start, end, context)
+        return end, close + 1
+
+    def _declarations(self, start, stop, first, last):
+        """Returns a tuple of the records of the declarations from `start` to `stop`, or ``None``
+        if they have to be parsed by tinycss.
+
+        """
+        text = self.text
+        kinds = self.kinds
+        offsets = self.offsets
+        declarations = []
+        errors = []
+        depth = 0
+        part_start = start
+        last_comment = -1
+        for index in range(first, last + 1):
+            if index < last:
+                kind = kinds[index]
+                if kind in '([':
+                    depth += 1
+                    continue
+                if kind in ')]':
+                    depth -= 1
+                    continue
+                if kind == '/':
+                    last_comment = offsets[index]
+                    continue
+                if kind != ';' or depth:
+                    return None  # a block, at-keyword or semicolon in a value
+                part_end = offsets[index]
+            else:
+                part_end = stop
+            name_start = _SKIP(text, part_start, part_end).end()
+            part_start = part_end + 1
+            if name_start == part_end:
+                continue
+            if last_comment >= name_start:
+                return None
+            last_comment = -1
+            if text.startswith('--', name_start):
+                # tinycss only reads custom properties as an error
+                errors.append(ParseError(_Position(*self.position(name_start)),
+                                         'expected a property name, got DELIM'))
+                continue
+            match = _DECLARATION(text, name_start, part_end)
+            if match is None:
+                return None
+            value = text[match.end():part_end].strip(_WHITESPACE)
+            priority = None
+            if '!' in value:
+                important = _IMPORTANT(value)
+                if important is not None:
+                    value = important.group(1)
+                    priority = 'important'
+            if not value:
+                return None
+            name = match.group(1).lower()
+            line, column = self.position(name_start)
+            declarations.append((name, value, priority, line, column,
+                                 css_values.normalize_value(value, name)))
+        self.errors.extend(errors)
+        return tuple(declarations)
+
+    def _at_rule(self, rules, keyword, stop, first, last, context):
+        kinds = self.kinds
+        offsets = self.offsets
+        start = keyword.start()
+        depth = 0
+        valid = True  # whether tinycss accepts the prelude
+        simple = True  # whether it has no comments either
+        index = first + 1  # past the at-sign
+        while index < last:
+            kind = kinds[index]
+            if not depth and kind in ';{':
+                break
+            if kind in '([':
+                depth += 1
+            elif kind in ')]':
+                depth -= 1
+            elif kind == '/':
+                simple = False
+            else:
+                valid = simple = False  # an at-keyword, block or semicolon in the prelude
+                if kind == '{':
+                    index = self.closers[index]
+            index += 1
+        else:
+            # no body or semicolon: the rest is one invalid statement
+            self._fallback(rules, start, stop, context)
+            return stop, last
+        if kinds[index] == ';':
+            end = offsets[index] + 1
+            following = index + 1
+        else:
+            close = self.closers[index]
+            end = offsets[close] + 1
+            following = close + 1
+        at_keyword = keyword.group().lower()
+        if at_keyword == '@import' and context == 'stylesheet' and valid:
+            # whether the rule is allowed depends on the rules before it
+            for previous in rules:
+                if previous.at_keyword not in ('@charset', '@import'):
+                    self.errors.append(ParseError(previous, '@import rule not allowed after ' + (
+                        'an {} rule'.format(previous.at_keyword) if previous.at_keyword
+                        else 'a ruleset')))
+                    return end, following
+        if kinds[index] == '{' and simple and at_keyword in ComparisonParser.GROUPING_AT_RULES:
+            line, column = self.position(start)
+            rules.append(GroupingRule(at_keyword,
+                                      condition_text(at_keyword,
+                                                     self.text[keyword.end():offsets[index]]),
+                                      self.rules(offsets[index] + 1, offsets[close], index + 1,
+                                                 close, at_keyword),
+                                      line, column))
+        else:
+            self._fallback(rules, start, end, context)
+        return end, following
+
+    def _fallback(self, rules, start, end, context):
+        """Parses the statement from `start` to `end` in `context` with tinycss, and adds its
+        rules and errors.
+
+        """
+        statement = self.text[start:end]
+        if context == 'stylesheet':
+            # an @charset rule is only dropped at the start of the sheet
+            first = start == _SKIP_COMMENTS(self.text).end()
+            parsed = self.parser.parse_stylesheet(statement, self.encoding if first else None)
+            parsed_rules, errors = parsed.rules, parsed.errors
+        else:
+            parsed_rules, errors = self.parser.parse_rules(tokenize_grouped(statement), context)
+        line, column = self.position(start)
+        for rule in parsed_rules:
+            rules.append(_moved(rule, line - 1, column - 1))
+        for error in errors:
+            self.errors.append(ParseError(_Position(*_moved_position(error, line - 1,
+                                                                     column - 1)),
+                                          error.reason))
+
+
+def _moved_position(item, line_delta, column_delta):
+    """Returns the line and column of `item`, parsed from a statement on its own, in the text
+    the statement begins `line_delta` lines and (on its first line) `column_delta` columns into.
+
+    """
+    if item.line == 1:
+        return item.line + line_delta, item.column + column_delta
+    return item.line + line_delta, item.column
+
+
+def _moved(rule, line_delta, column_delta):
+    """Returns `rule`, parsed from a statement on its own, as a :py:class:`RuleRecord` (or, for a
+    :py:class:`GroupingRule`, with its rules as such) positioned as in the whole text (see
+    :py:func:`_moved_position`). Other rules are moved in place.
+
+    """
+    line, column = _moved_position(rule, line_delta, column_delta)
+    if isinstance(rule, RuleSet):
+        declarations = []
+        for decl in rule.declarations:
+            decl_line, decl_column = _moved_position(decl, line_delta, column_delta)
+            declarations.append((decl.name, decl.value.as_css(), decl.priority, decl_line,
+                                 decl_column, css_values.normalize_value(decl.value,
+                                                                         decl.name)))
+        return RuleRecord(rule.selector.as_css(), tuple(declarations), line, column)
+    if isinstance(rule, GroupingRule):
+        return GroupingRule(rule.at_keyword, rule.condition,
+                            [_moved(each, line_delta, column_delta) for each in rule.rules],
+                            line, column)
+    rule.line = line
+    rule.column = column
+    return rule
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
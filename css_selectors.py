@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Canonical forms of CSS selectors, so that selectors written differently but matching the same
+elements (``A>B``, ``a > b``; ``.y.x``, ``.x.y``; ``a:before``, ``a::before``) compare equal.
+
+A selector list is split into its phrases on the commas at its top level only (not those inside
+``:is()``, ``:not()``, attribute strings, ...). Each phrase is then rewritten:
+
+* white space is collapsed, and combinators are written with one space each side (``a > b``);
+* type selectors, attribute names and pseudo-class and pseudo-element names, which are
+  case-insensitive in HTML, are lower-cased; ids and classes are left alone;
+* names are compared unescaped, and written with the escapes of the CSSOM's "serialize an
+  identifier" (so ``a\\:b`` and ``a\\3A b`` are the same type selector, not ``a`` with a
+  pseudo-class);
+* attribute values are written as double-quoted strings;
+* the simple selectors of a compound selector are sorted, after its type selector and before
+  its pseudo-element, if any; a redundant ``*`` is dropped;
+* the CSS 2 pseudo-elements (``:before``, ...) are written with two colons;
+* the selector lists in ``:is()``, ``:not()``, ``:where()`` and ``:has()`` are canonicalized and
+  sorted.
+
+A phrase that can't be understood is only stripped of surplus white space.
+
+The canonical phrases are interned with :py:func:`sys.intern`, so that the many copies of a
+selector in a large sheet share one string, and results are memoized in a bounded cache keyed on
+the selector text.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import sys
+from functools import lru_cache
+
+from tinycss.tokenizer import tokenize_grouped
+
+# the maximum number of distinct selector texts whose phrases are remembered
+SELECTOR_CACHE_SIZE = 16384
+
+_COMBINATORS = frozenset('>+~')
+
+_ATTRIBUTE_OPERATORS = frozenset('~|^$*')
+
+# pseudo-classes whose argument is a selector list
+_SELECTOR_LIST_PSEUDOS = frozenset(('is', 'not', 'where', 'has', 'matches', 'any',
+                                    '-webkit-any', '-moz-any'))
+
+# pseudo-elements that may be written with one colon
+_LEGACY_PSEUDO_ELEMENTS = frozenset(('before', 'after', 'first-line', 'first-letter'))
+
+# the kinds of simple selector in a compound selector, in the order they are written
+_TYPE, _SIMPLE, _ELEMENT = range(3)
+
+
+class _Unparsable(ValueError):
+    """Raised when a selector phrase isn't understood."""
+
+
+def _text(tokens):
+    return ''.join(token.as_css() for token in tokens)
+
+
+def _collapse(text):
+    return ' '.join(text.split())
+
+
+def _strip(tokens):
+    """Returns `tokens` without leading and trailing white space."""
+    start, end = 0, len(tokens)
+    while start < end and tokens[start].type == 'S':
+        start += 1
+    while end > start and tokens[end - 1].type == 'S':
+        end -= 1
+    return tokens[start:end]
+
+
+def _split_list(tokens):
+    """Splits the selector list `tokens` on its top-level commas."""
+    phrases = [[]]
+    for token in tokens:
+        if token.type == 'DELIM' and token.value == ',':
+            phrases.append([])
+        else:
+            phrases[-1].append(token)
+    return [_strip(phrase) for phrase in phrases]
+
+
+def _identifier(value, name=False):
+    """Returns the identifier `value` (unescaped) as CSS, escaped as the CSSOM serializes
+    identifiers. If `name` is true (an id's name), it may start with a digit.
+
+    """
+    if value == '-' and not name:
+        return '\\-'
+    parts = []
+    for index, char in enumerate(value):
+        code = ord(char)
+        leading_digit = '0' <= char <= '9' and not name and (
+            index == 0 or index == 1 and value[0] == '-')
+        if code == 0:
+            parts.append('\ufffd')
+        elif code < 0x20 or code == 0x7f or leading_digit:
+            parts.append('\\{:x} '.format(code))
+        elif code >= 0x80 or char.isalnum() or char in '-_':
+            parts.append(char)
+        else:
+            parts.append('\\' + char)
+    return ''.join(parts)
+
+
+def _quoted(value):
+    return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\a '))
+
+
+def _attribute(tokens):
+    """Returns the canonical form of the attribute selector whose bracketed contents are
+    `tokens`.
+
+    """
+    tokens = [token for token in tokens if token.type != 'S']
+    if not tokens or tokens[0].type != 'IDENT':
+        raise _Unparsable()
+    parts = ['[', _identifier(tokens[0].value.lower())]
+    rest = tokens[1:]
+    if rest:
+        operator = ''
+        if rest[0].type == 'DELIM' and rest[0].value in _ATTRIBUTE_OPERATORS:
+            operator = rest[0].value
+            rest = rest[1:]
+        if (len(rest) < 2 or rest[0].type != 'DELIM' or rest[0].value != '='
+                or rest[1].type not in ('IDENT', 'STRING')):
+            raise _Unparsable()
+        parts.append(operator + '=' + _quoted(rest[1].value))
+        rest = rest[2:]
+        if rest:
+            if len(rest) > 1 or rest[0].type != 'IDENT':
+                raise _Unparsable()
+            parts.append(' ' + rest[0].value.lower())
+    parts.append(']')
+    return ''.join(parts)
+
+
+def _pseudo_function(token):
+    """Returns the canonical form of the functional pseudo-class or pseudo-element `token`,
+    without its colons.
+
+    """
+    name = token.function_name.lower()
+    if name in _SELECTOR_LIST_PSEUDOS:
+        argument = ', '.join(sorted(_canonical_list(token.content)))
+    elif name.startswith('nth-') and not any(part.type == 'IDENT' and part.value == 'of'
+                                             for part in token.content):
+        argument = ''.join(_text(token.content).split()).lower()
+    else:
+        argument = _collapse(_text(token.content))
+    return '{}({})'.format(name, argument)
+
+
+def _compound(simples):
+    """Returns the canonical text of a compound selector, given its simple selectors as
+    ``(kind, text)`` pairs in source order.
+
+    """
+    type_selector = [text for kind, text in simples if kind == _TYPE]
+    middle = sorted(text for kind, text in simples if kind == _SIMPLE)
+    tail = [text for kind, text in simples if kind == _ELEMENT]
+    if len(type_selector) > 1:
+        raise _Unparsable()
+    if type_selector == ['*'] and (middle or tail):
+        type_selector = []
+    return ''.join(type_selector + middle + tail)
+
+
+def _canonical_phrase(tokens):
+    """Returns the canonical text of the selector phrase `tokens`."""
+    parts = []
+    simples = []
+    combinator = None
+    after_element = False
+    index = 0
+    count = len(tokens)
+    while index < count:
+        token = tokens[index]
+        type_ = token.type
+        index += 1
+        if type_ == 'S' or (type_ == 'DELIM' and token.value in _COMBINATORS):
+            if type_ == 'DELIM':
+                if combinator not in (None, ' '):
+                    raise _Unparsable()
+                combinator = token.value
+            elif combinator is None:
+                combinator = ' '
+            if simples:
+                parts.append(_compound(simples))
+                simples = []
+                after_element = False
+            continue
+        if combinator is not None:
+            if combinator == ' ':
+                parts.append(' ' if parts else '')
+            else:
+                parts.append(' {} '.format(combinator) if parts else combinator + ' ')
+            combinator = None
+        kind = _ELEMENT if after_element else _SIMPLE
+        if type_ == 'IDENT' or (type_ == 'DELIM' and token.value in '*|'):
+            if simples:
+                raise _Unparsable()
+            # a type or universal selector, possibly with a namespace prefix
+            text = [token.value if type_ == 'DELIM' else _identifier(token.value.lower())]
+            while (index < count and tokens[index].type in ('IDENT', 'DELIM')
+                   and (tokens[index].type == 'IDENT' or tokens[index].value in '*|')):
+                text.append(tokens[index].value if tokens[index].type == 'DELIM'
+                            else _identifier(tokens[index].value.lower()))
+                index += 1
+            simples.append((_TYPE, ''.join(text)))
+        elif type_ == 'HASH':
+            simples.append((kind, '#' + _identifier(token.value[1:], name=True)))
+        elif type_ == 'DELIM' and token.value == '.':
+            if index == count or tokens[index].type != 'IDENT':
+                raise _Unparsable()
+            simples.append((kind, '.' + _identifier(tokens[index].value)))
+            index += 1
+        elif type_ == '[':
+            simples.append((kind, _attribute(token.content)))
+        elif type_ == ':':
+            colons = ':'
+            if index < count and tokens[index].type == ':':
+                colons = '::'
+                index += 1
+            if index == count:
+                raise _Unparsable()
+            name_token = tokens[index]
+            index += 1
+            if name_token.type == 'IDENT':
+                name = _identifier(name_token.value.lower())
+            elif name_token.type == 'FUNCTION':
+                name = _pseudo_function(name_token)
+            else:
+                raise _Unparsable()
+            if colons == ':' and name in _LEGACY_PSEUDO_ELEMENTS:
+                colons = '::'
+            if colons == '::':
+                after_element = True
+                kind = _ELEMENT
+            simples.append((kind, colons + name))
+        else:
+            raise _Unparsable()
+    if simples:
+        parts.append(_compound(simples))
+    if not parts or combinator is not None:
+        raise _Unparsable()
+    return ''.join(parts)
+
+
+def _canonical_list(tokens):
+    """Returns the list of the canonical texts of the phrases in the selector list `tokens`."""
+    phrases = []
+    for phrase in _split_list(tokens):
+        try:
+            phrases.append(_canonical_phrase(phrase))
+        except _Unparsable:
+            phrases.append(_collapse(_text(phrase)))
+    return phrases
+
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def selector_phrases(selector):
+    """Returns a :py:class:`tuple` of the distinct canonical phrases in the selector text
+    `selector`, in source order. The phrases are interned.
+
+    """
+    phrases = _canonical_list(tokenize_grouped(selector))
+    return tuple(sys.intern(phrase) for phrase in dict.fromkeys(phrases) if phrase)
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A comparison server: a long-running process that keeps parsed and indexed stylesheets in
+memory, and compares them on request. A tool that runs many comparisons of the same few sheets
+then pays for starting Python, loading tinycss and parsing each sheet once, not on every call.
+
+Start the server on a Unix socket, and compare through it with ``comp_css.py --connect``, which
+writes the same output as a comparison made in its own process::
+
+    python3 css_server.py /tmp/css_compare.sock &
+    python3 comp_css.py --connect /tmp/css_compare.sock old.css new.css
+
+The server keeps the :py:data:`DEFAULT_MAX_SHEETS` most recently used sheets (see
+:py:class:`SheetCache`), and parses and compares in a pool of threads, so that requests are
+served concurrently.
+
+Each request is a line of JSON, an object with the members:
+
+``files``
+    The absolute paths of the two files to compare.
+``names``
+    The names to report the files by (as given on the client's command line).
+``format``, ``parser``
+    As the ``comp_css.py`` options ``--format`` and ``--parser``.
+``renames``
+    The similarity threshold of ``--rename-threshold`` if ``--renames`` is given, or ``null``.
+``limits``
+    The limits of a text report, as a :py:class:`comp_css.ReportLimits`.
+
+The response is a line of JSON, an object with the members ``error`` (a message, or ``null``
+if the comparison was made) and ``length``, followed by ``length`` bytes of output.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import argparse
+import asyncio
+import copy
+import io
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import comp_css
+from css_cache import DEFAULT_MAX_BYTES, ParseCache
+from css_formats import write_columnar, write_jsonl
+
+# the number of parsed sheets kept by default
+DEFAULT_MAX_SHEETS = 32
+
+
+class SheetCache(object):
+    """The parsed and indexed :py:class:`comp_css.Stylesheet` objects kept by a server, least
+    recently used first.
+
+    A sheet is found by its file's real path and the parser it was read with; it is parsed again
+    when the file's modification time or size changes. The index and the fingerprints a
+    comparison needs are built when the sheet is loaded, so that comparisons only read it, and
+    may run at the same time.
+
+    .. attribute:: max_sheets
+
+        The number of sheets kept. When a new sheet takes the cache over this number, the least
+        recently used one is dropped.
+
+    .. attribute:: hits
+
+        The number of requests for a sheet answered from the cache.
+
+    .. attribute:: misses
+
+        The number of requests for a sheet that was parsed.
+
+    """
+    def __init__(self, executor, max_sheets=DEFAULT_MAX_SHEETS, cache=None):
+        """Make a cache that parses sheets in the :py:class:`concurrent.futures.Executor`
+        `executor`, reading them from and storing them in the :py:class:`css_cache.ParseCache`
+        `cache`, if any.
+
+        """
+        self.max_sheets = max_sheets
+        self.hits = self.misses = 0
+        self._executor = executor
+        self._cache = cache
+        self._sheets = OrderedDict()  # (path, parser): (stamp, future of the sheet)
+
+    def __len__(self):
+        return len(self._sheets)
+
+    async def get(self, filename, parser=None):
+        """Returns the :py:class:`comp_css.Stylesheet` for the file `filename` read with the
+        parser named `parser`, parsing it if it isn't cached or has changed. Requests for a sheet
+        being parsed wait for it to be parsed once.
+
+        """
+        path = os.path.realpath(filename)
+        stamp = comp_css._file_stamp(path)  # pylint: disable=W0212
+        if stamp is None:
+            raise FileNotFoundError("No such file: '{}'".format(filename))
+        key = (path, parser)
+        entry = self._sheets.get(key)
+        if entry is not None and entry[0] == stamp:
+            self.hits += 1
+            self._sheets.move_to_end(key)
+            return await entry[1]
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        entry = self._sheets[key] = (stamp, loop.run_in_executor(self._executor, _load, path,
+                                                                   parser, self._cache))
+        self._sheets.move_to_end(key)
+        while len(self._sheets) > self.max_sheets:
+            self._sheets.popitem(last=False)
+        try:
+            return await entry[1]
+        except Exception:
+            if self._sheets.get(key) is entry:
+                del self._sheets[key]
+            raise
+
+
+def _load(path, parser, cache):
+    """Returns the :py:class:`comp_css.Stylesheet` for the file `path`, with its index,
+    effective styles and fingerprints built, so that the copies made by :py:func:`_named` share
+    them rather than building them again for each comparison.
+
+    """
+    sheet = comp_css.Stylesheet(path, cache=cache, parser=parser)
+    sheet.parse = None  # the rules are all a comparison needs
+    sheet.contexts  # pylint: disable=W0104
+    sheet.context_fingerprints()  # and the effective styles and selector fingerprints
+    return sheet
+
+
+def _named(sheet, name):
+    """Returns a copy of `sheet` that reports its file as `name`. The copy shares the sheet's
+    rules and index.
+
+    """
+    sheet = copy.copy(sheet)
+    sheet.filename = name
+    return sheet
+
+
+class _ThreadOutput(object):
+    """Stands in for :py:data:`sys.stdout`, sending what each thread prints to the stream it
+    chose with :py:func:`_printing_to`, and what other threads print to the real standard
+    output.
+
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        return getattr(self.local, 'stream', self.stream).write(text)
+
+    def flush(self):
+        getattr(self.local, 'stream', self.stream).flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+_output_lock = threading.Lock()
+_output_users = 0
+
+
+@contextmanager
+def _printing_to(stream):
+    """Like :py:func:`contextlib.redirect_stdout`, but for the calling thread only, so that
+    threads may print reports at the same time.
+
+    """
+    global _output_users  # pylint: disable=W0603
+    with _output_lock:
+        if _output_users == 0:
+            sys.stdout = _ThreadOutput(sys.stdout)
+        _output_users += 1
+        output = sys.stdout
+    output.local.stream = stream
+    try:
+        yield stream
+    finally:
+        del output.local.stream
+        with _output_lock:
+            _output_users -= 1
+            if _output_users == 0:
+                sys.stdout = output.stream
+
+
+def _compare(sheet1, sheet2, output_format, renames, limits):
+    """Returns the output of comparing `sheet1` and `sheet2`, as bytes."""
+    if output_format == 'columnar':
+        stream = io.BytesIO()
+        write_columnar(sheet1.diff(sheet2), stream)
+        return stream.getvalue()
+    stream = io.StringIO()
+    if output_format == 'jsonl':
+        write_jsonl(sheet1.diff(sheet2), stream)
+    else:
+        with _printing_to(stream):
+            comp_css.print_report(sheet1, sheet2, renames, limits)
+    return stream.getvalue().encode('utf-8')
+
+
+class ComparisonServer(object):
+    """Answers comparison requests (see the module documentation) with the sheets in its
+    :py:class:`SheetCache`.
+
+    .. attribute:: sheets
+
+        The :py:class:`SheetCache`.
+
+    """
+    def __init__(self, max_sheets=DEFAULT_MAX_SHEETS, threads=None, cache=None, log=None):
+        """Make a server that keeps `max_sheets` sheets, parsing and comparing them in a pool of
+        `threads` threads (default: as :py:class:`concurrent.futures.ThreadPoolExecutor`
+        chooses), with the :py:class:`css_cache.ParseCache` `cache`, if any. If `log` is given,
+        a line is written to it for each request.
+
+        """
+        # the modules comp_css loads on first use are loaded now, as that isn't thread-safe
+        # (before Python 3.12)
+        comp_css.load_lazy_modules()
+        self._executor = ThreadPoolExecutor(threads)
+        self.sheets = SheetCache(self._executor, max_sheets, cache)
+        self._log = log
+
+    async def compare(self, request):
+        """Returns the output, as bytes, of the comparison `request` asks for."""
+        if request.get('format', 'text') not in comp_css.FORMATS:
+            raise ValueError("unknown format {!r}".format(request['format']))
+        parser = request.get('parser')
+        comp_css._get_parser(parser)  # pylint: disable=W0212
+        sheets = await asyncio.gather(*(self.sheets.get(filename, parser)
+                                        for filename in request['files']))
+        sheet1, sheet2 = (_named(sheet, name) for sheet, name in zip(sheets, request['names']))
+        loop = asyncio.get_running_loop()
+        limits = comp_css.ReportLimits(*request.get('limits', comp_css.DEFAULT_LIMITS))
+        return await loop.run_in_executor(self._executor, _compare, sheet1, sheet2,
+                                          request.get('format', 'text'), request.get('renames'),
+                                          limits)
+
+    async def handle(self, reader, writer):
+        """Answers the request on the connection whose streams are `reader` and `writer`."""
+        start = time.perf_counter()
+        output = b''
+        error = None
+        try:
+            request = json.loads(await reader.readline())
+            output = await self.compare(request)
+        except Exception as exception:  # pylint: disable=W0703
+            # the error is the client's to report; the server carries on
+            error = str(exception) or type(exception).__name__
+        header = {'error': error, 'length': len(output)}
+        writer.write(json.dumps(header).encode('utf-8') + b'\n' + output)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+        if self._log is not None:
+            self._log.write("{} ({:.0f} ms, {} sheets cached)\n".format(
+                'error: ' + error if error else 'compared',
+                (time.perf_counter() - start) * 1000, len(self.sheets)))
+            self._log.flush()
+
+    async def serve(self, socket_path):
+        """Serves requests on the Unix socket `socket_path` until cancelled."""
+        server = await asyncio.start_unix_server(self.handle, socket_path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+
+    def close(self):
+        """Stops the server's threads."""
+        self._executor.shutdown()
+
+
+def _build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Serves comparisons of CSS stylesheets (see comp_css.py --connect), keeping "
+        "the sheets it parses in memory.")
+    parser.add_argument('socket', help="the path of the Unix socket to listen on")
+    parser.add_argument('--max-sheets', type=int, default=DEFAULT_MAX_SHEETS, metavar='N',
+                        help="keep the N most recently used sheets (default: %(default)s)")
+    parser.add_argument('--threads', type=int, metavar='N',
+                        help="parse and compare in a pool of N threads")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help="also keep parsed stylesheets in DIR, as comp_css.py does")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        metavar='MB', help="maximum size of the cache directory (default: "
+                        "%(default)s MB)")
+    return parser
+
+
+def main():
+    args = _build_arg_parser().parse_args()
+    cache = None
+    if args.cache_dir:
+        cache = ParseCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    server = ComparisonServer(args.max_sheets, args.threads, cache, log=sys.stderr)
+    # stop on SIGTERM as on an interrupt, removing the socket
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print("Serving comparisons on {}.".format(args.socket), file=sys.stderr)
+    try:
+        asyncio.run(server.serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Expansion of shorthand properties (``margin``, ``border``, ``font``, ...) into the longhand
+properties they set, so that ``margin: 5px`` compares equal to the four ``margin-*``
+declarations.
+
+Expansion works on (normalized) value text. Each shorthand has a handler, found in a table
+built once, that returns the ``(longhand, value)`` pairs it sets, with the initial value of each
+longhand the shorthand leaves out. Values the handlers can't parse (``var()``, several
+background layers, ...) are left unexpanded, as are properties with no handler.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import re
+from functools import lru_cache
+
+from css_colors import canonical_color
+
+# the maximum number of distinct (property, value) pairs whose expansions are remembered
+EXPANSION_CACHE_SIZE = 8192
+
+CSS_WIDE_KEYWORDS = frozenset(('inherit', 'initial', 'unset', 'revert', 'revert-layer'))
+
+_SIDES = ('top', 'right', 'bottom', 'left')
+_CORNERS = ('top-left', 'top-right', 'bottom-right', 'bottom-left')
+
+_NUMBER = re.compile(r'^[+-]?(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?$', re.IGNORECASE)
+_DIMENSION = re.compile(r'^[+-]?(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?(?:[a-z]+|%)$', re.IGNORECASE)
+_MATH_FUNCTIONS = ('calc(', 'min(', 'max(', 'clamp(')
+
+_BORDER_STYLES = frozenset(('none', 'hidden', 'dotted', 'dashed', 'solid', 'double', 'groove',
+                            'ridge', 'inset', 'outset', 'auto'))
+_BORDER_WIDTHS = frozenset(('thin', 'medium', 'thick'))
+
+_FONT_STYLES = frozenset(('italic', 'oblique'))
+_FONT_VARIANTS = frozenset(('small-caps',))
+_FONT_WEIGHTS = frozenset(('bold', 'bolder', 'lighter', '100', '200', '300', '400', '500', '600',
+                           '700', '800', '900'))
+_FONT_STRETCHES = frozenset(('ultra-condensed', 'extra-condensed', 'condensed', 'semi-condensed',
+                             'semi-expanded', 'expanded', 'extra-expanded', 'ultra-expanded'))
+_FONT_SIZES = frozenset(('xx-small', 'x-small', 'small', 'medium', 'large', 'x-large', 'xx-large',
+                         'xxx-large', 'larger', 'smaller'))
+_SYSTEM_FONTS = frozenset(('caption', 'icon', 'menu', 'message-box', 'small-caption',
+                           'status-bar'))
+
+_BG_REPEATS = frozenset(('repeat', 'repeat-x', 'repeat-y', 'no-repeat', 'space', 'round'))
+_BG_ATTACHMENTS = frozenset(('scroll', 'fixed', 'local'))
+_BG_BOXES = frozenset(('border-box', 'padding-box', 'content-box'))
+_BG_POSITIONS = frozenset(('left', 'right', 'top', 'bottom', 'center'))
+_BG_OFFSETS = {'left': '0%', 'top': '0%', 'center': '50%', 'right': '100%', 'bottom': '100%'}
+_ZERO = re.compile(r'^[+-]?(?:0+\.?0*|\.0+)(?:[a-z]+|%)?$', re.IGNORECASE)
+_BG_IMAGE_FUNCTIONS = ('url(', 'linear-gradient(', 'radial-gradient(', 'conic-gradient(',
+                       'repeating-linear-gradient(', 'repeating-radial-gradient(',
+                       'repeating-conic-gradient(', 'image(', 'image-set(', 'cross-fade(',
+                       'element(', '-webkit-')
+
+_LIST_STYLE_POSITIONS = frozenset(('inside', 'outside'))
+
+_FLEX_DIRECTIONS = frozenset(('row', 'row-reverse', 'column', 'column-reverse'))
+_FLEX_WRAPS = frozenset(('nowrap', 'wrap', 'wrap-reverse'))
+
+
+class Unexpandable(ValueError):
+    """Raised by a handler for a value it can't parse."""
+
+
+def split_value(text):
+    """Splits the value `text` into words at top-level white space. ``/`` and ``,`` are
+    returned as separate words. Strings and functions (with any nested parentheses) are kept
+    whole.
+
+    """
+    words = []
+    current = []
+    depth = 0
+    quote = None
+    escaped = False
+    for char in text:
+        if quote:
+            current.append(char)
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+            current.append(char)
+        elif char == '(':
+            depth += 1
+            current.append(char)
+        elif char == ')':
+            depth -= 1
+            current.append(char)
+        elif depth:
+            current.append(char)
+        elif char.isspace() or char in '/,':
+            if current:
+                words.append(''.join(current))
+                current = []
+            if char in '/,':
+                words.append(char)
+        else:
+            current.append(char)
+    if current:
+        words.append(''.join(current))
+    return words
+
+
+def _is_length(word):
+    return (bool(_DIMENSION.match(word)) or word == '0' or
+            word.lower().startswith(_MATH_FUNCTIONS))
+
+
+def _is_number(word):
+    return bool(_NUMBER.match(word))
+
+
+def _is_color(word):
+    return canonical_color(word) is not None
+
+
+def _box(words):
+    """Returns the four side values for a box shorthand's 1 to 4 `words`."""
+    if not 1 <= len(words) <= 4 or '/' in words or ',' in words:
+        raise Unexpandable(words)
+    if len(words) == 1:
+        return words * 4
+    if len(words) == 2:
+        return words * 2
+    if len(words) == 3:
+        return words + [words[1]]
+    return words
+
+
+def _box_handler(pattern):
+    """Returns a handler for a shorthand whose longhands are `pattern` formatted with each of
+    top, right, bottom and left.
+
+    """
+    names = tuple(pattern.format(side) for side in _SIDES)
+
+    def handler(words):
+        return list(zip(names, _box(words)))
+    return handler
+
+
+def _join(words):
+    return ' '.join(words)
+
+
+def _border_parts(words):
+    """Returns ``(width, style, color)`` for a border-like shorthand's `words`, with the initial
+    values for any left out.
+
+    """
+    width = style = color = None
+    for word in words:
+        lowered = word.lower()
+        if style is None and lowered in _BORDER_STYLES:
+            style = lowered
+        elif width is None and (lowered in _BORDER_WIDTHS or _is_length(word)):
+            width = word
+        elif color is None and _is_color(word):
+            color = canonical_color(word)
+        else:
+            raise Unexpandable(words)
+    return width or 'medium', style or 'none', color or 'currentcolor'
+
+
+def _border_side_handler(side):
+    def handler(words):
+        width, style, color = _border_parts(words)
+        return [('border-{}-width'.format(side), width), ('border-{}-style'.format(side), style),
+                ('border-{}-color'.format(side), color)]
+    return handler
+
+
+def _border(words):
+    width, style, color = _border_parts(words)
+    result = []
+    for part, value in (('width', width), ('style', style), ('color', color)):
+        result.extend(('border-{}-{}'.format(side, part), value) for side in _SIDES)
+    return result
+
+
+def _outline_like(name):
+    def handler(words):
+        width, style, color = _border_parts(words)
+        return [(name + '-width', width), (name + '-style', style), (name + '-color', color)]
+    return handler
+
+
+def _border_radius(words):
+    if '/' in words:
+        slash = words.index('/')
+        horizontal = _box(words[:slash])
+        vertical = _box(words[slash + 1:])
+    else:
+        horizontal = vertical = _box(words)
+    return [('border-{}-radius'.format(corner), h if h == v else _join((h, v)))
+            for corner, h, v in zip(_CORNERS, horizontal, vertical)]
+
+
+def _font(words):
+    if len(words) == 1 and words[0].lower() in _SYSTEM_FONTS:
+        raise Unexpandable(words)
+    style = variant = weight = stretch = None
+    index = 0
+    while index < len(words):
+        word = words[index]
+        lowered = word.lower()
+        if lowered == 'normal':
+            pass
+        elif style is None and (lowered in _FONT_STYLES or lowered.startswith('oblique')):
+            style = lowered
+        elif variant is None and lowered in _FONT_VARIANTS:
+            variant = lowered
+        elif weight is None and lowered in _FONT_WEIGHTS:
+            weight = lowered
+        elif stretch is None and lowered in _FONT_STRETCHES:
+            stretch = lowered
+        else:
+            break
+        index += 1
+    if index >= len(words):
+        raise Unexpandable(words)
+    size = words[index]
+    if not (size.lower() in _FONT_SIZES or _is_length(size)):
+        raise Unexpandable(words)
+    index += 1
+    line_height = 'normal'
+    if index < len(words) and words[index] == '/':
+        if index + 1 >= len(words):
+            raise Unexpandable(words)
+        line_height = words[index + 1]
+        index += 2
+    family = words[index:]
+    if not family:
+        raise Unexpandable(words)
+    return [('font-style', style or 'normal'), ('font-variant', variant or 'normal'),
+            ('font-weight', weight or 'normal'), ('font-stretch', stretch or 'normal'),
+            ('font-size', size.lower() if size.lower() in _FONT_SIZES else size),
+            ('line-height', line_height),
+            ('font-family', ' '.join(family).replace(' ,', ','))]
+
+
+def _background(words):
+    if ',' in words:
+        raise Unexpandable(words)  # several layers
+    color = image = repeat = attachment = None
+    boxes = []
+    position = []
+    size = []
+    index = 0
+    while index < len(words):
+        word = words[index]
+        lowered = word.lower()
+        if lowered in _BG_POSITIONS or _is_length(word):
+            position.append(word)
+        elif word == '/':
+            if not position:
+                raise Unexpandable(words)
+            index += 1
+            while index < len(words) and (words[index].lower() in ('auto', 'cover', 'contain') or
+                                          _is_length(words[index])) and len(size) < 2:
+                size.append(words[index])
+                index += 1
+            if not size:
+                raise Unexpandable(words)
+            continue
+        elif image is None and (lowered == 'none' or lowered.startswith(_BG_IMAGE_FUNCTIONS)):
+            image = word
+        elif repeat is None and lowered in _BG_REPEATS:
+            repeat = lowered
+            if (index + 1 < len(words) and lowered in ('repeat', 'space', 'round', 'no-repeat') and
+                    words[index + 1].lower() in ('repeat', 'space', 'round', 'no-repeat')):
+                index += 1
+                repeat = _join((repeat, words[index].lower()))
+        elif attachment is None and lowered in _BG_ATTACHMENTS:
+            attachment = lowered
+        elif len(boxes) < 2 and lowered in _BG_BOXES:
+            boxes.append(lowered)
+        elif color is None and _is_color(word):
+            color = canonical_color(word)
+        else:
+            raise Unexpandable(words)
+        index += 1
+    if len(position) > 4:
+        raise Unexpandable(words)
+    origin = boxes[0] if boxes else 'padding-box'
+    clip = boxes[-1] if boxes else 'border-box'
+    return [('background-color', color or 'rgba(0,0,0,0)'),
+            ('background-image', image or 'none'),
+            ('background-repeat', repeat or 'repeat'),
+            ('background-attachment', attachment or 'scroll'),
+            ('background-position', _background_position(position) if position else '0% 0%'),
+            ('background-size', _join(size) if size else 'auto'),
+            ('background-origin', origin),
+            ('background-clip', clip)]
+
+
+def _background_position(words):
+    """Returns the canonical ``x y`` form of a 1 or 2 word background position, with keywords as
+    percentages and zero offsets as ``0%``. Longer positions, which pair keywords with offsets,
+    are returned as written.
+
+    """
+    words = [word.lower() if word.lower() in _BG_POSITIONS else word for word in words]
+    if len(words) > 2:
+        return _join(words)
+    if len(words) == 1:
+        words = ['center', words[0]] if words[0] in ('top', 'bottom') else [words[0], 'center']
+    elif words[0] in ('top', 'bottom') or words[1] in ('left', 'right'):
+        if not (words[0] in _BG_POSITIONS and words[1] in _BG_POSITIONS):
+            raise Unexpandable(words)
+        words = [words[1], words[0]]
+    return _join('0%' if _ZERO.match(word) else _BG_OFFSETS.get(word, word) for word in words)
+
+
+def normalize_position(value):
+    """Returns the canonical form of the (normalized) value of a ``background-position``
+    longhand, layer by layer, as the ``background`` shorthand expands to it, or `value` as it is
+    if it isn't made of positions.
+
+    """
+    layers = [[]]
+    for word in split_value(value):
+        if word == ',':
+            layers.append([])
+        elif word.lower() in _BG_POSITIONS or _is_length(word):
+            layers[-1].append(word)
+        else:
+            return value
+    if not all(layers):
+        return value
+    try:
+        return ', '.join(_background_position(layer) for layer in layers)
+    except Unexpandable:
+        return value
+
+
+def _flex(words):
+    if len(words) == 1:
+        lowered = words[0].lower()
+        if lowered == 'none':
+            return [('flex-grow', '0'), ('flex-shrink', '0'), ('flex-basis', 'auto')]
+        if lowered == 'auto':
+            return [('flex-grow', '1'), ('flex-shrink', '1'), ('flex-basis', 'auto')]
+    grow = shrink = basis = None
+    for word in words:
+        if _is_number(word) and grow is None:
+            grow = word
+        elif _is_number(word) and shrink is None and basis is None:
+            shrink = word
+        elif basis is None and (_is_length(word) or word.lower() in ('auto', 'content')):
+            basis = word
+        else:
+            raise Unexpandable(words)
+    return [('flex-grow', grow or '1'), ('flex-shrink', shrink or '1'),
+            ('flex-basis', basis or '0%')]
+
+
+def _flex_flow(words):
+    direction = wrap = None
+    for word in words:
+        lowered = word.lower()
+        if direction is None and lowered in _FLEX_DIRECTIONS:
+            direction = lowered
+        elif wrap is None and lowered in _FLEX_WRAPS:
+            wrap = lowered
+        else:
+            raise Unexpandable(words)
+    return [('flex-direction', direction or 'row'), ('flex-wrap', wrap or 'nowrap')]
+
+
+def _slash_groups(words):
+    """Returns the values of `words` between ``/`` separators."""
+    groups = [[]]
+    for word in words:
+        if word == '/':
+            groups.append([])
+        else:
+            groups[-1].append(word)
+    if not all(groups) or ',' in words:
+        raise Unexpandable(words)
+    return [_join(group) for group in groups]
+
+
+def _grid_default(value):
+    """The value of an omitted grid line: the same custom identifier, or ``auto``."""
+    is_ident = re.match(r'^-?[_a-z][-_a-z0-9]*$', value, re.IGNORECASE)
+    return value if is_ident and value.lower() not in ('auto', 'span') else 'auto'
+
+
+def _grid_area(words):
+    values = _slash_groups(words)
+    if len(values) > 4:
+        raise Unexpandable(words)
+    row_start = values[0]
+    column_start = values[1] if len(values) > 1 else _grid_default(row_start)
+    row_end = values[2] if len(values) > 2 else _grid_default(row_start)
+    column_end = values[3] if len(values) > 3 else _grid_default(column_start)
+    return [('grid-row-start', row_start), ('grid-column-start', column_start),
+            ('grid-row-end', row_end), ('grid-column-end', column_end)]
+
+
+def _grid_line_handler(name):
+    def handler(words):
+        values = _slash_groups(words)
+        if len(values) > 2:
+            raise Unexpandable(words)
+        end = values[1] if len(values) > 1 else _grid_default(values[0])
+        return [(name + '-start', values[0]), (name + '-end', end)]
+    return handler
+
+
+def _pair_handler(first, second):
+    """Returns a handler for a shorthand of one or two values, the second defaulting to the
+    first.
+
+    """
+    def handler(words):
+        if not 1 <= len(words) <= 2 or '/' in words or ',' in words:
+            raise Unexpandable(words)
+        return [(first, words[0]), (second, words[-1])]
+    return handler
+
+
+def _list_style(words):
+    style_type = position = image = None
+    nones = 0
+    for word in words:
+        lowered = word.lower()
+        if lowered == 'none':
+            nones += 1
+        elif position is None and lowered in _LIST_STYLE_POSITIONS:
+            position = lowered
+        elif image is None and lowered.startswith(_BG_IMAGE_FUNCTIONS):
+            image = word
+        elif style_type is None and word not in ('/', ','):
+            style_type = word
+        else:
+            raise Unexpandable(words)
+    # 'none' sets whichever of the type and image is not otherwise given
+    if nones:
+        if style_type is None:
+            style_type = 'none'
+            nones -= 1
+        if nones and image is None:
+            image = 'none'
+            nones -= 1
+        if nones:
+            raise Unexpandable(words)
+    return [('list-style-type', style_type or 'disc'),
+            ('list-style-position', position or 'outside'),
+            ('list-style-image', image or 'none')]
+
+
+SHORTHANDS = {
+    'margin': _box_handler('margin-{}'),
+    'padding': _box_handler('padding-{}'),
+    'inset': _box_handler('{}'),
+    'scroll-margin': _box_handler('scroll-margin-{}'),
+    'scroll-padding': _box_handler('scroll-padding-{}'),
+    'border-width': _box_handler('border-{}-width'),
+    'border-style': _box_handler('border-{}-style'),
+    'border-color': _box_handler('border-{}-color'),
+    'border': _border,
+    'border-top': _border_side_handler('top'),
+    'border-right': _border_side_handler('right'),
+    'border-bottom': _border_side_handler('bottom'),
+    'border-left': _border_side_handler('left'),
+    'border-radius': _border_radius,
+    'outline': _outline_like('outline'),
+    'column-rule': _outline_like('column-rule'),
+    'background': _background,
+    'font': _font,
+    'flex': _flex,
+    'flex-flow': _flex_flow,
+    'grid-area': _grid_area,
+    'grid-row': _grid_line_handler('grid-row'),
+    'grid-column': _grid_line_handler('grid-column'),
+    'gap': _pair_handler('row-gap', 'column-gap'),
+    'grid-gap': _pair_handler('row-gap', 'column-gap'),
+    'overflow': _pair_handler('overflow-x', 'overflow-y'),
+    'place-items': _pair_handler('align-items', 'justify-items'),
+    'place-content': _pair_handler('align-content', 'justify-content'),
+    'place-self': _pair_handler('align-self', 'justify-self'),
+    'list-style': _list_style,
+}
+
+# a value each handler accepts ('0' if not listed), used to list the shorthand's longhands
+_SAMPLE_VALUES = {'font': 'medium serif', 'background': 'none', 'list-style': 'none',
+                  'flex-flow': 'row', 'grid-area': 'a', 'grid-row': 'a', 'grid-column': 'a'}
+
+# each shorthand's longhands, for CSS-wide keywords, which set all of them
+_LONGHANDS = {name: tuple(longhand for longhand, _
+                          in handler(split_value(_SAMPLE_VALUES.get(name, '0'))))
+              for name, handler in SHORTHANDS.items()}
+
+
+@lru_cache(maxsize=EXPANSION_CACHE_SIZE)
+def expand(name, value):
+    """Returns a tuple of the ``(longhand, value)`` pairs set by the declaration ``name: value``,
+    or ``None`` if `name` isn't a shorthand or `value` can't be expanded.
+
+    """
+    handler = SHORTHANDS.get(name)
+    if handler is None:
+        return None
+    if value.lower() in CSS_WIDE_KEYWORDS:
+        return tuple((longhand, value.lower()) for longhand in _LONGHANDS[name])
+    if 'var(' in value.lower() or 'attr(' in value.lower():
+        return None  # can't know what it will expand to
+    words = split_value(value)
+    if not words:
+        return None
+    try:
+        return tuple(handler(words))
+    except Unexpandable:
+        return None
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Canonical forms of CSS declaration values, so that values written differently but meaning the
+same (``0px`` and ``0``, ``0.50em`` and ``.5em``, ``BOLD`` and ``bold``, ``url("a")`` and
+``url(a)``, ``#FFF`` and ``white``) compare equal.
+
+:py:func:`normalize_value` makes one pass over a value's tokens, handing each to the function
+for its type, found in a table built once:
+
+* colors are reduced to their canonical forms (see :py:mod:`css_colors`), in the values of the
+  properties that can hold colors (``color``, ``background``, ``border``, ``box-shadow``, ...)
+  only, so that ``font-family: Red`` keeps its font;
+* numbers are written in their shortest form (``+1.50`` is ``1.5``, ``-0`` is ``0``), with
+  their units in lower case, and zero lengths without a unit (except in ``calc()`` and the other
+  math functions, and in ``flex``, where ``0`` and ``0px`` differ);
+* keywords and function names are lower-cased, except in the properties whose identifiers are
+  names chosen by the author (``animation-name``, ``grid-area``, ...), in ``[line names]``, in
+  the arguments of ``counter()`` and ``counters()``, in ``--custom`` names, and in the values of
+  custom properties (which also keep their zero lengths, and have no colors rewritten);
+* strings and URLs are quoted the same way (URLs only if they must be);
+* ``background-position`` is written as the ``background`` shorthand expands to it (see
+  :py:func:`css_shorthand.normalize_position`), so ``left top`` is ``0% 0%``;
+* runs of white space become one space, and there is none before a comma, or around a slash.
+
+Large stylesheets repeat the same values many times, so results are memoized, keyed on the
+value's source text. :py:func:`normalize_sheet_values` normalizes all the values of a sheet in one
+pass.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import re
+from functools import lru_cache
+
+from tinycss.tokenizer import tokenize_grouped
+
+from css_colors import token_color
+from css_shorthand import normalize_position
+
+# the maximum number of distinct values whose canonical forms are remembered
+VALUE_CACHE_SIZE = 65536
+
+# the properties whose identifiers are case-sensitive names, not keywords
+CASE_SENSITIVE_PROPERTIES = frozenset((
+    'anchor-name', 'animation', 'animation-name', 'animation-timeline', 'container',
+    'container-name', 'counter-increment', 'counter-reset', 'counter-set', 'grid', 'grid-area',
+    'grid-column', 'grid-column-end', 'grid-column-start', 'grid-row', 'grid-row-end',
+    'grid-row-start', 'grid-template', 'grid-template-areas', 'grid-template-columns',
+    'grid-template-rows', 'list-style', 'list-style-type', 'page', 'position-anchor',
+    'scroll-timeline', 'scroll-timeline-name', 'timeline-scope', 'view-timeline',
+    'view-timeline-name', 'view-transition-name'))
+
+# the properties in which a zero length means something else than a plain zero
+UNIT_SENSITIVE_PROPERTIES = frozenset(('flex',))
+
+# the properties whose values can hold colors, besides those named *-color, those whose names
+# begin with COLOR_PROPERTY_PREFIXES; an <image> holds colors in gradients
+COLOR_PROPERTIES = frozenset((
+    'background', 'background-image', 'box-shadow', 'caret', 'content', 'cursor', 'fill',
+    'filter', 'backdrop-filter', 'list-style-image', 'mask', 'mask-image', 'mask-border',
+    'mask-border-source', 'box-reflect', 'shape-outside', 'stroke', 'text-shadow',
+    'text-stroke'))
+COLOR_PROPERTY_PREFIXES = ('border', 'column-rule', 'outline', 'text-decoration',
+                           'text-emphasis')
+
+# the length units, which may be left off a zero
+_LENGTH_UNITS = frozenset(('px', 'em', 'rem', 'ex', 'rex', 'ch', 'rch', 'cap', 'rcap', 'ic',
+                           'ric', 'lh', 'rlh', 'vw', 'vh', 'vi', 'vb', 'vmin', 'vmax', 'svw',
+                           'svh', 'lvw', 'lvh', 'dvw', 'dvh', 'cqw', 'cqh', 'cqi', 'cqb',
+                           'cqmin', 'cqmax', 'cm', 'mm', 'q', 'in', 'pt', 'pc'))
+
+# the functions in which 0 and 0px differ
+_MATH_FUNCTIONS = frozenset(('calc', 'min', 'max', 'clamp', '-webkit-calc', '-moz-calc'))
+
+# the functions whose arguments are case-sensitive names
+_NAME_FUNCTIONS = frozenset(('counter', 'counters'))
+
+# whether a URL can be written without quotes
+_BARE_URL = re.compile(r'[^\s"\'()\\]*\Z').match
+
+_VENDOR_PREFIX = re.compile(r'-[a-z]+-')
+
+# the flags of a normalization (see _property_flags)
+_KEEP_CASE = 1
+_KEEP_UNITS = 2
+_COLORS = 4
+_POSITION = 8
+
+_cache = {}
+
+
+@lru_cache(maxsize=1024)
+def _property_flags(name):
+    """Returns the flags for the values of the property `name`."""
+    if name.startswith('--'):
+        return _KEEP_CASE | _KEEP_UNITS  # may be a name, or be substituted into calc()
+    prefix = _VENDOR_PREFIX.match(name)
+    if prefix is not None:
+        name = name[prefix.end():]
+    flags = 0
+    if name in CASE_SENSITIVE_PROPERTIES:
+        flags |= _KEEP_CASE
+    if name in UNIT_SENSITIVE_PROPERTIES:
+        flags |= _KEEP_UNITS
+    if name == 'background-position':
+        flags |= _POSITION
+    if not flags & _KEEP_CASE and (name in COLOR_PROPERTIES or name.endswith('color')
+                                   or name.startswith(COLOR_PROPERTY_PREFIXES)):
+        flags |= _COLORS
+    return flags
+
+
+def _number(token):
+    """Returns the shortest form of the number of the numeric `token`."""
+    value = token.value
+    if value == int(value):
+        return str(int(value))
+    text = repr(float(value))
+    if 'e' in text:  # CSS 2.1 has no exponents: keep the source's digits
+        text = token.as_css().lstrip('+')
+        return text[:len(text) - len(token.unit or '')]
+    if text.startswith('0.'):
+        return text[1:]
+    if text.startswith('-0.'):
+        return '-' + text[2:]
+    return text
+
+
+def _quoted(text):
+    return '"{}"'.format(text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\a '))
+
+
+def _plain_number(token, flags, _):
+    return _number(token)
+
+
+def _percentage(token, flags, _):
+    return _number(token) + '%'
+
+
+def _dimension(token, flags, _):
+    number = _number(token)
+    if number == '0' and not flags & _KEEP_UNITS and token.unit in _LENGTH_UNITS:
+        return number
+    return number + token.unit
+
+
+def _ident(token, flags, previous):
+    if flags & _KEEP_CASE or previous is not None and previous.type == 'DELIM' and (
+            previous.value == '-'):
+        return token.as_css()  # a name, or the rest of a --custom name (after a '-')
+    return token.as_css().lower()
+
+
+def _hash(token, flags, _):
+    color = token_color(token) if flags & _COLORS else None
+    return token.as_css() if color is None else color
+
+
+def _uri(token, flags, _):
+    if _BARE_URL(token.value):
+        return 'url({})'.format(token.value)
+    return 'url({})'.format(_quoted(token.value))
+
+
+def _string(token, flags, _):
+    return _quoted(token.value)
+
+
+def _function(token, flags, _):
+    if flags & _COLORS:
+        color = token_color(token)
+        if color is not None:
+            return color
+    name = token.function_name.lower()
+    text = name if not flags & _KEEP_CASE else token.function_name
+    if name in _MATH_FUNCTIONS:
+        flags |= _KEEP_UNITS
+    elif name in _NAME_FUNCTIONS:
+        flags = (flags | _KEEP_CASE) & ~_COLORS
+    return '{}({})'.format(text, _normalize_tokens(token.content, flags))
+
+
+def _parentheses(token, flags, _):
+    return '({})'.format(_normalize_tokens(token.content, flags))
+
+
+def _brackets(token, flags, _):
+    # [line names] are case-sensitive
+    return '[{}]'.format(_normalize_tokens(token.content, (flags | _KEEP_CASE) & ~_COLORS))
+
+
+def _keyword_or_color(token, flags, previous):
+    if flags & _COLORS:
+        color = token_color(token)
+        if color is not None:
+            return color
+    return _ident(token, flags, previous)
+
+
+# the function that normalizes each type of token; others are kept as they are
+_NORMALIZERS = {
+    'INTEGER': _plain_number,
+    'NUMBER': _plain_number,
+    'PERCENTAGE': _percentage,
+    'DIMENSION': _dimension,
+    'IDENT': _keyword_or_color,
+    'HASH': _hash,
+    'URI': _uri,
+    'STRING': _string,
+    'FUNCTION': _function,
+    '(': _parentheses,
+    '[': _brackets,
+}
+
+# the delimiters with no white space before them, and those with none after them either
+_NO_SPACE_BEFORE = frozenset((',', '/'))
+_NO_SPACE_AFTER = frozenset(('/',))
+
+
+def _normalize_tokens(tokens, flags):
+    """Returns the canonical text of the list of tinycss tokens `tokens`. Each normalizer is
+    given the token and the one right before it (``None`` if there is white space between).
+
+    """
+    parts = []
+    previous = None
+    space = False
+    for token in tokens:
+        type_ = token.type
+        if type_ == 'S':
+            space = True
+            continue
+        adjacent = previous
+        if type_ == 'DELIM' and token.value in _NO_SPACE_BEFORE:
+            space = False
+        elif space:
+            adjacent = None
+            if parts and not (previous.type == 'DELIM' and previous.value in _NO_SPACE_AFTER):
+                parts.append(' ')
+        normalizer = _NORMALIZERS.get(type_)
+        parts.append(token.as_css() if normalizer is None else normalizer(token, flags, adjacent))
+        # always one space after a comma
+        space = type_ == 'DELIM' and token.value == ','
+        previous = token
+    return ''.join(parts)
+
+
+def normalize_value(value, name=''):
+    """Returns the canonical text (see the module documentation) of `value`, the value of a
+    declaration of the property `name`: either a :class:`~.token_data.TokenList` or its text.
+
+    Values are looked up by their text first; tokens are only normalized (or, for text, only
+    made) for values not seen before.
+
+    """
+    text = value if isinstance(value, str) else value.as_css()
+    key = (text, _property_flags(name))
+    normalized = _cache.get(key)
+    if normalized is None:
+        tokens = tokenize_grouped(text) if isinstance(value, str) else value
+        normalized = _normalize_tokens(tokens, key[1])
+        if key[1] & _POSITION:
+            normalized = normalize_position(normalized)
+        if len(_cache) >= VALUE_CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = normalized
+    return normalized
+
+
+def normalize_sheet_values(declarations):
+    """Normalizes the values of many declarations (e.g. all those of a sheet) in one pass,
+    colors included. `declarations` are objects with a ``name`` and a ``value``, as
+    :py:func:`normalize_value` takes them: :class:`tinycss.css21.Declaration` or
+    :class:`comp_css.FunctionalDeclaration`. Returns a list of the canonical text of each value.
+
+    Each distinct value is normalized once, in a table local to the call, so a large sheet is
+    not slowed down by the shared cache being cleared part way through it.
+
+    """
+    table = {}
+    normalized = []
+    for decl in declarations:
+        value = decl.value
+        key = (value if isinstance(value, str) else value.as_css(), _property_flags(decl.name))
+        text = table.get(key)
+        if text is None:
+            text = table[key] = normalize_value(value, decl.name)
+        normalized.append(text)
+    return normalized
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -10,13 +10,49 @@
 """
 from unittest import TestCase
 
+import tinycss
+
 from comp_css import FunctionalDeclaration
 
 
+def parse_declarations(css):
+    """Returns the :class:`~comp_css.FunctionalDeclaration` list for the first rule in `css`."""
+    sheet = tinycss.make_parser('page3').parse_stylesheet(css)
+    return [FunctionalDeclaration(decl) for decl in sheet.rules[0].declarations]
+
+
 class FunctionalDeclarationTestCase(TestCase):
     """Unit tests for :class:`comp_css.FunctionalDeclaration`."""
 
-
+    def test_equal_ignores_position(self):
+        first, second = parse_declarations("a { width: 5px;\n  width: 5px }")
+        self.assertNotEqual((first.line, first.column), (second.line, second.column))
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first), hash(second))
+
+    def test_not_equal(self):
+        decls = parse_declarations(
+            "a { width: 5px; width: 6px; height: 5px; width: 5px !important }")
+        self.assertEqual(len(set(decls)), 4)
+
+    def test_key(self):
+        decl, = parse_declarations("a { margin: 0 auto !important }")
+        self.assertEqual(decl.key, ('margin', '0 auto', 'important'))
+        self.assertEqual(str(decl), 'margin: 0 auto !important')
+
+    def test_wraps_functional_declaration(self):
+        decl, = parse_declarations("a { color: red }")
+        self.assertEqual(FunctionalDeclaration(decl), decl)
+
+    def test_equal_colors(self):
+        first, second, third = parse_declarations(
+            "a { color: #CCC; color: rgb(204, 204, 204); color: #ccd }")
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+
+    def test_slots(self):
+        decl, = parse_declarations("a { color: red }")
+        self.assertFalse(hasattr(decl, '__dict__'))
 
 
 # Local Variables:
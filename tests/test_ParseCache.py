@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from comp_css import Stylesheet, parse_stylesheets
+from css_cache import ParseCache
+
+
+class ParseCacheTestCase(TestCase):
+    """Unit tests for :class:`css_cache.ParseCache`."""
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.workdir.name, 'cache')
+        self.filename = os.path.join(self.workdir.name, 'sample.css')
+        with open(self.filename, 'w', encoding='utf-8') as css_file:
+            css_file.write("a, b { color: red; margin: 0 auto !important }\n"
+                           "@media print { c { x: y } }\n"
+                           ".d\n{ width: 1px }\n")
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_round_trip(self):
+        cache = ParseCache(self.cache_dir)
+        key = cache.key(b'a{}', 'tag')
+        self.assertIsNone(cache.load(key))
+        cache.store(key, [('a', 1, 1, ())])
+        self.assertEqual(cache.load(key), [('a', 1, 1, ())])
+
+    def test_key_depends_on_tag(self):
+        self.assertNotEqual(ParseCache.key(b'a{}', 'one'), ParseCache.key(b'a{}', 'two'))
+
+    def test_evicts_least_recently_used(self):
+        cache = ParseCache(self.cache_dir, max_bytes=10 ** 6)
+        keys = [cache.key(str(i).encode(), 'tag') for i in range(3)]
+        for age, key in enumerate(keys):
+            cache.store(key, os.urandom(1000))
+            os.utime(cache._path(key), (age, age))  # pylint: disable=W0212
+        cache.load(keys[0])  # now the most recently used
+        cache.max_bytes = 2500
+        cache.evict()
+        self.assertIsNotNone(cache.load(keys[0]))
+        self.assertIsNone(cache.load(keys[1]))
+        self.assertIsNotNone(cache.load(keys[2]))
+
+    def check_same(self, cold, warm):
+        self.assertEqual(list(warm.selector_dict), list(cold.selector_dict))
+        for selector, rules in cold.selector_dict.items():
+            warm_rules = warm.selector_dict[selector]
+            self.assertEqual([(rule.line, rule.column) for rule in warm_rules],
+                             [(rule.line, rule.column) for rule in rules])
+            for warm_rule, rule in zip(warm_rules, rules):
+                self.assertEqual([(str(decl), decl.line, decl.column)
+                                  for decl in warm_rule.declarations],
+                                 [(str(decl), decl.line, decl.column)
+                                  for decl in rule.declarations])
+                self.assertEqual(warm_rule.declarations, rule.declarations)
+
+    def test_warm_stylesheet_skips_parser(self):
+        cache = ParseCache(self.cache_dir)
+        cold = Stylesheet(self.filename, cache=cache)
+        self.assertIsNotNone(cold.parse)
+        with patch.object(Stylesheet, '_parser', None):
+            warm = Stylesheet(self.filename, cache=cache)
+        self.assertIsNone(warm.parse)
+        self.check_same(cold, warm)
+
+    def test_scanner_sheets_cached(self):
+        # the scanner's rules are made from records, whose values are CSSText
+        cache = ParseCache(self.cache_dir)
+        cold = Stylesheet(self.filename, cache=cache, parser='scanner')
+        warm = Stylesheet(self.filename, cache=cache, parser='scanner')
+        self.assertIsNone(warm.parse)
+        self.check_same(cold, warm)
+
+    def test_parse_stylesheets_uses_cache(self):
+        cache = ParseCache(self.cache_dir)
+        cold, = parse_stylesheets([self.filename], jobs=1, cache=cache)
+        warm, = parse_stylesheets([self.filename], jobs=1, cache=cache)
+        self.assertIsNone(warm.parse)
+        self.check_same(cold, warm)
+
+    def test_low_memory_sheets_cached(self):
+        with open(self.filename, 'a', encoding='utf-8') as css_file:
+            css_file.write(".e { margin: 0 auto; background: red }\n")
+        cache = ParseCache(self.cache_dir)
+        cold = Stylesheet(self.filename, cache=cache, low_memory=True)
+        with patch('comp_css._stream_rules', side_effect=AssertionError):
+            warm = Stylesheet(self.filename, cache=cache, low_memory=True)
+        self.check_same(cold, warm)
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
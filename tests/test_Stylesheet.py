@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+from comp_css import (Stylesheet, SELECTOR_MISSING, SELECTOR_EXTRA, DECLARATION_MISSING,
+                      DECLARATION_EXTRA, expand_shorthands)
+
+from benchmarks.css_generator import generate_rules, mutate, render
+
+
+def make_sheet(css, **options):
+    """Write `css` to a temporary file and return the parsed :class:`comp_css.Stylesheet`, made
+    with the keyword arguments `options`.
+
+    """
+    handle, filename = tempfile.mkstemp(suffix='.css')
+    try:
+        with os.fdopen(handle, 'w', encoding='utf-8') as css_file:
+            css_file.write(css)
+        return Stylesheet(filename, **options)
+    finally:
+        os.remove(filename)
+
+
+class StylesheetTestCase(TestCase):
+    """Unit tests for :class:`comp_css.Stylesheet`."""
+
+    def test_selector_dict_keys_are_stripped(self):
+        sheet = make_sheet("a,b { color: red; }\n.c , .d { color: blue; }\n")
+        self.assertEqual(set(sheet.selector_dict), {'a', 'b', '.c', '.d'})
+
+    def test_selector_dict_collects_rules_in_order(self):
+        sheet = make_sheet("a { color: red; }\nb, a { color: blue; }\n")
+        rules = sheet.selector_dict['a']
+        self.assertEqual(len(rules), 2)
+        self.assertEqual([rule.line for rule in rules], [1, 2])
+
+    def test_selector_dict_built_once(self):
+        sheet = make_sheet("a { color: red; }")
+        self.assertIs(sheet.selector_dict, sheet.selector_dict)
+
+    def test_selector_keys_match_dict(self):
+        sheet = make_sheet("a , b { color: red; }")
+        for key in sheet.selector_keys:
+            self.assertIn(key, sheet.selector_dict)
+
+    def test_compare_selectors(self):
+        sheet1 = make_sheet("a, b { color: red; }")
+        sheet2 = make_sheet("b,c { color: red; }")
+        self.assertEqual(sheet1.compare_selectors(sheet2), ({'a'}, {'c'}))
+
+    def test_diff_records(self):
+        sheet1 = make_sheet("a { color: red }\nb { color: red;\n  width: 1px }\n")
+        sheet2 = make_sheet("b { width: 1px; color: blue }\nc { color: red }\n")
+        records = [(diff.kind, diff.selector, str(diff.declaration) if diff.declaration else None,
+                    diff.filename, diff.line, diff.column) for diff in sheet1.diff(sheet2)]
+        self.assertEqual(records, [
+            (SELECTOR_MISSING, 'a', None, sheet1.filename, 1, 1),
+            (SELECTOR_EXTRA, 'c', None, sheet2.filename, 2, 1),
+            (DECLARATION_MISSING, 'b', 'color: #ff0000', sheet1.filename, 2, 5),
+            (DECLARATION_EXTRA, 'b', 'color: #0000ff', sheet2.filename, 1, 17),
+        ])
+
+    def test_diff_is_lazy(self):
+        sheet1 = make_sheet("a { color: red }")
+        sheet2 = make_sheet("b { color: red }")
+        differences = sheet1.diff(sheet2)
+        self.assertEqual(next(differences).kind, SELECTOR_MISSING)
+
+    def test_diff_merges_rules(self):
+        sheet1 = make_sheet(".fred { width: 100px }\n.fred { height: 200px }")
+        sheet2 = make_sheet(".fred { height: 200px; width: 100px }")
+        self.assertEqual(list(sheet1.diff(sheet2)), [])
+
+    def test_effective_styles(self):
+        sheet = make_sheet("a { color: red; margin: 0 }\n"
+                           "a, b { color: blue; width: 1px !important }\n"
+                           "a { width: 2px; margin-top: 1px }\n")
+        style = sheet.effective_styles()[()]['a']
+        self.assertEqual(str(style['color']), 'color: #0000ff')
+        self.assertEqual(str(style['width']), 'width: 1px !important')
+        self.assertEqual(str(style['margin-top']), 'margin-top: 1px')
+        self.assertEqual(str(style['margin-left']), 'margin-left: 0')
+        self.assertEqual(set(sheet.effective_styles()[()]['b']), {'color', 'width'})
+        self.assertIn('margin', sheet.effective_styles(shorthands=False)[()]['a'])
+
+    def test_diff_ignores_overridden(self):
+        sheet1 = make_sheet("a { color: red }\na { color: blue }")
+        sheet2 = make_sheet("a { color: blue }")
+        self.assertEqual(list(sheet1.diff(sheet2)), [])
+        self.assertEqual([str(diff.declaration) for diff in sheet1.diff(sheet2, cascade=False)],
+                         ['color: #ff0000'])
+
+    def test_diff_by_property(self):
+        sheet1 = make_sheet("a { color: red; width: 1px }")
+        sheet2 = make_sheet("a { width: 1px; color: red !important; height: 0 }")
+        self.assertEqual([(diff.kind, str(diff.declaration)) for diff in sheet1.diff(sheet2)],
+                         [(DECLARATION_MISSING, 'color: #ff0000'),
+                          (DECLARATION_EXTRA, 'color: #ff0000 !important'),
+                          (DECLARATION_EXTRA, 'height: 0')])
+
+    def test_check_reports(self):
+        sheet1 = make_sheet("a, x1, x2, x3, x4, x5, x6 { color: red }")
+        sheet2 = make_sheet("a { color: blue }")
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(sheet1.check_selectors(sheet2), (6, 0))
+            self.assertEqual(sheet1.check_rules(sheet2), 1)
+        report = output.getvalue()
+        self.assertIn("[x5]", report)
+        self.assertNotIn("[x6]", report)
+        self.assertIn("selector: a\n", report)
+        self.assertIn("        color: #0000ff\n", report)
+
+    def test_check_selectors_no_preview(self):
+        sheet1 = make_sheet("a, x1 { color: red }")
+        sheet2 = make_sheet("a, y1 { color: red }")
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(sheet1.check_selectors(sheet2, preview=0), (1, 1))
+        self.assertNotIn("[x1]", output.getvalue())
+        self.assertNotIn("[y1]", output.getvalue())
+
+    def test_check_rules_limits(self):
+        sheet1 = make_sheet("a { color: red } b { top: 0; left: 0; right: 0 } c { top: 0 }\n"
+                            "d { top: 0; left: 0 } e { top: 0; left: 0 }")
+        sheet2 = make_sheet("a { color: blue } b { top: 1px; left: 1px; right: 1px }\n"
+                            "c { top: 1px } d { top: 1px; left: 1px } e { top: 1px; left: 1px }")
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(sheet1.check_rules(sheet2, top=2, max_declarations=1), 5)
+        lines = output.getvalue().splitlines()
+        self.assertEqual([line for line in lines if line.startswith('selector')],
+                         ['selector: b', 'selector: d'])
+        self.assertEqual(lines[1:5], ["selector: b",
+                                      "    found in {} but not {}:".format(sheet1.filename,
+                                                                         sheet2.filename),
+                                      "        top: 0", "        ... and 2 more"])
+        self.assertEqual(lines[-1], "===== 5 selectors differ: 9 declarations only in {}, "
+                         "9 only in {} =====".format(sheet1.filename, sheet2.filename))
+
+    def test_check_rules_unlimited_in_source_order(self):
+        sheet1 = make_sheet("".join("s{0} {{ top: {0}px }}\n".format(index)
+                                    for index in range(5000)))
+        sheet2 = make_sheet("".join("s{0} {{ top: 0 }}\n".format(index)
+                                    for index in range(1, 5001)))
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(sheet1.check_rules(sheet2), 4999)
+        selectors = [line for line in output.getvalue().splitlines()
+                     if line.startswith('selector')]
+        self.assertEqual(selectors, ["selector: s{}".format(index) for index in range(1, 5000)])
+
+    def test_media_rules_indexed_by_context(self):
+        sheet = make_sheet("a { color: red }\n"
+                           "@media screen and (max-width:600px) { a { color: blue } }\n"
+                           "@supports (display: grid) { @media print { b { width: 0 } } }")
+        self.assertEqual(set(sheet.contexts),
+                         {(), ('@media screen and (max-width: 600px)',),
+                          ('@supports (display: grid)', '@media print')})
+        self.assertEqual(list(sheet.selector_keys), ['a'])
+        self.assertEqual(sheet.selector_count(), 3)
+        style = sheet.effective_styles()[('@media screen and (max-width: 600px)',)]['a']
+        self.assertEqual(str(style['color']), 'color: #0000ff')
+
+    def test_equivalent_conditions_share_context(self):
+        sheet1 = make_sheet("@media SCREEN and (MAX-WIDTH:600px) { a { top: 0 } }\n"
+                            "@supports NOT ( display : grid ) { b { top: 0 } }")
+        sheet2 = make_sheet("@media screen and ( max-width: 600px ) { a { top: 0 } }\n"
+                            "@supports not (display: grid) { b { top: 0 } }")
+        self.assertEqual(set(sheet1.contexts), {('@media screen and (max-width: 600px)',),
+                                                ('@supports not (display: grid)',)})
+        self.assertEqual(list(sheet1.diff(sheet2)), [])
+        # layer and container names are case-sensitive
+        self.assertEqual(list(make_sheet("@layer Base { a { top: 0 } }").contexts),
+                         [('@layer Base',)])
+
+    def test_diff_compares_within_context(self):
+        sheet1 = make_sheet("a { color: red } @media print { a { color: red } }")
+        sheet2 = make_sheet("a { color: red } @media print { a { color: blue } b { top: 0 } }")
+        diffs = list(sheet1.diff(sheet2))
+        self.assertEqual([(diff.kind, diff.context, diff.selector) for diff in diffs],
+                         [(SELECTOR_EXTRA, ('@media print',), 'b'),
+                          (DECLARATION_MISSING, ('@media print',), 'a'),
+                          (DECLARATION_EXTRA, ('@media print',), 'a')])
+
+    def test_unchanged_context_fingerprints(self):
+        sheet1 = make_sheet("@media print { a { color: red; width: 0 } b { top: 0 } }")
+        sheet2 = make_sheet("@media print { b { top: 0 } a { width: 0; color: #f00 } }")
+        self.assertEqual(sheet1.context_fingerprints(), sheet2.context_fingerprints())
+        self.assertEqual(list(sheet1.diff(sheet2)), [])
+
+    def test_check_reports_context(self):
+        sheet1 = make_sheet("@media print { a { color: red } }")
+        sheet2 = make_sheet("@media print { a { color: blue } }")
+        output = io.StringIO()
+        with redirect_stdout(output):
+            sheet1.check_rules(sheet2)
+        self.assertIn("selector: @media print { a }\n", output.getvalue())
+
+
+class SelectorFingerprintTestCase(TestCase):
+    """Checks that skipping selectors by fingerprint in :meth:`comp_css.Stylesheet.diff` finds
+    the same differences as comparing every selector's declarations.
+
+    """
+
+    def setUp(self):
+        rules = generate_rules(300, seed=17)
+        self.sheet1 = make_sheet(render(rules))
+        self.sheet2 = make_sheet(render(mutate(rules, seed=18, rate=0.2)))
+
+    def common_selectors(self):
+        for context, index in self.sheet1.contexts.items():
+            for selector in index.keys() & self.sheet2.contexts.get(context, {}).keys():
+                yield context, selector
+
+    def test_fingerprints_match_declarations(self):
+        styles1 = self.sheet1.effective_styles()
+        styles2 = self.sheet2.effective_styles()
+        fingerprints1 = self.sheet1.selector_fingerprints()
+        fingerprints2 = self.sheet2.selector_fingerprints()
+        same = 0
+        for context, selector in self.common_selectors():
+            equal = styles1[context][selector] == styles2[context][selector]
+            self.assertEqual(fingerprints1[context][selector] == fingerprints2[context][selector],
+                             equal)
+            same += equal
+        self.assertGreater(same, 0)
+
+    def test_cascade_diff_matches_full_comparison(self):
+        styles1 = self.sheet1.effective_styles()
+        styles2 = self.sheet2.effective_styles()
+        expected = []
+        for context, selector in self.common_selectors():
+            style1, style2 = styles1[context][selector], styles2[context][selector]
+            expected.extend((DECLARATION_MISSING, context, selector, str(decl))
+                            for name, decl in style1.items() if style2.get(name) != decl)
+            expected.extend((DECLARATION_EXTRA, context, selector, str(decl))
+                            for name, decl in style2.items() if style1.get(name) != decl)
+        self.assertTrue(expected)
+        self.assertEqual(sorted((diff.kind, diff.context, diff.selector, str(diff.declaration))
+                                for diff in self.sheet1.diff(self.sheet2, selectors=False)),
+                         sorted(expected))
+
+    def test_set_diff_matches_full_comparison(self):
+        expected = []
+        for context, selector in self.common_selectors():
+            declarations = []
+            for sheet in (self.sheet1, self.sheet2):
+                declarations.append({str(decl) for rule in sheet.contexts[context][selector]
+                                     for decl in expand_shorthands(rule.declarations)})
+            expected.extend((DECLARATION_MISSING, context, selector, decl)
+                            for decl in declarations[0] - declarations[1])
+            expected.extend((DECLARATION_EXTRA, context, selector, decl)
+                            for decl in declarations[1] - declarations[0])
+        self.assertTrue(expected)
+        self.assertEqual(sorted((diff.kind, diff.context, diff.selector, str(diff.declaration))
+                                for diff in self.sheet1.diff(self.sheet2, selectors=False,
+                                                             cascade=False)),
+                         sorted(expected))
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
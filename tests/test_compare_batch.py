@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import TestCase
+from unittest.mock import patch
+
+from comp_css import Stylesheet, compare_batch, expand_targets, main
+
+SHEETS = {
+    'base.css': ".a { color: red } .b { width: 1px }",
+    'same.css': ".b { width: 1px } .a { color: red }",
+    'changed.css': ".a { color: blue } .c { width: 1px }",
+}
+
+
+class CompareBatchTestCase(TestCase):
+    """Unit tests for :func:`comp_css.compare_batch`."""
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        for name, css in SHEETS.items():
+            with open(self.path(name), 'w', encoding='utf-8') as css_file:
+                css_file.write(css)
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.workdir.name, name)
+
+    def test_expand_targets(self):
+        self.assertEqual(expand_targets([self.path('*.css'), 'nosuch.css']),
+                         [self.path(name) for name in sorted(SHEETS)] + ['nosuch.css'])
+
+    def test_results(self):
+        baseline = Stylesheet(self.path('base.css'))
+        targets = [self.path('same.css'), self.path('changed.css')]
+        results = list(compare_batch(baseline, targets, jobs=1))
+        self.assertEqual([result.filename for result in results], targets)
+        self.assertEqual([(result.missing, result.extra, result.changed) for result in results],
+                         [(0, 0, 0), (1, 1, 1)])
+        self.assertIn("color: #0000ff", results[1].report)
+
+    def test_pool_matches_serial(self):
+        baseline = Stylesheet(self.path('base.css'))
+        targets = [self.path(name) for name in sorted(SHEETS)]
+        self.assertEqual(list(compare_batch(baseline, targets, jobs=2)),
+                         list(compare_batch(baseline, targets, jobs=1)))
+
+    def test_output_file(self):
+        argv = ['comp_css.py', '--batch', '-o', self.path('report.txt'), self.path('base.css'),
+                self.path('same.css'), self.path('changed.css')]
+        output = io.StringIO()
+        with patch.object(sys, 'argv', argv), redirect_stdout(output):
+            main()
+        self.assertEqual(output.getvalue(), '')
+        with open(self.path('report.txt'), encoding='utf-8') as report:
+            lines = report.read().splitlines()
+        self.assertEqual(lines[0], "===== {} =====".format(self.path('same.css')))
+        self.assertEqual(lines[-1].split()[-3:], ['1', '1', '1'])
+
+    def test_missing_targets_rejected(self):
+        argv = ['comp_css.py', '--batch', self.path('base.css'), self.path('same.css'),
+                self.path('nosuch.css'), self.path('*.scss')]
+        with patch.object(sys, 'argv', argv), redirect_stderr(io.StringIO()) as stderr:
+            with self.assertRaises(SystemExit):
+                main()
+        self.assertIn("--batch found no file for {}, {}".format(self.path('nosuch.css'),
+                                                                 self.path('*.scss')),
+                      stderr.getvalue())
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import TestCase
+from unittest.mock import patch
+
+from comp_css import compare_trees, find_stylesheets, main, pair_stylesheets, print_tree_summary
+
+MOVED = ".nav { display: flex } .nav a { color: red; padding: 0 } .logo { width: 10px }"
+
+TREES = {
+    'old': {
+        'same.css': ".a { color: red }",
+        'sub/changed.css': ".a { color: red } .b { width: 1px }",
+        'old-name.css': MOVED,
+        'gone.css': ".gone { top: 0 }",
+        'notes.txt': "not a stylesheet",
+    },
+    'new': {
+        'same.css': ".a { color: red }",
+        'sub/changed.css': ".a { color: blue } .c { width: 1px }",
+        'parts/new-name.css': MOVED + " .logo:hover { opacity: 1 }",
+        'new.css': ".fresh { top: 0 }",
+    },
+}
+
+
+class CompareTreesTestCase(TestCase):
+    """Unit tests for :func:`comp_css.compare_trees`."""
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        for tree, files in TREES.items():
+            for name, css in files.items():
+                os.makedirs(os.path.dirname(self.path(tree, name)), exist_ok=True)
+                with open(self.path(tree, name), 'w', encoding='utf-8') as css_file:
+                    css_file.write(css)
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def path(self, tree, name=''):
+        return os.path.join(self.workdir.name, tree, *name.split('/'))
+
+    def test_find_stylesheets(self):
+        self.assertEqual(find_stylesheets(self.path('old')),
+                         ['gone.css', 'old-name.css', 'same.css',
+                          os.path.join('sub', 'changed.css')])
+
+    def test_pairing(self):
+        pairs, removed, added = pair_stylesheets(self.path('old'), self.path('new'))
+        self.assertEqual(pairs, [('old-name.css', os.path.join('parts', 'new-name.css')),
+                                 ('same.css', 'same.css'),
+                                 (os.path.join('sub', 'changed.css'),) * 2])
+        self.assertEqual((removed, added), (['gone.css'], ['new.css']))
+
+    def test_results(self):
+        results = list(compare_trees(self.path('old'), self.path('new'), jobs=1))
+        self.assertEqual([(result.old, result.new, result.identical) for result in results],
+                         [(self.path('old', 'old-name.css'),
+                           self.path('new', 'parts/new-name.css'), False),
+                          (self.path('old', 'same.css'), self.path('new', 'same.css'), True),
+                          (self.path('old', 'sub/changed.css'),
+                           self.path('new', 'sub/changed.css'), False),
+                          (self.path('old', 'gone.css'), None, False),
+                          (None, self.path('new', 'new.css'), False)])
+        self.assertEqual([(result.missing, result.extra, result.changed) for result in results],
+                         [(0, 1, 0), (0, 0, 0), (1, 1, 1), (0, 0, 0), (0, 0, 0)])
+        self.assertIn("color: #0000ff", results[2].report)
+
+    def test_identical_pairs_not_parsed(self):
+        with patch('comp_css.Stylesheet', side_effect=AssertionError):
+            results = list(compare_trees(self.path('old'), self.path('old'), jobs=1))
+        self.assertTrue(results)
+        self.assertTrue(all(result.identical for result in results))
+
+    def test_pool_matches_serial(self):
+        self.assertEqual(list(compare_trees(self.path('old'), self.path('new'), jobs=2)),
+                         list(compare_trees(self.path('old'), self.path('new'), jobs=1)))
+
+    def test_summary(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            print_tree_summary(compare_trees(self.path('old'), self.path('new'), jobs=1))
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[-4].split()[-4:], ['total', '1', '2', '1'])
+        self.assertEqual(lines[-3], "2 pairs compared, 1 identical.")
+        self.assertEqual(lines[-2:], ["only in the first tree: " + self.path('old', 'gone.css'),
+                                      "only in the second tree: " + self.path('new', 'new.css')])
+
+    def test_output_file(self):
+        report_file = os.path.join(self.workdir.name, 'report.txt')
+        argv = ['comp_css.py', '--tree', '-o', report_file, self.path('old'), self.path('new')]
+        output = io.StringIO()
+        with patch.object(sys, 'argv', argv), redirect_stdout(output):
+            main()
+        self.assertEqual(output.getvalue(), '')
+        with open(report_file, encoding='utf-8') as report:
+            lines = report.read().splitlines()
+        self.assertIn("2 pairs compared, 1 identical.", lines)
+
+    def test_files_rejected(self):
+        for paths in ((self.path('old', 'same.css'), self.path('new')),
+                      (self.path('old'), self.path('new', 'same.css')),
+                      (self.path('old'), self.path('nosuch'))):
+            argv = ['comp_css.py', '--tree'] + list(paths)
+            with patch.object(sys, 'argv', argv), redirect_stderr(io.StringIO()) as stderr:
+                with self.assertRaises(SystemExit):
+                    main()
+            self.assertIn("--tree compares two directories", stderr.getvalue())
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+from unittest import TestCase
+
+from comp_css import get_normalized_color
+from css_colors import canonical_color
+
+
+class CSSColorsTestCase(TestCase):
+    """Unit tests for :mod:`css_colors`."""
+
+    def test_equivalent_forms(self):
+        for form in ('#CCC', '#cccccc', 'rgb(204, 204, 204)', 'rgb(80%, 80%, 80%)',
+                     'hsl(0, 0%, 80%)', 'rgba(204,204,204,1)', 'hsla(0, 0%, 80%, 1.0)'):
+            self.assertEqual(canonical_color(form), '#cccccc', form)
+
+    def test_channel_order(self):
+        self.assertEqual(canonical_color('rgb(1, 2, 3)'), '#010203')
+        self.assertEqual(canonical_color('blue'), '#0000ff')
+        self.assertEqual(canonical_color('LimeGreen'), '#32cd32')
+
+    def test_transparency(self):
+        self.assertEqual(canonical_color('rgba(255, 0, 0, .5)'), 'rgba(255,0,0,0.5)')
+        self.assertEqual(canonical_color('hsla(0, 100%, 50%, 0.5)'), 'rgba(255,0,0,0.5)')
+        self.assertEqual(canonical_color('transparent'), 'rgba(0,0,0,0)')
+        self.assertEqual(canonical_color('currentColor'), 'currentcolor')
+
+    def test_not_colors(self):
+        for form in ('#ab', 'bold', 'rgb(1, 2)', '12px'):
+            self.assertIsNone(canonical_color(form), form)
+
+    def test_clipped(self):
+        self.assertEqual(canonical_color('rgb(-51, 306, 0)'), '#00ff00')
+
+    def test_get_normalized_color(self):
+        self.assertEqual(get_normalized_color('rgb(1, 2, 3)'), '#010203')
+        self.assertEqual(get_normalized_color('#FA8'), '#ffaa88')
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
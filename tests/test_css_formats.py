@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from comp_css import DECLARATION_EXTRA, SELECTOR_MISSING
+from css_formats import (Record, load_columnar, load_differences, load_jsonl, write_columnar,
+                         write_jsonl)
+
+from tests.test_Stylesheet import make_sheet
+
+
+class CSSFormatsTestCase(TestCase):
+    """Unit tests for :mod:`css_formats`."""
+
+    def setUp(self):
+        sheet1 = make_sheet("a { color: red }\nb { width: 1px; content: 'é' }\n"
+                            "@media print { @layer x { c { top: 0 } } }\n")
+        sheet2 = make_sheet("b { width: 2px; content: 'é' }\n")
+        self.differences = list(sheet1.diff(sheet2))
+        self.expected = [Record(diff.kind, diff.selector,
+                                str(diff.declaration) if diff.declaration else None,
+                                diff.filename, diff.line, diff.column, diff.context)
+                         for diff in self.differences]
+        self.assertEqual(len(self.expected), 4)
+        self.assertEqual(self.expected[1].context, ('@media print', '@layer x'))
+
+    def test_jsonl_round_trip(self):
+        stream = io.StringIO()
+        self.assertEqual(write_jsonl(self.differences, stream), 4)
+        stream.seek(0)
+        self.assertEqual(list(load_jsonl(stream)), self.expected)
+
+    def test_columnar_round_trip(self):
+        stream = io.BytesIO()
+        self.assertEqual(write_columnar(self.differences, stream), 4)
+        stream.seek(0)
+        table = load_columnar(stream)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(list(table), self.expected)
+        self.assertEqual(table.count_by_kind()[SELECTOR_MISSING], 2)
+        self.assertEqual(table.count_by_kind()[DECLARATION_EXTRA], 1)
+
+    def test_columnar_rejects_other_data(self):
+        with self.assertRaises(ValueError):
+            load_columnar(io.BytesIO(b'{"kind": "selector-missing"}\n' * 2))
+
+    def test_load_differences_detects_format(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            jsonl = os.path.join(workdir, 'diff.jsonl')
+            with open(jsonl, 'w', encoding='utf-8') as stream:
+                write_jsonl(self.differences, stream)
+            columnar = os.path.join(workdir, 'diff.bin')
+            with open(columnar, 'wb') as stream:
+                write_columnar(self.differences, stream)
+            self.assertEqual(load_differences(jsonl), self.expected)
+            self.assertEqual(load_differences(columnar), self.expected)
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
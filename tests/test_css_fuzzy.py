@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import random
+from unittest import TestCase
+
+from comp_css import _build_arg_parser
+from css_fuzzy import DEFAULT_THRESHOLD, match_similar
+
+from tests.test_Stylesheet import make_sheet
+
+
+def all_pairs(left, right, threshold):
+    """Returns the similar pairs of `left` and `right` found by comparing every pair."""
+    pairs = {}
+    for left_key, left_tokens in left.items():
+        for right_key, right_tokens in right.items():
+            union = len(left_tokens | right_tokens)
+            if union and len(left_tokens & right_tokens) / union >= threshold:
+                pairs[(left_key, right_key)] = len(left_tokens & right_tokens) / union
+    return pairs
+
+
+class MatchSimilarTestCase(TestCase):
+    """Unit tests for :func:`css_fuzzy.match_similar`."""
+
+    def test_finds_every_similar_pair(self):
+        rand = random.Random(5)
+        tokens = ['t{}'.format(i) for i in range(40)]
+        left = {i: set(rand.sample(tokens, rand.randrange(1, 9))) for i in range(150)}
+        right = {i: set(rand.sample(tokens, rand.randrange(1, 9))) for i in range(150)}
+        # some near copies, so there are pairs at every similarity
+        for i in range(0, 150, 3):
+            right[i] = set(left[i]) | {rand.choice(tokens)}
+        for threshold in (0.3, 0.5, 0.8, 1.0):
+            expected = all_pairs(left, right, threshold)
+            matches = match_similar(left, right, threshold)
+            self.assertEqual(len({left_key for left_key, _, _ in matches}), len(matches))
+            self.assertEqual(len({right_key for _, right_key, _ in matches}), len(matches))
+            for left_key, right_key, similarity in matches:
+                self.assertAlmostEqual(expected[(left_key, right_key)], similarity)
+            # the pairing is greedy: every pair left out has a key in a more similar pair
+            paired_left = {left_key: similarity for left_key, _, similarity in matches}
+            paired_right = {right_key: similarity for _, right_key, similarity in matches}
+            for (left_key, right_key), similarity in expected.items():
+                self.assertTrue(paired_left.get(left_key, -1) >= similarity
+                                or paired_right.get(right_key, -1) >= similarity)
+            self.assertEqual([similarity for _, _, similarity in matches],
+                             sorted((similarity for _, _, similarity in matches), reverse=True))
+
+    def test_ignores_empty_sets(self):
+        self.assertEqual(match_similar({'a': set()}, {'b': set()}), [])
+        self.assertEqual(match_similar({'a': {'x'}}, {'b': {'x'}, 'c': set()}),
+                         [('a', 'b', 1.0)])
+
+    def test_bad_threshold(self):
+        with self.assertRaises(ValueError):
+            match_similar({'a': {'x'}}, {'b': {'x'}}, 0)
+
+
+class FindRenamesTestCase(TestCase):
+    """Unit tests for :meth:`comp_css.Stylesheet.find_renames`."""
+
+    def test_renamed_and_moved(self):
+        sheet1 = make_sheet(".btn-primary { color: red; padding: 4px 8px; display: block }\n"
+                            ".gone { top: 0 }\n"
+                            "@media print { .x { width: 10px; height: 5px; top: 0 } }\n")
+        sheet2 = make_sheet(".button--primary { color: #f00; padding: 4px 8px; display: block }\n"
+                            ".new { left: 0 }\n"
+                            ".x { width: 10px; height: 5px; top: 1px }\n")
+        renames = sheet1.find_renames(sheet2, threshold=0.5)
+        self.assertEqual([(rename.context, rename.selector, rename.other_context,
+                           rename.other_selector) for rename in renames],
+                         [((), '.btn-primary', (), '.button--primary'),
+                          (('@media print',), '.x', (), '.x')])
+        self.assertEqual(renames[0].similarity, 1.0)
+        self.assertEqual(renames[1].similarity, 0.5)
+        self.assertEqual(len(sheet1.find_renames(sheet2)), 1)
+
+    def test_command_line(self):
+        args = _build_arg_parser().parse_args(['--renames', 'a.css', 'b.css'])
+        self.assertEqual((args.renames, args.file1, args.file2), (True, 'a.css', ['b.css']))
+        self.assertEqual(args.rename_threshold, DEFAULT_THRESHOLD)
+        args = _build_arg_parser().parse_args(['--rename-threshold', '0.5', 'a.css', 'b.css'])
+        self.assertEqual((args.renames, args.rename_threshold), (False, 0.5))
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Unit tests for :mod:`benchmarks.css_generator`.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+from unittest import TestCase
+
+from benchmarks.css_generator import GeneratorOptions, generate_rules, mutate, render
+
+from tests.test_Stylesheet import make_sheet
+
+
+class CSSGeneratorTestCase(TestCase):
+    """Unit tests for :mod:`benchmarks.css_generator`."""
+
+    def test_seeded(self):
+        self.assertEqual(render(generate_rules(50, seed=7)), render(generate_rules(50, seed=7)))
+        self.assertNotEqual(render(generate_rules(50, seed=7)),
+                            render(generate_rules(50, seed=8)))
+
+    def test_options(self):
+        rules = generate_rules(200, options=GeneratorOptions(fanout=1, media=0, colors=0))
+        self.assertTrue(all(len(rule.selectors) == 1 for rule in rules))
+        self.assertTrue(all(rule.media is None for rule in rules))
+
+    def test_sheets_parse_and_differ(self):
+        rules = generate_rules(100, seed=1)
+        sheet1 = make_sheet(render(rules))
+        sheet2 = make_sheet(render(mutate(rules, seed=2, rate=0.1)))
+        self.assertFalse(sheet1.parse.errors)
+        self.assertEqual(len(sheet1.rules), 100)
+        self.assertGreater(len(sheet1.contexts), 1)
+        self.assertTrue(list(sheet1.diff(sheet2)))
+        self.assertFalse(list(sheet1.diff(make_sheet(render(rules)))))
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
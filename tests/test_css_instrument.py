@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import io
+import os
+import pstats
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+import css_instrument
+from css_instrument import Instrument, collecting, phase, profiling
+
+from tests.test_Stylesheet import make_sheet
+
+
+class InstrumentTestCase(TestCase):
+    """Unit tests for :mod:`css_instrument`."""
+
+    def test_phases_accumulate(self):
+        instrument = Instrument()
+        for _ in range(2):
+            with instrument.phase('outer'):
+                with instrument.phase('inner'):
+                    sum(range(1000))
+        results = instrument.results()
+        self.assertEqual([stats.name for stats in results], ['outer', 'outer/inner'])
+        self.assertEqual([stats.calls for stats in results], [2, 2])
+        outer, inner = results
+        self.assertGreaterEqual(outer.wall, inner.wall)
+        self.assertGreater(outer.objects, 0)
+
+    def test_inactive_phase_is_free(self):
+        self.assertIsNone(css_instrument._active)
+        self.assertIs(phase('parse'), phase('index'))
+        with phase('parse'):
+            pass
+
+    def test_library_phases(self):
+        instrument = Instrument(count_objects=False)
+        with collecting(instrument):
+            sheet1 = make_sheet("a { color: red }\n")
+            sheet2 = make_sheet("a { color: blue }\n")
+            with phase('compare'), redirect_stdout(io.StringIO()):
+                sheet1.check_rules(sheet2)
+        self.assertIsNone(css_instrument._active)
+        names = {stats.name: stats for stats in instrument.results()}
+        self.assertEqual(names['parse'].calls, 2)
+        self.assertEqual(names['wrap'].calls, 2)
+        self.assertIn('compare/index', names)
+        self.assertIn('compare/styles', names)
+        self.assertEqual(names['compare/output'].calls, 1)
+        self.assertIsNone(names['parse'].objects)
+        stream = io.StringIO()
+        instrument.report(stream)
+        self.assertIn('\n  index ', stream.getvalue())
+
+    def test_profiling(self):
+        handle, filename = tempfile.mkstemp(suffix='.prof')
+        os.close(handle)
+        try:
+            stream = io.StringIO()
+            with profiling(filename, stream, top=5):
+                make_sheet("a { color: red }\n")
+            self.assertIn('function calls', stream.getvalue())
+            stats = pstats.Stats(filename)
+            self.assertTrue(any(name == '__init__' and path.endswith('comp_css.py')
+                                for path, _, name in stats.stats))
+        finally:
+            os.remove(filename)
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
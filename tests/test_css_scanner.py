@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+from unittest import TestCase
+
+from comp_css import PARSERS
+from css_scanner import ScannerParser
+
+from benchmarks.css_generator import generate_rules, mutate, render
+from tests.test_Stylesheet import make_sheet
+
+# sheets in forms the scanner reads itself, and in forms it hands to tinycss
+EDGE_CASES = [
+    "a, b > c { color: RED; margin: 0 auto !important; background: url(x.png) }",
+    "a { color: red ! IMPORTANT ; top: 1px!important; left: !important; right: }",
+    "a { font: 12px/1.5 \"Foo; {Bar}\";; width: calc(1px + (2% * 3)) }",
+    "/* lead */ a /* in selector */ { /* before */ color: red; /* between */ top: 0 /* in */ }",
+    "a { --custom: 1px; color: var(--custom); -webkit-box-shadow: 0 0 1px #ABCDEF }",
+    "@charset \"utf-8\";\n@import url(\"x.css\");\na { color: hsl(120, 100%, 50%) }",
+    "@media screen and (max-width: 600px) {\n  .x:hover { top: 1px }\n"
+    "  @supports (display: grid) { .y { display: grid; color: Transparent } }\n}",
+    "@MEDIA print { a { color: rgba(0, 0, 0, 0.5) } } @media /* c */ print { b { top: 0 } }",
+    "@font-face { font-family: x; src: url(x.woff) }\n@page :first { margin: 1in }\nb { top: 0 }",
+    "@keyframes spin { from { top: 0 } to { top: 1px } }\nc { animation: spin 1s }",
+    "a { background: url(a;b{c}.png) no-repeat; content: 'x;y}' }",
+    "a { background: URL( 'a b.png' ) } b { background: myurl(x) }",
+    "a\\:b { color: red } .c { content: \"\\201C\" }",
+    "a { content: \"unterminated\n; color: red }\nb { top: 0 }",
+    "<!-- a { color: red } -->\nb { top: 0 }",
+    "a { color: red }\n}\nb { top: 0 }",
+    "a { color: red; b { top: 0 } }",
+    "{ color: red } ; a { top: 0 } @ b { left: 0 } a; b { right: 0 }",
+    "a[href$=\".pdf\"], a::after, li:nth-child(2n+1) { unicode-range: U+0025-00FF; color: blue }",
+    "a { unicode-range: u+0-9red; border: 1px solid darkred; outline: bored }",
+    "a\r\n{\r\n  color: red;\r\n  top: 0\r\n}\r\nb\f{ left: 0 }\rc { right: 0 }",
+    "é, .naïve { colör: red; color: #Fff }",
+    "a { color: red } b",
+    "a { color: red } @media print",
+    "a { color: red } @import 'late.css'; b { top: 0 }",
+    "@media print { @import 'x.css'; @page { margin: 0 } @font-face { src: x } a { top: 0 } }",
+    "/* lead */@charset \"utf-8\"; a { top: 0 } @charset \"utf-8\"; b { top: 0 }",
+    "@media print { @media (min-width: 1px) { a { top: 0 } } } @media { b { top: 0 } }",
+    "@media SCREEN AND (MIN-WIDTH:1PX) , Print { a { top: 0 } } @layer A,b { c { top: 0 } }",
+    "a { filter: progid:DXImageTransform.Microsoft.gradient(startColorstr='#80000000'); }",
+    "a { grid-template-areas: \"a b\" \"c d\"; margin: -1px; top: +.5em; width: 1e3px }",
+    "",
+]
+
+
+def records(sheet):
+    return sheet.to_records(), [str(error) for error in sheet.parse.errors]
+
+
+def differences(sheet1, sheet2):
+    return [difference._replace(filename=None) for difference in sheet1.diff(sheet2)]
+
+
+class ScannerConformanceTestCase(TestCase):
+    """Checks that :py:class:`css_scanner.ScannerParser` finds the same rules, and so the same
+    differences, as the default parser.
+
+    """
+
+    def assertSameParse(self, css):
+        self.assertEqual(records(make_sheet(css, parser='scanner')),
+                         records(make_sheet(css, parser='tinycss')), css)
+
+    def test_edge_cases(self):
+        for css in EDGE_CASES:
+            self.assertSameParse(css)
+
+    def test_generated_sheets(self):
+        for seed in range(3):
+            rules = generate_rules(300, seed=seed)
+            css1 = render(rules)
+            css2 = render(mutate(rules, seed=seed, rate=0.2))
+            self.assertSameParse(css1)
+            sheets = {parser: (make_sheet(css1, parser=parser), make_sheet(css2, parser=parser))
+                      for parser in PARSERS}
+            expected = differences(*sheets['tinycss'])
+            self.assertTrue(expected)
+            self.assertEqual(differences(*sheets['scanner']), expected)
+
+    def test_edge_case_differences(self):
+        for css1, css2 in zip(EDGE_CASES, EDGE_CASES[1:]):
+            self.assertEqual(differences(make_sheet(css1, parser='scanner'),
+                                         make_sheet(css2, parser='scanner')),
+                             differences(make_sheet(css1), make_sheet(css2)))
+
+    def test_reads_simple_sheets_itself(self):
+        # a sheet in the common forms is read without tinycss
+        parser = ScannerParser()
+        parser._tinycss = None  # pylint: disable=W0212
+        parsed = parser.parse_stylesheet(render(generate_rules(50, seed=4)))
+        self.assertTrue(parsed.rules)
+        self.assertFalse(parsed.errors)
+
+    def test_unknown_parser(self):
+        with self.assertRaises(ValueError):
+            make_sheet("a { top: 0 }", parser='nope')
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Unit tests for :mod:`css_selectors`.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+from unittest import TestCase
+
+from css_selectors import selector_phrases
+
+from tests.test_Stylesheet import make_sheet
+
+
+class SelectorPhrasesTestCase(TestCase):
+    """Unit tests for :func:`css_selectors.selector_phrases`."""
+
+    def assertSame(self, selector1, selector2):
+        self.assertEqual(selector_phrases(selector1), selector_phrases(selector2))
+
+    def test_splits_top_level_commas_only(self):
+        self.assertEqual(selector_phrases('a:is(.x,.y), [title="a,b"]'),
+                         ('a:is(.x, .y)', '[title="a,b"]'))
+
+    def test_whitespace_and_combinators(self):
+        self.assertSame('a>b', 'a  >\n b')
+        self.assertSame('a+b~c d', 'a + b ~ c  d')
+        self.assertEqual(selector_phrases('a>b'), ('a > b',))
+
+    def test_case(self):
+        self.assertSame('A > DIV:HOVER', 'a > div:hover')
+        self.assertNotEqual(selector_phrases('.A'), selector_phrases('.a'))
+        self.assertNotEqual(selector_phrases('#A'), selector_phrases('#a'))
+
+    def test_compound_order(self):
+        self.assertSame('div.b.a#c', 'div#c.a.b')
+        self.assertSame('*.a', '.a')
+        self.assertSame('a:not(.y, .x)', 'a:not(.x,.y)')
+        self.assertNotEqual(selector_phrases('a::before:hover'),
+                            selector_phrases('a:hover::before'))
+
+    def test_attributes_and_pseudo_elements(self):
+        self.assertSame('[type=text]', "[ TYPE = 'text' ]")
+        self.assertSame('a:before', 'a::before')
+        self.assertSame('li:nth-child( 2N + 1 )', 'li:nth-child(2n+1)')
+
+    def test_escapes(self):
+        self.assertSame('a\\:b', 'a\\3A b')
+        self.assertSame('.x\\:y#i\\.j', '#i\\2e j.x\\3a y')
+        self.assertSame('[data\\-x=one]', '[data-x="one"]')
+        self.assertEqual(selector_phrases('A\\3A B'), ('a\\:b',))
+        # an escaped colon is part of the name, not a pseudo-class
+        self.assertNotEqual(selector_phrases('a\\:hover'), selector_phrases('a:hover'))
+        self.assertEqual(selector_phrases('.\\31 0'), ('.\\31 0',))
+
+    def test_phrases_are_interned_and_distinct(self):
+        phrases = selector_phrases('a,  b, a')
+        self.assertEqual(phrases, ('a', 'b'))
+        self.assertIs(phrases[0], selector_phrases('x, a')[1])
+
+    def test_unparsable_phrase_kept(self):
+        self.assertEqual(selector_phrases('a >, b'), ('a >', 'b'))
+
+    def test_sheet_index_uses_canonical_phrases(self):
+        sheet1 = make_sheet("UL>LI.b.a { color: red }")
+        sheet2 = make_sheet("ul > li.a.b { color: red }")
+        self.assertEqual(list(sheet1.selector_keys), ['ul > li.a.b'])
+        self.assertEqual(list(sheet1.diff(sheet2)), [])
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Unit tests for :mod:`css_server` and :func:`comp_css.compare_remote`.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import TestCase
+from unittest.mock import patch
+
+import css_instrument
+from comp_css import ServerError, Stylesheet, compare_remote, main, print_report
+from css_formats import write_jsonl
+from css_server import ComparisonServer
+
+SHEETS = {
+    'old.css': ".a { color: red } .b { width: 1px } @media print { .a { top: 0 } }",
+    'new.css': ".a { color: #f00; margin: 0 } .c { width: 1px } @media print { .a { top: 1px } }",
+}
+
+
+class ComparisonServerTestCase(TestCase):
+    """Unit tests for :class:`css_server.ComparisonServer`, through
+    :func:`comp_css.compare_remote`.
+
+    """
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        for name, css in SHEETS.items():
+            self.write(name, css)
+        self.socket = self.path('server.sock')
+        self.server = ComparisonServer(max_sheets=2)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.serving = asyncio.run_coroutine_threadsafe(self.server.serve(self.socket), self.loop)
+        while not os.path.exists(self.socket):
+            time.sleep(0.01)
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.serving.cancel)
+        while not self.serving.done():
+            time.sleep(0.01)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.server.close()
+        self.workdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.workdir.name, name)
+
+    def write(self, name, css):
+        with open(self.path(name), 'w', encoding='utf-8') as css_file:
+            css_file.write(css)
+
+    def compare(self, output_format='text', renames=None):
+        return compare_remote(self.socket, self.path('old.css'), self.path('new.css'),
+                              output_format, renames)
+
+    def expected(self, output_format='text', renames=None):
+        sheet1 = Stylesheet(self.path('old.css'))
+        sheet2 = Stylesheet(self.path('new.css'))
+        output = io.StringIO()
+        if output_format == 'jsonl':
+            write_jsonl(sheet1.diff(sheet2), output)
+        else:
+            with redirect_stdout(output):
+                print_report(sheet1, sheet2, renames)
+        return output.getvalue().encode('utf-8')
+
+    def test_same_output_as_cli(self):
+        self.assertEqual(self.compare(), self.expected())
+        self.assertEqual(self.compare('jsonl'), self.expected('jsonl'))
+        self.assertEqual(self.compare(renames=0.5), self.expected(renames=0.5))
+
+    def test_sheets_are_cached(self):
+        self.compare()
+        self.compare('jsonl')
+        self.assertEqual((self.server.sheets.hits, self.server.sheets.misses), (2, 2))
+
+    def test_sheets_are_indexed_once(self):
+        self.compare()
+        # pylint: disable=W0212
+        sheets = [future.result() for _, future in self.server.sheets._sheets.values()]
+        self.assertEqual(len(sheets), 2)
+        for sheet in sheets:
+            self.assertIsNotNone(sheet._contexts)
+        expected = self.expected()
+        phases = []
+        phase = css_instrument.phase
+        with patch('css_instrument.phase', lambda name: phases.append(name) or phase(name)):
+            self.assertEqual(self.compare(), expected)
+        self.assertNotIn('index', phases)
+        self.assertNotIn('styles', phases)
+
+    def test_changed_file_is_parsed_again(self):
+        self.compare()
+        self.write('new.css', SHEETS['old.css'] + "\n.d { top: 0 }")
+        stamp = os.stat(self.path('new.css'))
+        os.utime(self.path('new.css'), ns=(stamp.st_atime_ns, stamp.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.compare(), self.expected())
+        self.assertEqual(self.server.sheets.misses, 3)
+
+    def test_least_recently_used_dropped(self):
+        self.compare()
+        self.write('other.css', ".e { top: 0 }")
+        compare_remote(self.socket, self.path('old.css'), self.path('other.css'))
+        self.assertEqual(len(self.server.sheets), 2)
+        self.compare()
+        self.assertEqual(self.server.sheets.misses, 4)
+
+    def test_concurrent_requests(self):
+        expected = self.expected()
+        with ThreadPoolExecutor(8) as pool:
+            outputs = list(pool.map(lambda _: self.compare(), range(16)))
+        self.assertEqual(outputs, [expected] * 16)
+        self.assertEqual(self.server.sheets.misses, 2)
+
+    def test_errors(self):
+        with self.assertRaises(ServerError):
+            compare_remote(self.socket, self.path('old.css'), self.path('nosuch.css'))
+        with self.assertRaises(ServerError):
+            compare_remote(self.socket, self.path('old.css'), self.path('new.css'),
+                           parser='nope')
+        self.assertEqual(self.compare(), self.expected())
+
+    def test_unreachable_server(self):
+        argv = ['comp_css.py', '--connect', self.path('nosuch.sock'), self.path('old.css'),
+                self.path('new.css')]
+        with patch.object(sys, 'argv', argv), self.assertRaises(SystemExit) as exit_:
+            main()
+        self.assertTrue(str(exit_.exception.code).startswith(
+            "comp_css: error: can't reach the comparison server"))
+
+    def test_local_options_rejected(self):
+        for option in (['--cache-dir', self.path('cache')], ['-j', '4'], ['--cache-size', '1']):
+            argv = ['comp_css.py', '--connect', self.socket] + option + [self.path('old.css'),
+                                                                         self.path('new.css')]
+            with patch.object(sys, 'argv', argv), redirect_stderr(io.StringIO()) as stderr:
+                with self.assertRaises(SystemExit):
+                    main()
+            self.assertIn("don't apply with --connect", stderr.getvalue())
+        self.assertEqual(self.server.sheets.misses, 0)
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+from unittest import TestCase
+
+from css_shorthand import expand, split_value
+
+from tests.test_Stylesheet import make_sheet
+
+
+class CSSShorthandTestCase(TestCase):
+    """Unit tests for :mod:`css_shorthand`."""
+
+    def test_split_value(self):
+        self.assertEqual(split_value('12px/1.5 "Open Sans", calc(1px + 2px)'),
+                         ['12px', '/', '1.5', '"Open Sans"', ',', 'calc(1px + 2px)'])
+
+    def test_box(self):
+        self.assertEqual(dict(expand('margin', '1px 2px 3px')),
+                         {'margin-top': '1px', 'margin-right': '2px', 'margin-bottom': '3px',
+                          'margin-left': '2px'})
+        self.assertIsNone(expand('margin', '1px 2px 3px 4px 5px'))
+
+    def test_border(self):
+        longhands = dict(expand('border', '#ff0000 1px solid'))
+        self.assertEqual(len(longhands), 12)
+        self.assertEqual(longhands['border-left-color'], '#ff0000')
+        self.assertEqual(dict(expand('border-top', 'dashed')),
+                         {'border-top-width': 'medium', 'border-top-style': 'dashed',
+                          'border-top-color': 'currentcolor'})
+
+    def test_font(self):
+        self.assertEqual(dict(expand('font', 'italic bold 12px/1.5 Arial, sans-serif')), {
+            'font-style': 'italic', 'font-variant': 'normal', 'font-weight': 'bold',
+            'font-stretch': 'normal', 'font-size': '12px', 'line-height': '1.5',
+            'font-family': 'Arial, sans-serif'})
+        self.assertIsNone(expand('font', 'caption'))
+
+    def test_background(self):
+        longhands = dict(expand('background', 'url(x.png) #ffffff no-repeat center / cover'))
+        self.assertEqual(longhands['background-color'], '#ffffff')
+        self.assertEqual(longhands['background-image'], 'url(x.png)')
+        self.assertEqual(longhands['background-position'], '50% 50%')
+        self.assertEqual(longhands['background-size'], 'cover')
+        self.assertIsNone(expand('background', 'url(a), url(b)'))
+
+    def test_background_position(self):
+        positions = {value: dict(expand('background', value))['background-position']
+                     for value in ('red', 'red 0 0', 'red left top', 'red top left', 'red 0% 0px',
+                                   'red top', 'red right 10px', 'red left 5px top 2px')}
+        self.assertEqual(positions, {
+            'red': '0% 0%', 'red 0 0': '0% 0%', 'red left top': '0% 0%',
+            'red top left': '0% 0%', 'red 0% 0px': '0% 0%', 'red top': '50% 0%',
+            'red right 10px': '100% 10px', 'red left 5px top 2px': 'left 5px top 2px'})
+
+    def test_diff_background_default_position(self):
+        sheet = make_sheet(".a { background: red }")
+        for value in ('red 0 0', 'red left top'):
+            self.assertEqual(list(sheet.diff(make_sheet(".a { background: %s }" % value))), [])
+
+    def test_diff_background_position_longhand(self):
+        sheet = make_sheet(".a { background: url(x.png) left top } .b { background: red }")
+        for value in ('left top', '0 0', 'TOP LEFT', '0% 0PX'):
+            other = make_sheet(".a { background: url(x.png); background-position: %s }"
+                               " .b { background: red; background-position: %s }"
+                               % (value, value))
+            self.assertEqual(list(sheet.diff(other)), [], value)
+        other = make_sheet(".a { background: url(x.png); background-position: right top }")
+        self.assertTrue(list(sheet.diff(other)))
+
+    def test_flex_and_grid(self):
+        self.assertEqual(dict(expand('flex', '1')),
+                         {'flex-grow': '1', 'flex-shrink': '1', 'flex-basis': '0%'})
+        self.assertEqual(dict(expand('grid-area', 'main')),
+                         {'grid-row-start': 'main', 'grid-column-start': 'main',
+                          'grid-row-end': 'main', 'grid-column-end': 'main'})
+        self.assertEqual(dict(expand('grid-area', '1 / 2')),
+                         {'grid-row-start': '1', 'grid-column-start': '2',
+                          'grid-row-end': 'auto', 'grid-column-end': 'auto'})
+
+    def test_not_expanded(self):
+        self.assertIsNone(expand('color', '#ffffff'))
+        self.assertIsNone(expand('margin', 'var(--gap)'))
+        self.assertEqual(dict(expand('padding', 'inherit'))['padding-left'], 'inherit')
+
+    def test_diff_compares_longhands(self):
+        sheet1 = make_sheet(".a { margin: 5px 0; border: 1px solid red }")
+        sheet2 = make_sheet(".a { margin-top: 5px; margin-bottom: 5px; margin-left: 0;"
+                            " margin-right: 0; border-width: 1px; border-style: solid;"
+                            " border-color: #F00 }")
+        self.assertEqual(list(sheet1.diff(sheet2)), [])
+        self.assertTrue(list(sheet1.diff(sheet2, shorthands=False)))
+
+    def test_diff_reports_longhands(self):
+        sheet1 = make_sheet(".a { margin: 5px }")
+        sheet2 = make_sheet(".a { margin: 5px 6px 5px 5px }")
+        self.assertEqual([str(diff.declaration) for diff in sheet1.diff(sheet2)],
+                         ['margin-right: 5px', 'margin-right: 6px'])
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
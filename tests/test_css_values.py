@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+from unittest import TestCase
+
+import tinycss
+
+from css_values import normalize_sheet_values, normalize_value
+
+from tests.test_Stylesheet import make_sheet
+
+
+def parse_declarations(css):
+    """Returns the ``(name, value)`` of each declaration in the first rule in `css`, with the
+    value as a :class:`~.token_data.TokenList`.
+
+    """
+    sheet = tinycss.make_parser('page3').parse_stylesheet(css)
+    return [(decl.name, decl.value) for decl in sheet.rules[0].declarations]
+
+
+class CSSValuesTestCase(TestCase):
+    """Unit tests for :mod:`css_values`."""
+
+    def assertSameValue(self, name, *forms):
+        normalized = {normalize_value(form, name) for form in forms}
+        self.assertEqual(len(normalized), 1, (forms, normalized))
+
+    def test_equivalent_forms(self):
+        self.assertSameValue('margin', '0px auto', '0 AUTO', '0PX  auto', '-0em auto')
+        self.assertSameValue('font-size', '0.50em', '.5em', '+.5EM', '0.500em')
+        self.assertSameValue('font-weight', 'BOLD', 'bold')
+        self.assertSameValue('background', 'url("a.png") no-repeat', "URL(a.png) no-repeat",
+                             "url( 'a.png' )\n    No-Repeat")
+        self.assertSameValue('font', '12px/1.5 "Helvetica Neue" , Arial',
+                             "12PX / 1.5 'Helvetica Neue',arial")
+        self.assertSameValue('color', '#F00', 'red', 'RGB(255, 0, 0)')
+        self.assertSameValue('transform', 'Translate( 0px, 1PX )', 'translate(0,1px)')
+
+    def test_canonical_forms(self):
+        self.assertEqual(normalize_value('0PX  1.50EM -0.25% 2', 'margin'), '0 1.5em -.25% 2')
+        self.assertEqual(normalize_value("url('a b.png'), url(\"c.png\")", 'background'),
+                         'url("a b.png"), url(c.png)')
+        self.assertEqual(normalize_value("'say \"hi\"'", 'content'), '"say \\"hi\\""')
+
+    def test_different_values_kept(self):
+        # a zero length isn't a plain zero in calc() or flex, nor a zero time
+        self.assertEqual(normalize_value('calc(0px + 1%)', 'width'), 'calc(0px + 1%)')
+        self.assertEqual(normalize_value('1 0PX', 'flex'), '1 0px')
+        self.assertEqual(normalize_value('0s', 'transition-delay'), '0s')
+        self.assertEqual(normalize_value('0%', 'width'), '0%')
+
+    def test_names_keep_case(self):
+        self.assertEqual(normalize_value('Slide-In 1S', 'animation'), 'Slide-In 1s')
+        self.assertEqual(normalize_value('Red', '-webkit-animation-name'), 'Red')
+        self.assertEqual(normalize_value('Header', 'grid-area'), 'Header')
+        self.assertEqual(normalize_value('[Full-Start] 1FR', 'grid-template-columns'),
+                         '[Full-Start] 1fr')
+        self.assertEqual(normalize_value('VAR(--Main-Color, RED)', 'color'),
+                         'var(--Main-Color, #ff0000)')
+
+    def test_colors_in_color_properties_only(self):
+        self.assertEqual(normalize_value('Red, Navy, serif', 'font-family'), 'red, navy, serif')
+        self.assertEqual(normalize_value('12px Red', 'font'), '12px red')
+        self.assertEqual(normalize_value('Red', 'color'), '#ff0000')
+        self.assertEqual(normalize_value('1px solid RED', 'border-top'), '1px solid #ff0000')
+        self.assertEqual(normalize_value('linear-gradient(Red, #00F)', 'background-image'),
+                         'linear-gradient(#ff0000, #0000ff)')
+        self.assertEqual(normalize_value('0 0 1px Red', '-webkit-box-shadow'), '0 0 1px #ff0000')
+        self.assertEqual(normalize_value('Red', '-webkit-tap-highlight-color'), '#ff0000')
+
+    def test_background_position(self):
+        self.assertSameValue('background-position', 'left top', '0 0', 'TOP LEFT', '0% 0PX')
+        self.assertEqual(normalize_value('center, right 10px', 'background-position'),
+                         '50% 50%, 100% 10px')
+        self.assertEqual(normalize_value('INHERIT', 'background-position'), 'inherit')
+        self.assertEqual(normalize_value('left top', 'float'), 'left top')
+
+    def test_custom_properties_kept(self):
+        self.assertEqual(normalize_value('#FFF Bold', '--Brand'), '#FFF Bold')
+        self.assertEqual(normalize_value('Red', '--accent'), 'Red')
+        self.assertEqual(normalize_value('0PX', '--gap'), '0px')
+
+    def test_counter_names_keep_case(self):
+        self.assertEqual(normalize_value('Counter(Item) ". " COUNTERS(Sub, ".", Upper-Roman)',
+                                         'content'),
+                         'counter(Item) ". " counters(Sub, ".", Upper-Roman)')
+        self.assertEqual(normalize_value('counter(Red)', 'content'), 'counter(Red)')
+
+    def test_tokens_and_text_agree(self):
+        declarations = parse_declarations(
+            "a { margin: 0PX  Auto; background: URL('x.png') #FFF; font: 12px / 1.5 Arial;"
+            "  width: calc( 100% - 0px ); animation: Spin 1.0s; content: 'q' }")
+        for name, value in declarations:
+            self.assertEqual(normalize_value(value, name), normalize_value(value.as_css(), name))
+
+    def test_declarations_compare_equal(self):
+        sheet1 = make_sheet("a { margin: 0px AUTO; font-weight: BOLD; "
+                            "background: url('x.png') }")
+        sheet2 = make_sheet("a { margin: 0 auto; font-weight: bold; background: url(x.png) }")
+        self.assertEqual(list(sheet1.diff(sheet2)), [])
+        self.assertEqual(list(sheet1.diff(sheet2, cascade=False, shorthands=False)), [])
+
+    def test_normalize_sheet_values(self):
+        sheet = tinycss.make_parser('page3').parse_stylesheet(
+            "a { color: #F00; border: 1px solid RED; font-weight: BOLD }"
+            "b { color: Red; font-family: Red }")
+        declarations = [decl for rule in sheet.rules for decl in rule.declarations]
+        self.assertEqual(normalize_sheet_values(declarations),
+                         ['#ff0000', '1px solid #ff0000', 'bold', '#ff0000', 'red'])
+        self.assertEqual(normalize_sheet_values(declarations),
+                         [normalize_value(decl.value, decl.name) for decl in declarations])
+        rules = make_sheet("a { background: #FFF linear-gradient(Red, #000) }").rules
+        self.assertEqual(normalize_sheet_values(rules[0].declarations),
+                         ['#ffffff linear-gradient(#ff0000, #000000)'])
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
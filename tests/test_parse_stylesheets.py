@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import TestCase
+from unittest.mock import patch
+
+import comp_css
+from comp_css import Stylesheet, parse_stylesheets, rule_boundaries, split_stylesheet
+
+SAMPLE_CSS = """@charset "utf-8";
+@import url(base.css);
+/* a comment with a brace } in it */
+.a, .b > li { color: #FFF; margin: 0 auto !important }
+.c[title="}"] { background: url(data:x{y}) }
+@media print { .d { display: none } }
+  .e{width:1px}.f{width:2px}
+@import "late.css";
+.g { content: "\\"}" ; font: 12px/1.5 a, b }
+bad { color }
+.h { width: calc(1px + (2px * 3)) }
+"""
+
+
+class ParseStylesheetsTestCase(TestCase):
+    """Unit tests for :func:`comp_css.parse_stylesheets` and its helpers."""
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.workdir.name, 'sample.css')
+        with open(self.filename, 'w', encoding='utf-8') as css_file:
+            css_file.write(SAMPLE_CSS * 5)
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_boundaries_follow_last_import(self):
+        boundaries = rule_boundaries(SAMPLE_CSS)
+        self.assertTrue(boundaries)
+        self.assertGreater(boundaries[0], SAMPLE_CSS.index('@import "late.css"'))
+        for boundary in boundaries:
+            self.assertEqual(SAMPLE_CSS[boundary - 1], '}')
+
+    def test_mismatched_brackets_not_split(self):
+        self.assertEqual(rule_boundaries("a { b: (c } d {}"), [])
+
+    def test_bad_url_not_split(self):
+        css = "e{f:url(x{(y)})}k{l:m}\n" * 5
+        self.assertEqual(rule_boundaries(css), [])
+        self.assertEqual(rule_boundaries('a{b:url("x{")}c{d:e}'), [14, 20])
+        with open(self.filename, 'w', encoding='utf-8') as css_file:
+            css_file.write("a{b:c}\n" * 20 + css)
+        serial = Stylesheet(self.filename)
+        first, = parse_stylesheets([self.filename], jobs=2, chunk_size=10)
+        self.assertEqual(first.to_records(), serial.to_records())
+        comp_css.STREAM_CHUNK_SIZE, old_size = 10, comp_css.STREAM_CHUNK_SIZE
+        try:
+            streamed = Stylesheet(self.filename, low_memory=True)
+        finally:
+            comp_css.STREAM_CHUNK_SIZE = old_size
+        self.assertGreater(len(streamed._chunks.offsets), 1)  # pylint: disable=W0212
+        self.assertEqual([rule.to_record() for rule in streamed.rules],
+                         [rule.to_record() for rule in serial.rules])
+
+    def test_split_positions(self):
+        text = SAMPLE_CSS * 3
+        chunks = split_stylesheet(text, chunk_size=10)
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual(''.join(chunk for chunk, _, _ in chunks), text)
+        offset = 0
+        for chunk, line, column in chunks:
+            before = text[:offset]
+            self.assertEqual(line, before.count('\n') + 1)
+            self.assertEqual(column, offset - (before.rfind('\n') + 1) + 1)
+            offset += len(chunk)
+
+    def test_parallel_matches_serial(self):
+        serial = Stylesheet(self.filename)
+        self.assertTrue(serial.parse.errors)
+        whole, = parse_stylesheets([self.filename], jobs=2)
+        self.assertIsNone(whole.parse)
+        self.assertEqual(whole.to_records(), serial.to_records())
+        with open(self.filename, encoding='utf-8') as css_file:
+            self.assertGreater(len(split_stylesheet(css_file.read(), chunk_size=50)), 1)
+        first, second = parse_stylesheets([self.filename, self.filename], jobs=2, chunk_size=50)
+        self.assertEqual(first.to_records(), serial.to_records())
+        self.assertEqual(second.to_records(), serial.to_records())
+        self.assertEqual(list(first.diff(serial)), [])
+
+    def test_low_memory_matches_serial(self):
+        serial = Stylesheet(self.filename)
+        streamed = Stylesheet(self.filename, low_memory=True)
+        self.assertIsNone(streamed.parse)
+        self.assertEqual([rule.to_record() for rule in streamed.rules],
+                         [rule.to_record() for rule in serial.rules])
+        comp_css.STREAM_CHUNK_SIZE, old_size = 50, comp_css.STREAM_CHUNK_SIZE
+        try:
+            chunked = Stylesheet(self.filename, low_memory=True)
+        finally:
+            comp_css.STREAM_CHUNK_SIZE = old_size
+        self.assertGreater(len(chunked._chunks.offsets), 1)  # pylint: disable=W0212
+        self.assertEqual([rule.to_record() for rule in chunked.rules],
+                         [rule.to_record() for rule in serial.rules])
+
+    def test_low_memory_rejects_jobs(self):
+        argv = ['comp_css.py', '--low-memory', '-j', '2', self.filename, self.filename]
+        with patch.object(sys, 'argv', argv), redirect_stderr(io.StringIO()) as stderr:
+            with self.assertRaises(SystemExit):
+                comp_css.main()
+        self.assertIn("--low-memory only supports comparing two files, without --watch or -j",
+                      stderr.getvalue())
+
+    def test_rule_source(self):
+        comp_css.STREAM_CHUNK_SIZE, old_size = 50, comp_css.STREAM_CHUNK_SIZE
+        try:
+            chunked = Stylesheet(self.filename, low_memory=True)
+        finally:
+            comp_css.STREAM_CHUNK_SIZE = old_size
+        serial = Stylesheet(self.filename)
+        for sheet in (chunked, serial):
+            sources = [sheet.rule_source(rule) for rule in sheet.rules]
+            self.assertEqual(sources[0], '.a, .b > li { color: #FFF; margin: 0 auto !important }')
+            self.assertEqual(sources[2], '.d { display: none }')
+            self.assertEqual(sources[4], '.f{width:2px}')
+            self.assertEqual(sources[-1], '.h { width: calc(1px + (2px * 3)) }')
+
+    def test_report_sources(self):
+        other = os.path.join(self.workdir.name, 'other.css')
+        with open(other, 'w', encoding='utf-8') as css_file:
+            css_file.write(SAMPLE_CSS.replace('none', 'block') * 5)
+        comp_css.STREAM_CHUNK_SIZE, old_size = 50, comp_css.STREAM_CHUNK_SIZE
+        try:
+            sheet1 = Stylesheet(self.filename, low_memory=True)
+        finally:
+            comp_css.STREAM_CHUNK_SIZE = old_size
+        output = io.StringIO()
+        with redirect_stdout(output):
+            sheet1.check_rules(Stylesheet(other), sources=True)
+        report = output.getvalue()
+        self.assertIn("selector: @media print {{ .d }}\n"
+                      "    in {}, line 6:\n"
+                      "        .d {{ display: none }}\n".format(self.filename), report)
+        self.assertIn("    in {}, line 50:\n"
+                      "        .d {{ display: block }}\n"
+                      "    found in".format(other), report)
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
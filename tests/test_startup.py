@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the modules that importing comp_css, or running it with --help, must not load
+_HEAVY = ('tinycss.css21', 'tinycss.color3', 'css_parser', 'css_scanner', 'css_values',
+          'css_selectors', 'css_cache', 'css_formats', 'css_fuzzy', 'concurrent.futures',
+          'cProfile', 'pstats', 'tempfile')
+
+
+def loaded_after(code):
+    """Runs `code` in a new interpreter and returns the set of the :py:data:`_HEAVY` modules
+    loaded afterwards (not just registered to be loaded on first use).
+
+    """
+    script = "import sys\n{}\nprint(' '.join(name for name in {!r} if {}))".format(
+        code, _HEAVY, "type(sys.modules.get(name)) is type(sys)")
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return set(output.split())
+
+
+class StartupTestCase(TestCase):
+    """Checks that :mod:`comp_css` loads the parser and other heavy modules only when needed."""
+
+    def test_import_is_lazy(self):
+        self.assertEqual(loaded_after("import comp_css"), set())
+
+    def test_help_is_lazy(self):
+        self.assertEqual(loaded_after("import comp_css, io, contextlib\n"
+                                      "sys.argv[1:] = ['--help']\n"
+                                      "with contextlib.redirect_stdout(io.StringIO()):\n"
+                                      "    try:\n        comp_css.main()\n"
+                                      "    except SystemExit:\n        pass"),
+                         set())
+
+    def test_parsing_loads_parser(self):
+        loaded = loaded_after("import comp_css\ncomp_css.Stylesheet._parser.parse_stylesheet('')")
+        self.assertEqual(loaded, {'tinycss.css21', 'css_parser'})
+
+    def test_load_lazy_modules(self):
+        loaded = loaded_after("import comp_css\ncomp_css.load_lazy_modules()")
+        self.assertLessEqual({'css_parser', 'css_scanner', 'css_values', 'css_selectors',
+                              'css_cache', 'css_formats', 'css_fuzzy'}, loaded)
+
+    def test_cache_hit_is_lazy(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        files = [os.path.join(workdir, name) for name in ('a.css', 'b.css')]
+        sources = ("a { color: red; margin: 0 auto } @media print { b { top: 0 } }",
+                   "a { color: #00F; font: 12px Arial } .c:hover { top: 0 }")
+        for filename, css in zip(files, sources):
+            with open(filename, 'w', encoding='utf-8') as css_file:
+                css_file.write(css)
+        for parser in ('tinycss', 'scanner'):
+            argv = ['--parser', parser, '--cache-dir', os.path.join(workdir, parser)] + files
+            compare = ("import comp_css, io, contextlib\n"
+                       "sys.argv[1:] = {!r}\n"
+                       "with contextlib.redirect_stdout(io.StringIO()):\n"
+                       "    comp_css.main()").format(argv)
+            loaded_after(compare)  # fills the cache
+            self.assertEqual(loaded_after(compare), {'css_cache'}, parser)
+
+    def test_lazy_names(self):
+        # pylint: disable=C0415
+        import comp_css
+        import css_parser
+        self.assertIs(comp_css.GroupingRule, css_parser.GroupingRule)
+        self.assertTrue(comp_css.CACHE_TAG.startswith('tinycss-'))
+        with self.assertRaises(AttributeError):
+            comp_css.no_such_name  # pylint: disable=W0104
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End:
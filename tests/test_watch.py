@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Unit tests for :meth:`comp_css.Stylesheet.reload` and :class:`comp_css.DiffWatcher`.
+
+:Copyright: 2015 A. Lloyd Flanagan
+:Author: \\A. Lloyd Flanagan
+:Contact: a.lloyd.flanagan@gmail.com
+
+"""
+import io
+import os
+import random
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase
+from unittest.mock import patch
+
+from comp_css import (Stylesheet, DiffWatcher, DECLARATION_EXTRA, DECLARATION_MISSING,
+                      SELECTOR_EXTRA, SELECTOR_MISSING, watch)
+
+
+def dump_rules(sheet):
+    return [(rule.context, rule.selector, rule.line, rule.column,
+             [(decl.key, decl.line, decl.column) for decl in rule.declarations])
+            for rule in sheet.rules]
+
+
+def dump_styles(sheet):
+    return {context: {selector: {name: (decl.key, decl.line, decl.column)
+                                 for name, decl in style.items()}
+                      for selector, style in styles.items()}
+            for context, styles in sheet.effective_styles().items()}
+
+
+class ReloadTestCase(TestCase):
+    """Unit tests for :meth:`comp_css.Stylesheet.reload`."""
+
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.css')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def write(self, css):
+        with open(self.filename, 'w', encoding='utf-8') as css_file:
+            css_file.write(css)
+
+    def assertSameAsFresh(self, sheet):
+        fresh = Stylesheet(self.filename)
+        self.assertEqual(dump_rules(sheet), dump_rules(fresh))
+        self.assertEqual(dump_styles(sheet), dump_styles(fresh))
+        self.assertEqual(sheet.context_fingerprints(), fresh.context_fingerprints())
+        for cascade in (True, False):
+            self.assertEqual(sheet.selector_fingerprints(cascade=cascade),
+                             fresh.selector_fingerprints(cascade=cascade))
+
+    def test_changed_rule_only(self):
+        self.write("a { color: red }\nb { width: 0 }\nc { top: 0 }\n")
+        sheet = Stylesheet(self.filename, incremental=True)
+        sheet.effective_styles()
+        self.write("a { color: red }\nb { width: 1px;\n     margin: 0 }\nc { top: 0 }\n")
+        self.assertEqual(sheet.reload(), {((), 'b')})
+        self.assertSameAsFresh(sheet)
+        self.assertEqual(sheet.reload(), set())
+
+    def test_unbalanced_change_parses_everything(self):
+        self.write("a { color: red }\nb { width: 0 }\n")
+        sheet = Stylesheet(self.filename, incremental=True)
+        self.write("a { color: red \nb { width: 0 }\n")
+        self.assertIsNone(sheet.reload())
+        self.assertSameAsFresh(sheet)
+
+    def test_bad_url_parses_everything(self):
+        self.write("a { color: red }\nb { width: 0 }\nk { l: m }\n")
+        sheet = Stylesheet(self.filename, incremental=True)
+        self.write("a { color: red }\nb { f: url(x{(y)}) }\nk { l: m }\n")
+        sheet.reload()
+        self.assertSameAsFresh(sheet)
+        self.assertEqual([rule.selector for rule in sheet.rules], ['a', 'b'])
+
+    def test_random_edits(self):
+        rand = random.Random(13)
+        css = "".join("@media print {{ .m{0} {{ color: red }} }} .c{1}, a {{ margin: 0 {0}px }}\n"
+                      .format(i, i % 7) for i in range(40))
+        self.write(css)
+        sheet = Stylesheet(self.filename, incremental=True)
+        sheet.context_fingerprints()
+        for _ in range(50):
+            start = rand.randrange(len(css))
+            end = min(len(css), start + rand.randrange(20))
+            css = css[:start] + rand.choice(["", "\n", "x", "{", "} d { top: 0 }"]) + css[end:]
+            self.write(css)
+            sheet.reload()
+            self.assertSameAsFresh(sheet)
+
+
+class DiffWatcherTestCase(TestCase):
+    """Unit tests for :class:`comp_css.DiffWatcher`."""
+
+    def test_refresh_reports_delta(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            file1 = os.path.join(workdir, 'a.css')
+            file2 = os.path.join(workdir, 'b.css')
+            with open(file1, 'w', encoding='utf-8') as css_file:
+                css_file.write("a { color: red }\nb { top: 0 }\n")
+            with open(file2, 'w', encoding='utf-8') as css_file:
+                css_file.write("a { color: blue }\nb { top: 0 }\n")
+            watcher = DiffWatcher(Stylesheet(file1, incremental=True),
+                                  Stylesheet(file2, incremental=True))
+            self.assertEqual(watcher.refresh(), ([], []))
+
+            with open(file2, 'w', encoding='utf-8') as css_file:
+                css_file.write("a { color: red }\nb { top: 0 }\nc { top: 0 }\n")
+            os.utime(file2, ns=(0, 0))
+            removed, added = watcher.refresh()
+            self.assertEqual(sorted(difference.kind for difference in removed),
+                             [DECLARATION_EXTRA, DECLARATION_MISSING])
+            self.assertEqual([(difference.kind, difference.selector) for difference in added],
+                             [(SELECTOR_EXTRA, 'c')])
+            self.assertEqual(list(watcher.differences), [((), 'c')])
+
+    def test_kept_differences_move(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            file1 = os.path.join(workdir, 'a.css')
+            file2 = os.path.join(workdir, 'b.css')
+            with open(file1, 'w', encoding='utf-8') as css_file:
+                css_file.write("a { top: 0 }\nb { color: red }\n")
+            with open(file2, 'w', encoding='utf-8') as css_file:
+                css_file.write("a { top: 0 }\n")
+            watcher = DiffWatcher(Stylesheet(file1, incremental=True),
+                                  Stylesheet(file2, incremental=True))
+            with open(file1, 'w', encoding='utf-8') as css_file:
+                css_file.write("a {\n  top: 0;\n}\nb { color: red }\n")
+            os.utime(file1, ns=(0, 0))
+            self.assertEqual(watcher.refresh(), ([], []))
+            with open(file2, 'w', encoding='utf-8') as css_file:
+                css_file.write("a { top: 0 }\nb { color: red }\n")
+            os.utime(file2, ns=(0, 0))
+            removed, _ = watcher.refresh()
+            self.assertEqual([(difference.kind, difference.line) for difference in removed],
+                             [(SELECTOR_MISSING, 4)])
+
+    def test_watch_output(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            file1 = os.path.join(workdir, 'a.css')
+            file2 = os.path.join(workdir, 'b.css')
+            for filename in (file1, file2):
+                with open(filename, 'w', encoding='utf-8') as css_file:
+                    css_file.write("a { top: 0 }\n")
+            sheet1 = Stylesheet(file1, incremental=True)
+            sheet2 = Stylesheet(file2, incremental=True)
+
+            def sleep(_):
+                if sleep.edited:
+                    raise KeyboardInterrupt
+                with open(file2, 'w', encoding='utf-8') as css_file:
+                    css_file.write("a { top: 0 }\nb { top: 0 }\n")
+                os.utime(file2, ns=(0, 0))
+                sleep.edited = True
+            sleep.edited = False
+
+            output = io.StringIO()
+            with patch('time.sleep', sleep), redirect_stdout(output):
+                watch(sheet1, sheet2)
+            lines = output.getvalue().splitlines()
+            self.assertEqual(len(lines), 3)
+            self.assertTrue(lines[1].startswith("--- 0 resolved, 1 new ("))
+            self.assertTrue(lines[2].startswith("+ "))
+
+
+# Local Variables:
+# python-indent-offset: 4
+# fill-column: 100
+# indent-tabs-mode: nil
+# End: